@@ -1,6 +1,8 @@
 # app/calculator.py
 
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from app.services.engine import PRICE_STD_HOURDIS_U, PRICE_STD_POUTRELLE_ML, PriceGrid, standard_grid
 
 
 class ParametresDevis:
@@ -21,53 +23,47 @@ class ParametresDevis:
         self.prix_treillis = prix_treillis
         self.prix_controle_technique = prix_controle_technique
         self.tva = tva
-PRIX_POUTRELLES_ML = {
-    113: 28.89,
-    114: 33.33,
-    115: 38.89,
-    135: 51.11,
-    157: 64.44,
-}
-
-PRIX_HOURDIS = {
-    "H8": 4.00,
-    "H12": 4.11,
-    "H16": 5.47,
-    "H20": 6.40,
-    "H25": 7.73,
-    "H30": 9.07,
-}
-def prix_ml_poutrelle(type_poutrelle: int, params: ParametresDevis) -> float:
-    base = PRIX_POUTRELLES_ML.get(type_poutrelle, 0)
+# Grille standard de engine.py (clés entières comme avant) ; les calculs
+# ci-dessous prennent la grille en paramètre (standard par défaut, celle du
+# catalogue actif passée par l'appelant : get_catalogue().grid).
+PRIX_POUTRELLES_ML = {int(k): v for k, v in PRICE_STD_POUTRELLE_ML.items()}
+
+PRIX_HOURDIS = dict(PRICE_STD_HOURDIS_U)
+def prix_ml_poutrelle(
+    type_poutrelle: int, params: ParametresDevis, grid: Optional[PriceGrid] = None
+) -> float:
+    base = (grid or standard_grid()).poutrelle_ml.get(str(type_poutrelle), 0)
     return base * (1 - params.remise_poutrelle) + params.transport_ml_poutrelle
 
 
-def prix_hourdis(code: str, params: ParametresDevis) -> float:
-    base = PRIX_HOURDIS.get(code.upper(), 0)
+def prix_hourdis(code: str, params: ParametresDevis, grid: Optional[PriceGrid] = None) -> float:
+    base = (grid or standard_grid()).hourdis_u.get(code.upper(), 0)
     return base * (1 - params.remise_hourdis) + params.transport_hourdis
 def calcul_ligne(
     designation: str,
     longueur: float,
     quantite: float,
     params: ParametresDevis,
+    grid: Optional[PriceGrid] = None,
 ) -> Dict:
 
+    grid = grid or standard_grid()
     prix_ml = 0
     prix_unitaire = 0
 
     # POUTRELLES
     if designation.isdigit():
         type_p = int(designation)
-        prix_ml = prix_ml_poutrelle(type_p, params)
+        prix_ml = prix_ml_poutrelle(type_p, params, grid)
         prix_unitaire = longueur * prix_ml
 
     # HOURDIS
     elif designation.upper().startswith("H"):
-        prix_unitaire = prix_hourdis(designation, params)
+        prix_unitaire = prix_hourdis(designation, params, grid)
 
     # ETRIER
     elif designation.lower() == "etrier":
-        prix_unitaire = 0.89 * (1 - params.remise_poutrelle)
+        prix_unitaire = grid.etrier * (1 - params.remise_poutrelle)
 
     # CONTROLE TECHNIQUE
     elif designation.upper() == "CONTROLE TECHNIQUE":
@@ -87,9 +83,12 @@ def calcul_ligne(
         "prix_unitaire": round(prix_unitaire, 4),
         "total": total,
     }
-def calcul_devis(lignes: List[Dict], params: ParametresDevis) -> Dict:
+def calcul_devis(
+    lignes: List[Dict], params: ParametresDevis, grid: Optional[PriceGrid] = None
+) -> Dict:
     lignes_calculees = []
     total_ht = 0
+    grid = grid or standard_grid()  # même grille pour toutes les lignes
 
     for l in lignes:
         ligne = calcul_ligne(
@@ -97,6 +96,7 @@ def calcul_devis(lignes: List[Dict], params: ParametresDevis) -> Dict:
             longueur=l.get("longueur", 0),
             quantite=l["quantite"],
             params=params,
+            grid=grid,
         )
         lignes_calculees.append(ligne)
         total_ht += ligne["total"]
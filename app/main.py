@@ -1,31 +1,111 @@
 from __future__ import annotations
-from pathlib import Path
+
+import base64
+import csv
 import hashlib
-import sqlite3 
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
 from datetime import date
-from io import BytesIO
-import shutil
-import tempfile
-import base64 
+from functools import lru_cache
+from pathlib import Path
 from typing import Any, Dict, List, Optional
-
-from fastapi import Body, FastAPI, Request, UploadFile, File, Form, HTTPException,Query, status
-from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse, FileResponse, RedirectResponse
+from urllib.parse import urlencode
+
+from fastapi import Body, FastAPI, File, Form, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pathlib import Path
-from app.services.parser_progiciel import parse_progiciel_csv
-from app.services.engine import compute_devis, simulate_transport
-from pydantic import BaseModel
 from jinja2 import Environment, FileSystemLoader, select_autoescape
-from import_clients import import_clients
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+from app.services.batch_generation import (
+    BatchError,
+    BatchTooLarge,
+    generate_batch,
+    open_batch_zip,
+    spool_upload,
+)
+from app.services.catalogue import (
+    catalogue,
+    current_grid,
+    ensure_price_catalogue,
+    get_catalogue,
+)
+from app.services.clients_import import (
+    CLIENTS_CSV,
+    clients_watcher,
+    ensure_clients_sync,
+    sync_clients_csv,
+    sync_clients_file,
+)
+from app.services.clients_search import ensure_clients_fts, search_clients
+from app.services.compute_pool import compute_pool
+from app.services.db import DB_PATH, get_connection, pool_stats, transaction
+from app.services.devis_detail import ensure_devis_detail, load_devis, save_devis_detail
+from app.services.devis_history import (
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    HistoryFilters,
+    date_to_iso,
+    ensure_devis_history,
+    fetch_devis_page,
+)
+from app.services.devis_refs import (
+    allocate_ref,
+    ensure_devis_refs,
+    is_reserved_for,
+    list_unused_refs,
+    mark_ref_used,
+    peek_next_ref,
+    ref_prefix,
+)
+from app.services.engine import QuoteAggregate, compute_devis, simulate_transport
+from app.services.lignes import HourdisColumns, PoutrelleColumns
+from app.services.parse_cache import parse_cache
+from app.services.pdf_cache import cache_stats as pdf_cache_stats
+from app.services.pdf_jobs import PDF_EAGER_RENDER, PdfJob, pdf_jobs
+from app.services.pdf_renderer import weasyprint_available
+from app.services.repricing import (
+    ensure_devis_inputs,
+    grid_from_dict,
+    iter_ndjson,
+    save_devis_inputs,
+    stream_report,
+)
+from app.services.sales_rollups import (
+    StatsFilters,
+    ensure_sales_rollups,
+    fetch_stats,
+    record_devis,
+)
+from app.services.startup import StartupReport, run_migrations
+from app.services.working_set import (
+    SESSION_COOKIE,
+    WorkingSet,
+    ensure_working_sets,
+    new_session_id,
+    working_sets,
+)
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "devis.db"
 UPLOAD_DIR = BASE_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
-PDF_DIR = BASE_DIR / "generated_pdfs"
-PDF_DIR.mkdir(exist_ok=True)
+PDF_DIR = Path(os.environ.get("DEVIS_PDF_DIR") or BASE_DIR / "generated_pdfs")
+PDF_DIR.mkdir(parents=True, exist_ok=True)
 TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
 templates = Environment(
@@ -36,9 +116,8 @@ SECRET_KEY = "change-moi-en-une-chaine-un-peu-longue"
 
 # --- Initialisation base SQLite (table users) ---
 
-def init_db_users():
+def _create_users_table(conn: sqlite3.Connection) -> None:
     """Crée la table users si elle n'existe pas et insère les commerciaux de base."""
-    conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
 
     # Création de la table
@@ -73,12 +152,6 @@ def init_db_users():
         seed_users,
     )
 
-    conn.commit()
-    conn.close()
-
-
-# Appel au démarrage du module (local + Render)
-init_db_users()
 
 def hash_password(pwd: str) -> str:
     """Retourne le hash SHA256 d'un mot de passe en texte clair."""
@@ -87,12 +160,10 @@ def hash_password(pwd: str) -> str:
 
 def authenticate_user(username: str, password: str):
     """Vérifie username / password, retourne le row user ou None."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE username = ?", (username,))
-    row = cur.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM users WHERE username = ?", (username,)
+        ).fetchone()
 
     if not row:
         return None
@@ -104,20 +175,16 @@ def authenticate_user(username: str, password: str):
 
 
 def get_current_user(request: Request):
-    """Récupère l'utilisateur courant à partir du cookie session_username."""
-    username = request.cookies.get("session_username")
+    """Récupère l'utilisateur courant à partir du cookie user_username (mis au login)."""
+    username = request.cookies.get("user_username")
     if not username:
         return None
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, username, code_commercial, nom FROM users WHERE username = ?",
-        (username,),
-    )
-    row = cur.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT id, username, code_commercial, nom FROM users WHERE username = ?",
+            (username,),
+        ).fetchone()
 
     if not row:
         return None
@@ -130,47 +197,36 @@ def get_current_user(request: Request):
     }
 
 
-# --- Initialisation table clients + import CSV si nécessaire ---
-def ensure_clients_imported():
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        # 1) vérifier si la table existe
-        cur.execute("""
-            SELECT name FROM sqlite_master
-            WHERE type='table' AND name='clients'
-        """)
-        has_table = cur.fetchone() is not None
-
-        if not has_table:
-            # si la table n'existe pas du tout, on lance l'import
-            conn.close()
-            print("Table clients absente → import CSV...")
-            import_clients()
-            return
-
-        # 2) si la table existe, vérifier si elle est vide
-        cur.execute("SELECT COUNT(*) FROM clients")
-        (nb,) = cur.fetchone()
-        conn.close()
-
-        if nb == 0:
-            print("Table clients vide → import CSV...")
-            import_clients()
-        else:
-            print(f"Table clients déjà peuplée ({nb} lignes), pas d'import.")
-    except Exception as e:
-        print("⚠️ Erreur ensure_clients_imported:", e)
+def require_user(request: Request) -> Dict[str, Any]:
+    """Utilisateur connecté, sinon 401 (routes d'administration / de calcul lourd)."""
+    user = get_current_user(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Connexion requise.")
+    return user
+
 
+# --- Import CSV clients si le fichier a changé depuis le dernier import ---
+def ensure_clients_imported(conn: sqlite3.Connection) -> None:
+    """
+    Synchronise la table clients avec le CSV de référence s'il a changé
+    (empreinte stat puis SHA-256) : seules les lignes modifiées sont
+    appliquées ; import complet si la table est vide.
+    """
+    if not CLIENTS_CSV.exists():
+        print(f"⚠️ CSV clients introuvable ({CLIENTS_CSV}), pas d'import.")
+        return
+    (nb,) = conn.execute("SELECT COUNT(*) FROM clients").fetchone()
+    report = sync_clients_csv(conn, CLIENTS_CSV, full=not nb)
+    if report is None:
+        print(f"Table clients à jour ({nb} lignes), CSV inchangé : pas d'import.")
+    else:
+        print(f"Import clients terminé. {report}")
 
-# Appel au démarrage du module
-ensure_clients_imported()
 
 # === Base SQLite clients ======================================================
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Connexion prêtée par le pool (à utiliser avec `with`)."""
+    return get_connection()
 
 
 class ClientCreate(BaseModel):
@@ -180,29 +236,23 @@ class ClientCreate(BaseModel):
 
 
 # === Logo en base64 pour HTML & PDF ==========================================
-STATIC_DIR = BASE_DIR / "static"
-LOGO_DATA_URI = ""
-
-try:
-    logo_path = STATIC_DIR / "logo_sbbm.jpg"
-    with open(logo_path, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode("ascii")
-        LOGO_DATA_URI = f"data:image/jpeg;base64,{encoded}"
-    print("Logo SBBM chargé en base64 pour PDF.")
-except Exception as e:
-    print("⚠️ Impossible de charger le logo SBBM :", e)
-          
-# === WeasyPrint optionnel =====================================================
-try:
-    from weasyprint import HTML, CSS  # type: ignore
-
-    WEASYPRINT_OK = True
-    print("WeasyPrint détecté : génération PDF activée.")
-except Exception as e:  # ImportError + libs natives manquantes
-    HTML = None  # type: ignore
-    CSS = None   # type: ignore
-    WEASYPRINT_OK = False
-    print("⚠️ WeasyPrint indisponible, PDF désactivé :", e)
+
+@lru_cache(maxsize=1)
+def logo_data_uri() -> str:
+    """Logo SBBM en base64 (HTML affiché) ; encodé au premier devis seulement."""
+    try:
+        with open(STATIC_DIR / "logo_sbbm.jpg", "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("ascii")
+        return f"data:image/jpeg;base64,{encoded}"
+    except Exception as e:
+        print("⚠️ Impossible de charger le logo SBBM :", e)
+        return ""
+
+
+def pdf_available() -> bool:
+    """WeasyPrint chargé (au démarrage, en arrière-plan, ou à la 1re demande)."""
+    return weasyprint_available()
+
 
 def get_pdf_path(ref_devis: str) -> Path:
     """Construit le chemin du fichier PDF pour un ref_devis donné."""
@@ -212,14 +262,9 @@ def get_pdf_path(ref_devis: str) -> Path:
     return PDF_DIR / f"Devis_SBBM_{safe_ref}.pdf"
     
 
-# === Compteur simple pour les références de devis ============================
-REF_COUNTER = 1  # redémarre à 1 à chaque lancement du serveur
-
 # === SQLite : création table devis si nécessaire ==============================
-def init_db():
-    """Crée les tables nécessaires et importe les clients depuis le CSV si besoin."""
-    # 1) Création des tables
-    conn = sqlite3.connect(DB_PATH)
+def _init_db(conn: sqlite3.Connection) -> None:
+    """Tables devis et clients (le CSV clients est importé par ensure_clients_imported)."""
     cur = conn.cursor()
 
     # Table devis (adapte les colonnes si tu as déjà une définition différente)
@@ -236,12 +281,16 @@ def init_db():
             nom_commercial TEXT,
             total_ht REAL,
             total_ttc REAL,
-            mode_saisie TEXT,
+            saisie_mode TEXT,
             mode_transport TEXT,
             transport_mode TEXT
         )
         """
     )
+    # Anciennes bases créées avec "mode_saisie" : insert_devis_row écrit "saisie_mode"
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(devis)")}
+    if "saisie_mode" not in cols:
+        cur.execute("ALTER TABLE devis ADD COLUMN saisie_mode TEXT")
 
     # Table clients
     cur.execute(
@@ -256,67 +305,50 @@ def init_db():
 
     conn.commit()
 
-    # 2) Import CSV si la table clients est vide
-    try:
-        cur.execute("SELECT COUNT(*) FROM clients")
-        nb = cur.fetchone()[0]
-    except Exception as e:
-        print("⚠️ Erreur lecture nombre de clients :", e)
-        nb = 0
 
-    if nb == 0 and CLIENTS_CSV.exists():
-        print(f"Import clients depuis : {CLIENTS_CSV}")
-        try:
-            rows_to_insert = []
-            with CLIENTS_CSV.open("r", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f, delimiter=";")
-                for row in reader:
-                    code = (row.get("CODE_CLIENT") or "").strip()
-                    nom = (row.get("NOM_CLIENT") or "").strip()
-                    if not code or not nom:
-                        continue
-                    rows_to_insert.append((code, nom))
+# === Migrations : étapes idempotentes, rejouées à chaque démarrage ===========
+SCHEMA_STEPS = (
+    _create_users_table,
+    _init_db,
+    # Index FTS5 pour l'auto-complétion clients (triggers = synchro automatique)
+    ensure_clients_fts,
+    # Empreintes des lignes du CSV clients (synchro incrémentale)
+    ensure_clients_sync,
+    # Entrées du moteur par devis (re-tarification de l'historique)
+    ensure_devis_inputs,
+    # Lignes + ventilation transport / poids de chaque devis
+    ensure_devis_detail,
+    # Historique : date ISO indexée, index commercial / client
+    ensure_devis_history,
+    # Statistiques de vente par mois / commercial / client (tableau de bord)
+    ensure_sales_rollups,
+    # Séquences de références devis + réservations
+    ensure_devis_refs,
+    # Catalogue de prix versionné (initialisé avec la grille de engine.py)
+    ensure_price_catalogue,
+    # Métrés du dernier devis de chaque session (/simulate-transport)
+    ensure_working_sets,
+)
 
-            with conn:
-                conn.executemany(
-                    "INSERT OR IGNORE INTO clients (code_client, nom_client) VALUES (?, ?)",
-                    rows_to_insert,
-                )
 
-            print(
-                f"Import terminé. {len(rows_to_insert)} lignes insérées (INSERT OR IGNORE)."
-            )
-        except Exception as e:
-            print("⚠️ Erreur import clients CSV :", e)
-    else:
-        print(f"Table clients déjà remplie ({nb} lignes). Pas d'import CSV.")
+def _ref_prefix_for(code_commercial: str, date_devis: str = "") -> str:
+    iso = date_to_iso(date_devis)
+    return ref_prefix(code_commercial, date.fromisoformat(iso) if iso else None)
 
-    conn.close()
 
-init_db()
-
-def get_next_ref_devis() -> str:
+def reserve_ref_devis(code_commercial: str, date_devis: str = "", reserved_by: str = "") -> str:
     """
-    Retourne la prochaine référence de devis au format D00001, D00002, ...
-    en se basant sur la dernière ligne de la table devis.
+    Attribue (et réserve) la prochaine référence, ex. D00001, D00002, ...
+    Atomique côté base : sûr avec plusieurs workers et des envois simultanés.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT ref_devis FROM devis ORDER BY id DESC LIMIT 1")
-    row = cur.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        return allocate_ref(conn, _ref_prefix_for(code_commercial, date_devis), reserved_by)
 
-    if not row or not row[0]:
-        return "D00001"
 
-    last = row[0]
-    # On suppose un format Dxxxxx
-    try:
-        num = int(last[1:])
-    except ValueError:
-        return "D00001"
-
-    return f"D{num + 1:05d}"
+def manual_ref_allowed(ref_devis: str, reserved_by: str) -> bool:
+    """Réf saisie à la main : réservation libre de `reserved_by` uniquement."""
+    with get_connection() as conn:
+        return is_reserved_for(conn, ref_devis, reserved_by)
 
 
 def insert_devis_row(
@@ -332,23 +364,60 @@ def insert_devis_row(
     saisie_mode: str,
     mode_transport: str,
     transport_mode: str,
+    inputs: Optional[Dict[str, Any]] = None,
+    detail: Optional[Dict[str, Any]] = None,
 ) -> None:
-    """Insère (ou remplace) un enregistrement dans la table devis."""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT OR REPLACE INTO devis (
+    """
+    Insère un enregistrement dans la table devis (jamais de remplacement :
+    réf déjà enregistrée → sqlite3.IntegrityError, rien n'est écrit).
+    `inputs` = arguments de compute_devis, gardés pour pouvoir re-tarifer le devis.
+    `detail` = contexte du devis (lignes, transport, poids, ...), pour le ré-afficher.
+    Les statistiques de vente suivent dans la même transaction.
+    """
+    with transaction() as conn:
+        mark_ref_used(conn, ref_devis)
+        _insert_devis_header(
+            conn,
             ref_devis, date_devis, client, chantier, code_client,
+            code_commercial, nom_commercial, total_ht, total_ttc,
+            saisie_mode, mode_transport, transport_mode,
+        )
+        if inputs is not None:
+            save_devis_inputs(conn, ref_devis, inputs)
+        if detail is not None:
+            save_devis_detail(conn, ref_devis, detail)
+        record_devis(conn, ref_devis)
+
+
+def _insert_devis_header(
+    conn: sqlite3.Connection,
+    ref_devis: str,
+    date_devis: str,
+    client: str,
+    chantier: str,
+    code_client: str,
+    code_commercial: str,
+    nom_commercial: str,
+    total_ht: float,
+    total_ttc: float,
+    saisie_mode: str,
+    mode_transport: str,
+    transport_mode: str,
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO devis (
+            ref_devis, date_devis, date_iso, client, chantier, code_client,
             code_commercial, nom_commercial,
             total_ht, total_ttc,
             saisie_mode, mode_transport, transport_mode
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             ref_devis,
             date_devis,
+            date_to_iso(date_devis),
             client,
             chantier,
             code_client,
@@ -361,56 +430,42 @@ def insert_devis_row(
             transport_mode,
         ),
     )
-    conn.commit()
-    conn.close()
-
-
-def fetch_devis_list(limit: int = 200) -> List[Dict[str, Any]]:
-    """Retourne les derniers devis pour l'historique."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT
-            id,
-            ref_devis,
-            date_devis,
-            client,
-            chantier,
-            total_ht,
-            total_ttc,
-            code_commercial,
-            nom_commercial
-        FROM devis
-        ORDER BY date_devis DESC, id DESC
-        LIMIT ?
-        """,
-        (limit,),
-    )
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return rows
-
-
-
-
-
-# === WeasyPrint optionnel =====================================================
-try:
-    from weasyprint import HTML  # type: ignore
-
-    WEASYPRINT_OK = True
-    print("WeasyPrint détecté : génération PDF activée.")
-except Exception as e:  # ImportError + libs natives manquantes
-    HTML = None  # type: ignore
-    WEASYPRINT_OK = False
-    print("⚠️ WeasyPrint indisponible, PDF désactivé :", e)
-
 
 
 # === FastAPI / Templates / Static ============================================
-app = FastAPI()
+startup = StartupReport()
+
+
+def _warm_pdf() -> None:
+    """Import WeasyPrint + workers PDF préchauffés (en arrière-plan)."""
+    logo_data_uri()
+    if pdf_available():
+        pdf_jobs.configure(css_path=str(STATIC_DIR / "style.css"), base_url=str(BASE_DIR))
+        pdf_jobs.start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # base + catalogue avant la première requête ; PDF en arrière-plan (/ready)
+    with startup.step("schema"):
+        with get_connection() as conn:
+            run_migrations(conn, DB_PATH, SCHEMA_STEPS)
+    with startup.step("clients", required=False):
+        with get_connection() as conn:
+            ensure_clients_imported(conn)
+        # modifications ultérieures du CSV appliquées sans redémarrage
+        clients_watcher.start()
+    with startup.step("catalogue"):
+        catalogue.refresh(force=True)
+    startup.in_background("pdf", _warm_pdf)
+    startup.mark_ready()
+    yield
+    clients_watcher.stop()
+    pdf_jobs.shutdown()
+    compute_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -443,21 +498,16 @@ def login_submit(
     # Petit log dans le terminal pour debug
     print("Tentative login →", repr(username_input), repr(password_input))
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-
     # 🔹 Requête ultra simple : username + password_hash
-    cur.execute(
-        """
-        SELECT id, username, password_hash, code_commercial, nom
-        FROM users
-        WHERE username = ? AND password_hash = ?
-        """,
-        (username_input, password_input),
-    )
-    row = cur.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        row = conn.execute(
+            """
+            SELECT id, username, password_hash, code_commercial, nom
+            FROM users
+            WHERE username = ? AND password_hash = ?
+            """,
+            (username_input, password_input),
+        ).fetchone()
 
     if not row:
         print("⚠️ Login échoué")
@@ -481,9 +531,13 @@ def login_submit(
 
 
 @app.get("/logout")
-def logout():
+def logout(request: Request):
     """Déconnexion : on supprime les cookies et on renvoie vers /login."""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if session_id:
+        working_sets.delete(session_id)
     resp = RedirectResponse(url="/login", status_code=302)
+    resp.delete_cookie(SESSION_COOKIE)
     resp.delete_cookie("user_id")
     resp.delete_cookie("user_username")
     resp.delete_cookie("user_code_commercial")
@@ -491,7 +545,7 @@ def logout():
     return resp
 
 @app.post("/clients/new")
-async def create_client(
+def create_client(
     code_client: str = Form(...),
     nom_client: str = Form(...),
 ):
@@ -504,20 +558,15 @@ async def create_client(
     if not code_client or not nom_client:
         raise HTTPException(status_code=400, detail="Code et nom obligatoires")
 
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
+    with transaction() as conn:
         # on garde le code_client unique
-        cur.execute(
+        conn.execute(
             """
             INSERT OR IGNORE INTO clients (code_client, nom_client)
             VALUES (?, ?)
             """,
             (code_client, nom_client),
         )
-        conn.commit()
-    finally:
-        conn.close()
 
     # Réponse simple pour le JS
     return JSONResponse(
@@ -537,11 +586,8 @@ COMMERCIAUX: Dict[str, str] = {
     "GA": "GÉNÉRAL",
 }
 
-# Pour l'endpoint AJAX de simulation de transport
-LAST_POUTRELLES: List[dict] = []
-LAST_HOURDIS: List[dict] = []
-LAST_SURFACE_CT: float = 0.0
-LAST_SURFACE_TS: float = 0.0
+# Les lignes utilisées par /simulate-transport sont gardées par session
+# (cookie devis_session) dans app.services.working_set.
 
 
 # === ROUTES ===================================================================
@@ -561,17 +607,19 @@ def devis_form(request: Request):
 
     today_str = date.today().strftime("%d/%m/%Y")
 
-    try:
-        next_ref = get_next_ref_devis()
-    except Exception as e:
-        print("⚠️ Erreur get_next_ref_devis:", e)
-        next_ref = ""
-
     # 🔹 Infos de l’utilisateur connecté (cookies mis au login)
     user_code_commercial = request.cookies.get("user_code_commercial", "")
     user_nom = request.cookies.get("user_nom", "")
     user_username = request.cookies.get("user_username", "")
 
+    # Réf indicative : la vraie est attribuée à l'enregistrement (/generate)
+    try:
+        with get_connection() as conn:
+            next_ref = peek_next_ref(conn, _ref_prefix_for(user_code_commercial))
+    except Exception as e:
+        print("⚠️ Erreur peek_next_ref:", e)
+        next_ref = ""
+
     return templates.TemplateResponse(
         "devis_form.html",
         {
@@ -587,7 +635,7 @@ def devis_form(request: Request):
 
 
 @app.post("/generate")
-async def generate_devis(
+def generate_devis(
     request: Request,
     code_client: str = Form(""),
     client: str = Form(...),
@@ -627,8 +675,11 @@ async def generate_devis(
     """
     Récupère le formulaire + (optionnellement) le CSV progiciel ou la saisie manuelle,
     calcule le devis puis renvoie l’HTML (et génère le PDF sur disque si WeasyPrint OK).
+    Handler synchrone : FastAPI l'exécute dans le threadpool, parsing, SQLite
+    (réf, enregistrement, working set, catalogue) et rendu ne bloquent pas la
+    boucle asyncio.
     """
-    global LAST_POUTRELLES, LAST_HOURDIS, LAST_SURFACE_CT, LAST_SURFACE_TS
+    session_id = request.cookies.get(SESSION_COOKIE) or new_session_id()
 
     # 🟢 Infos utilisateur depuis les cookies (mis au login)
     user_code_commercial = request.cookies.get("user_code_commercial", "")
@@ -638,11 +689,23 @@ async def generate_devis(
     # Si un code commercial est dans le cookie, on force cette valeur
     if user_code_commercial:
         code_commercial = user_code_commercial
+    code_commercial_up = (code_commercial or "GA").upper()
+    reserved_by = user_username or code_commercial_up
+
+    # Réf saisie : uniquement une réf réservée (non utilisée) par ce commercial,
+    # sinon on écraserait ou court-circuiterait la numérotation
+    ref_devis = (ref_devis or "").strip()
+    if ref_devis and not manual_ref_allowed(ref_devis, reserved_by):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Référence {ref_devis} non réservée à votre nom ou déjà utilisée.",
+        )
 
-    poutrelles: List[dict] = []
-    hourdis: List[dict] = []
+    poutrelles = PoutrelleColumns()
+    hourdis = HourdisColumns()
     surface_ct: float = 0.0
     surface_ts: float = 0.0
+    aggregate = QuoteAggregate()
 
     # Normaliser les listes manuelles pour éviter None
     manual_pout_type = manual_pout_type or []
@@ -652,40 +715,26 @@ async def generate_devis(
     manual_hourdis_type = manual_hourdis_type or []
     manual_hourdis_nombre = manual_hourdis_nombre or []
 
-    # Si la réf devis est vide (ou non envoyée), on génère automatiquement
-    if not ref_devis or not ref_devis.strip():
-        ref_devis = get_next_ref_devis()
-
     # === 1) MODE PROGICIEL ====================================================
     if saisie_mode == "progiciel":
         if fichier_progiciel and fichier_progiciel.filename:
-            suffix = ".csv"
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                shutil.copyfileobj(fichier_progiciel.file, tmp)
-                tmp_path = Path(tmp.name)
-
-            parsed = parse_progiciel_csv(tmp_path)
-            poutrelles = parsed.get("poutrelles", [])
-            hourdis = parsed.get("hourdis", [])
+            # Lecture en flux directement depuis l'upload (pas de fichier temporaire).
+            # Même fichier déjà envoyé (même SHA-256) → résultat en cache.
+            parsed = parse_cache.parse(fichier_progiciel.file)
+            poutrelles = parsed.get("poutrelles") or poutrelles
+            hourdis = parsed.get("hourdis") or hourdis
             surface_ct = float(parsed.get("surface_ct", 0.0) or 0.0)
             surface_ts = float(parsed.get("surface_ts", 0.0) or 0.0)
+            aggregate = QuoteAggregate.from_dict(parsed.get("aggregate"))
 
-            print(
-                f"DEBUG parse_progiciel_csv: {len(poutrelles)} poutrelles, "
-                f"{len(hourdis)} hourdis, SURFACE CT={surface_ct}, SURFACE TS={surface_ts}"
+            logger.debug(
+                "progiciel : %d poutrelles, %d hourdis, surface CT=%s, surface TS=%s",
+                len(poutrelles), len(hourdis), surface_ct, surface_ts,
             )
 
-            LAST_POUTRELLES = poutrelles
-            LAST_HOURDIS = hourdis
-            LAST_SURFACE_CT = surface_ct
-            LAST_SURFACE_TS = surface_ts
-
-            try:
-                tmp_path.unlink(missing_ok=True)
-            except Exception:
-                pass
+            working_sets.put(session_id, WorkingSet(aggregate, surface_ct, surface_ts))
         else:
-            print("DEBUG generate_devis: mode progiciel mais aucun fichier fourni.")
+            logger.debug("generate_devis : mode progiciel mais aucun fichier fourni.")
 
     # === 2) MODE MANUEL =======================================================
     else:
@@ -704,14 +753,7 @@ async def generate_devis(
                 continue
             if L_val <= 0 or n_val <= 0:
                 continue
-            poutrelles.append(
-                {
-                    "type": t_str,
-                    "longueur": L_val,
-                    "etrier": e_val,
-                    "nombre": n_val,
-                }
-            )
+            poutrelles.add(t_str, L_val, e_val, n_val)
 
         # Hourdis manuels
         for t, q in zip(manual_hourdis_type, manual_hourdis_nombre):
@@ -724,51 +766,82 @@ async def generate_devis(
                 continue
             if q_val <= 0:
                 continue
-            hourdis.append({"type": t_str, "nombre": q_val})
+            hourdis.add(t_str.upper(), q_val)
 
         surface_ct = float(surface_ct_manual or 0.0)
         # On reconstruit surface_ts à partir du nombre de treillis saisi
         surface_ts = float(nb_treillis_manual or 0.0) * 10.0
+        aggregate = QuoteAggregate.from_lines(poutrelles, hourdis)
 
-        print(
-            f"DEBUG saisie manuelle: {len(poutrelles)} poutrelles, "
-            f"{len(hourdis)} hourdis, SURFACE CT={surface_ct}, SURFACE TS={surface_ts}"
+        logger.debug(
+            "saisie manuelle : %d poutrelles, %d hourdis, surface CT=%s, surface TS=%s",
+            len(poutrelles), len(hourdis), surface_ct, surface_ts,
         )
 
-        LAST_POUTRELLES = poutrelles
-        LAST_HOURDIS = hourdis
-        LAST_SURFACE_CT = surface_ct
-        LAST_SURFACE_TS = surface_ts
+        working_sets.put(session_id, WorkingSet(aggregate, surface_ct, surface_ts))
 
     # === 3) CALCUL DU DEVIS ===================================================
-    data_calc = compute_devis(
-        poutrelles,
-        hourdis,
-        surface_ct,
-        surface_ts,
-        remise_poutrelle,
-        remise_hourdis,
-        prix_ct,
-        prix_treillis,
-        mode_transport,
-        transport_mode,
-        distance_km,
-        transport_prix_poutrelle_manuel,
-        transport_prix_hourdis_manuel,
-    )
-
-    print(
-        "DEBUG main.generate_devis -> "
-        f"poutrelles={len(poutrelles)}, hourdis={len(hourdis)}, "
-        f"SURFACE CT={surface_ct}, SURFACE TS={surface_ts}, "
-        f"transport_total_choisi={data_calc.get('transport_total_choisi')}"
-    )
+    engine_inputs: Dict[str, Any] = {
+        "poutrelles": poutrelles,
+        "hourdis": hourdis,
+        "surface_ct": surface_ct,
+        "surface_ts": surface_ts,
+        "remise_poutrelle": remise_poutrelle,
+        "remise_hourdis": remise_hourdis,
+        "prix_ct": prix_ct,
+        "prix_treillis": prix_treillis,
+        "mode_transport": mode_transport,
+        "transport_mode": transport_mode,
+        "distance_km": distance_km,
+        "transport_poutrelle_manuel": transport_prix_poutrelle_manuel,
+        "transport_hourdis_manuel": transport_prix_hourdis_manuel,
+    }
+    # Grille prise une fois pour toute la requête (échange atomique côté catalogue)
+    data_calc = compute_devis(**engine_inputs, grid=get_catalogue().grid, aggregate=aggregate)
 
-    # === 4) SAUVEGARDE EN BASE SQLITE ========================================
+    # === 4) CONTEXTE TEMPLATE ================================================
     date_devis_finale = date_devis or date.today().strftime("%d/%m/%Y")
-    code_commercial_up = (code_commercial or "GA").upper()
     nom_commercial = user_nom or COMMERCIAUX.get(code_commercial_up, "")
 
+    # Réf vide (cas du formulaire) : attribuée maintenant, une fois le calcul fait
+    if not ref_devis:
+        ref_devis = reserve_ref_devis(code_commercial_up, date_devis_finale, reserved_by)
+
+    context: Dict[str, Any] = {
+        "request": request,
+        "code_client": code_client,
+        "client": client,
+        "chantier": chantier,
+        "niveau": niveau,
+        "affaire": affaire,
+        "ref_devis": ref_devis,
+        "date_devis": date_devis_finale,
+        "mode_livraison": mode_livraison,
+        "distance_km": distance_km,
+        "validite": validite,
+        "code_commercial": code_commercial_up,
+        "nom_commercial": nom_commercial,
+        # Infos user (pour bandeau, etc.)
+        "user_code_commercial": user_code_commercial,
+        "user_nom": user_nom,
+        "user_username": user_username,
+        "mode_transport": mode_transport,
+        "transport_mode": transport_mode,
+        "transport_prix_poutrelle_manuel": transport_prix_poutrelle_manuel,
+        "transport_prix_hourdis_manuel": transport_prix_hourdis_manuel,
+        "remise_poutrelle": remise_poutrelle,
+        "remise_hourdis": remise_hourdis,
+        "prix_ct": prix_ct,
+        "prix_treillis": prix_treillis,
+        "saisie_mode": saisie_mode,
+        "surface_ct": surface_ct,
+        "surface_ts": surface_ts,
+        "logo_data_uri": logo_data_uri(),
+        "pdf_available": pdf_available(),
+        **data_calc,
+    }
+
+    # === 5) SAUVEGARDE EN BASE SQLITE (en-tête, entrées, lignes) =============
     try:
         insert_devis_row(
             ref_devis=ref_devis,
@@ -783,29 +856,151 @@ async def generate_devis(
             saisie_mode=saisie_mode,
             mode_transport=mode_transport,
             transport_mode=transport_mode,
+            inputs=engine_inputs,
+            detail=context,
+        )
+    except sqlite3.IntegrityError:
+        # réservation libre utilisée entre-temps par un envoi simultané
+        raise HTTPException(
+            status_code=409,
+            detail=f"Référence {ref_devis} déjà enregistrée.",
         )
     except Exception as e:
         print("⚠️ Erreur insert_devis_row:", e)
 
-    # === 5) CONTEXTE TEMPLATE ================================================
-    context: Dict[str, Any] = {
+    # === 6) Rendu HTML + génération PDF éventuelle ===========================
+    template = templates.get_template("devis.html")
+    html = template.render(context)
+
+    response = HTMLResponse(content=html)
+    if request.cookies.get(SESSION_COOKIE) != session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+    # Le PDF est rendu hors requête (pool de processus), ou seulement au
+    # premier /pdf/{ref} ; en mode immédiat le client récupère l'id du job.
+    job = _schedule_pdf(ref_devis, context)
+    if job is not None:
+        response.headers["X-PDF-Job"] = job.job_id
+
+    return response
+
+
+def _schedule_pdf(ref_devis: str, context: Dict[str, Any]) -> Optional[PdfJob]:
+    """
+    Après l'enregistrement d'un devis : rendu PDF immédiat si PDF_EAGER_RENDER,
+    sinon on retire l'éventuel PDF d'un devis précédent de même réf (il sera
+    refait depuis la base au premier téléchargement).
+    """
+    if PDF_EAGER_RENDER:
+        return _submit_pdf_job(ref_devis, context)
+    get_pdf_path(ref_devis).unlink(missing_ok=True)
+    return None
+
+
+class PdfSubmitError(Exception):
+    """Le devis existe mais son rendu PDF n'a pas pu être déposé dans le pool."""
+
+
+def _render_pdf_job(ref_devis: str, context: Dict[str, Any]) -> PdfJob:
+    """Rend le HTML du devis et dépose son PDF dans le pool (exceptions remontées)."""
+    # Pour le PDF, le logo reste une URL /static/ : le moteur garde
+    # l'image décodée en cache au lieu de re-parser le base64.
+    pdf_html = templates.get_template("devis.html").render({**context, "logo_data_uri": ""})
+    return pdf_jobs.submit(
+        ref_devis=ref_devis,
+        html=pdf_html,
+        out_path=get_pdf_path(ref_devis),
+        base_url=str(BASE_DIR),
+        css_path=str(STATIC_DIR / "style.css"),
+    )
+
+
+def _submit_pdf_job(ref_devis: str, context: Dict[str, Any]) -> Optional[PdfJob]:
+    """Dépose le rendu PDF du devis dans le pool ; retourne le job (ou None)."""
+    if not pdf_available():
+        return None
+    try:
+        return _render_pdf_job(ref_devis, context)
+    except Exception as e:
+        print("⚠️ Erreur génération PDF :", e)
+        return None
+
+
+@app.post("/generate/batch")
+async def generate_devis_batch(
+    request: Request,
+    fichier_zip: UploadFile = File(...),
+    code_client: str = Form(""),
+    client: str = Form(...),
+    chantier: str = Form(...),
+    affaire: str = Form(""),
+    date_devis: str = Form(""),
+    mode_livraison: str = Form("SOLO"),
+    distance_km: float = Form(0.0),
+    validite: str = Form("30 jours"),
+    code_commercial: str = Form("GA"),
+    remise_poutrelle: float = Form(0.0),
+    remise_hourdis: float = Form(0.0),
+    prix_ct: float = Form(3.0),
+    prix_treillis: float = Form(160.0),
+    mode_transport: str = Form("depart"),
+    transport_mode: str = Form("auto"),
+    transport_prix_poutrelle_manuel: float = Form(0.0),
+    transport_prix_hourdis_manuel: float = Form(0.0),
+):
+    """
+    Un devis par CSV progiciel du zip (un fichier par bâtiment / niveau),
+    avec les mêmes paramètres commerciaux et transport pour tous. Le niveau
+    du devis est le nom du fichier. Réponse NDJSON en flux : une ligne par
+    fichier (ref_devis, totaux, id du job PDF, ou erreur), puis {"summary": ...}.
+    """
+    await run_in_threadpool(require_user, request)
+    user_code_commercial = request.cookies.get("user_code_commercial", "")
+    user_nom = request.cookies.get("user_nom", "")
+    user_username = request.cookies.get("user_username", "")
+    if user_code_commercial:
+        code_commercial = user_code_commercial
+
+    # zip recopié par blocs (borné en mémoire et en taille), lu depuis le threadpool
+    try:
+        spool = await run_in_threadpool(spool_upload, fichier_zip.file)
+    except BatchTooLarge as e:
+        return JSONResponse({"detail": str(e)}, status_code=413)
+    try:
+        zf, members = await run_in_threadpool(open_batch_zip, spool)
+    except BatchError as e:
+        spool.close()
+        return JSONResponse({"detail": str(e)}, status_code=400)
+
+    params = {
+        "remise_poutrelle": remise_poutrelle,
+        "remise_hourdis": remise_hourdis,
+        "prix_ct": prix_ct,
+        "prix_treillis": prix_treillis,
+        "mode_transport": mode_transport,
+        "transport_mode": transport_mode,
+        "distance_km": distance_km,
+        "transport_poutrelle_manuel": transport_prix_poutrelle_manuel,
+        "transport_hourdis_manuel": transport_prix_hourdis_manuel,
+    }
+    # même grille pour tout le lot ; copie en dicts simples pour les workers
+    grid = grid_from_dict({}, base=(await run_in_threadpool(get_catalogue)).grid)
+
+    date_devis_finale = date_devis or date.today().strftime("%d/%m/%Y")
+    code_commercial_up = (code_commercial or "GA").upper()
+    nom_commercial = user_nom or COMMERCIAUX.get(code_commercial_up, "")
+    base_context: Dict[str, Any] = {
         "request": request,
         "code_client": code_client,
         "client": client,
         "chantier": chantier,
-        "niveau": niveau,
         "affaire": affaire,
-        "ref_devis": ref_devis,
         "date_devis": date_devis_finale,
         "mode_livraison": mode_livraison,
         "distance_km": distance_km,
         "validite": validite,
         "code_commercial": code_commercial_up,
         "nom_commercial": nom_commercial,
-        # Infos user (pour bandeau, etc.)
-        "user_code_commercial": user_code_commercial,
-        "user_nom": user_nom,
-        "user_username": user_username,
         "mode_transport": mode_transport,
         "transport_mode": transport_mode,
         "transport_prix_poutrelle_manuel": transport_prix_poutrelle_manuel,
@@ -814,41 +1009,157 @@ async def generate_devis(
         "remise_hourdis": remise_hourdis,
         "prix_ct": prix_ct,
         "prix_treillis": prix_treillis,
-        "saisie_mode": saisie_mode,
-        "logo_data_uri": LOGO_DATA_URI,
-        "pdf_available": WEASYPRINT_OK and HTML is not None,
-        **data_calc,
+        "saisie_mode": "progiciel",
+        "logo_data_uri": logo_data_uri(),
+        "pdf_available": pdf_available(),
     }
 
-    # === 6) Rendu HTML + génération PDF éventuelle ===========================
-    template = templates.get_template("devis.html")
-    html = template.render(context)
+    def persist(priced: Dict[str, Any]) -> Dict[str, Any]:
+        data_calc = priced["result"]
+        ref_devis = reserve_ref_devis(
+            code_commercial_up, date_devis_finale, user_username or code_commercial_up
+        )
+        context = {
+            **base_context,
+            "ref_devis": ref_devis,
+            "niveau": Path(priced["file"]).stem,
+            "surface_ct": priced["inputs"]["surface_ct"],
+            "surface_ts": priced["inputs"]["surface_ts"],
+            **data_calc,
+        }
+        insert_devis_row(
+            ref_devis=ref_devis,
+            date_devis=date_devis_finale,
+            client=client,
+            chantier=chantier,
+            code_client=code_client,
+            code_commercial=code_commercial_up,
+            nom_commercial=nom_commercial,
+            total_ht=data_calc.get("total_ht", 0.0),
+            total_ttc=data_calc.get("total_ttc", 0.0),
+            saisie_mode="progiciel",
+            mode_transport=mode_transport,
+            transport_mode=transport_mode,
+            inputs=priced["inputs"],
+            detail=context,
+        )
+        job = _schedule_pdf(ref_devis, context)
+        return {
+            "ref_devis": ref_devis,
+            "total_ht": data_calc["total_ht"],
+            "total_ttc": data_calc["total_ttc"],
+            "pdf_job": job.job_id if job is not None else None,
+        }
 
-    if WEASYPRINT_OK and HTML is not None:
-        try:
-            stylesheets = []
-            if CSS is not None:
-                stylesheets = [CSS(str(BASE_DIR / "static" / "style.css"))]
+    logger.debug("generate_devis_batch : %d CSV dans %s", len(members), fichier_zip.filename)
+    return StreamingResponse(
+        iter_ndjson(generate_batch(zf, members, params, grid, persist)),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(spool.close),
+    )
 
-            pdf_bytes = HTML(
-                string=html,
-                base_url=str(BASE_DIR),
-            ).write_pdf(stylesheets=stylesheets)
 
-            pdf_path = get_pdf_path(ref_devis)
-            with open(pdf_path, "wb") as f:
-                f.write(pdf_bytes)
+@app.get("/pdf/jobs/{job_id}")
+def pdf_job_status(job_id: str):
+    """Statut d'un rendu PDF : queued / rendering / done / failed."""
+    job = pdf_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job PDF inconnu.")
+    return job.to_dict()
+
+
+# Rendus PDF "à la demande" en préparation (lecture base + HTML), par réf :
+# des /pdf/{ref} simultanés attendent le même résultat (single-flight).
+_pdf_builds: Dict[str, Future] = {}
+_pdf_builds_lock = threading.Lock()
+
+
+def _devis_exists(ref_devis: str) -> bool:
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT 1 FROM devis WHERE ref_devis = ?", (ref_devis,)
+        ).fetchone() is not None
+
+
+def _submit_pdf_from_db(ref_devis: str) -> Optional[PdfJob]:
+    """
+    Re-rend le devis enregistré (en-tête + détail + lignes) et dépose son PDF.
+    None si le devis est introuvable ; PdfSubmitError si le rendu n'a pas pu
+    être déposé.
+    """
+    with get_connection() as conn:
+        data = load_devis(conn, ref_devis)
+    if data is None:
+        return None
+    context = {
+        **data,
+        "user_code_commercial": "",
+        "user_nom": "",
+        "user_username": "",
+        "logo_data_uri": logo_data_uri(),
+        "pdf_available": True,
+    }
+    try:
+        return _render_pdf_job(ref_devis, context)
+    except Exception as e:
+        print(f"⚠️ Erreur génération PDF ({ref_devis}) :", e)
+        raise PdfSubmitError(str(e) or e.__class__.__name__) from e
+
+
+def _build_pdf_once(ref_devis: str) -> Optional[PdfJob]:
+    with _pdf_builds_lock:
+        pending = _pdf_builds.get(ref_devis)
+        owner = pending is None
+        if owner:
+            pending = _pdf_builds[ref_devis] = Future()
+    if owner:
+        try:
+            pending.set_result(_submit_pdf_from_db(ref_devis))
+        except BaseException as e:
+            pending.set_exception(e)
+        finally:
+            with _pdf_builds_lock:
+                del _pdf_builds[ref_devis]
+    return pending.result()
 
-            print(f"PDF sauvegardé : {pdf_path}")
-        except Exception as e:
-            print("⚠️ Erreur génération PDF :", e)
 
-    return HTMLResponse(content=html)
-    
 @app.get("/pdf/{ref_devis}")
-def export_pdf(ref_devis: str):
-    """Retourne le PDF correspondant à la réf devis."""
+async def export_pdf(ref_devis: str):
+    """
+    Retourne le PDF correspondant à la réf devis. S'il n'existe pas (jamais
+    demandé, disque éphémère, nettoyage...), il est refait depuis la base ;
+    on attend le rendu en cours.
+    """
     pdf_path = get_pdf_path(ref_devis)
+
+    job = pdf_jobs.latest_for_ref(ref_devis)
+    if (job is None or job.finished) and not pdf_path.exists():
+        if not pdf_available():
+            if not await run_in_threadpool(_devis_exists, ref_devis):
+                raise HTTPException(status_code=404, detail="Devis introuvable.")
+            raise HTTPException(status_code=503, detail="Génération PDF indisponible sur ce serveur.")
+        try:
+            job = await run_in_threadpool(_build_pdf_once, ref_devis)
+        except PdfSubmitError as e:
+            raise HTTPException(status_code=500, detail=f"Échec de la préparation du PDF : {e}")
+        if job is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Devis introuvable (ou enregistré sans ses lignes), regénérez le devis.",
+            )
+
+    if job is not None and not job.finished:
+        await pdf_jobs.wait(job)
+        if not job.finished:
+            return JSONResponse(
+                job.to_dict(),
+                status_code=202,
+                headers={"Retry-After": "2", "Location": f"/pdf/jobs/{job.job_id}"},
+            )
+
+    if job is not None and job.status == "failed" and not pdf_path.exists():
+        raise HTTPException(status_code=500, detail=f"Échec du rendu PDF : {job.error}")
+
     if not pdf_path.exists():
         raise HTTPException(status_code=404, detail="PDF introuvable, regénérez le devis.")
 
@@ -856,11 +1167,12 @@ def export_pdf(ref_devis: str):
         path=str(pdf_path),
         media_type="application/pdf",
         filename=pdf_path.name,
-    )   
+    )
 
 
 @app.post("/simulate-transport")
-async def simulate_transport_endpoint(
+def simulate_transport_endpoint(
+    request: Request,
     distance_km: float = Body(...),
     mode_transport: str = Body("depart"),
     transport_mode: str = Body("auto"),
@@ -869,32 +1181,71 @@ async def simulate_transport_endpoint(
 ):
     """
     Endpoint AJAX pour calculer en direct le coût de transport
-    à partir du dernier CSV ou de la dernière saisie manuelle.
+    à partir du dernier CSV ou de la dernière saisie manuelle de CETTE session.
     """
-    global LAST_POUTRELLES, LAST_HOURDIS
+    session_id = request.cookies.get(SESSION_COOKIE)
+    ws = (working_sets.get(session_id) if session_id else None) or WorkingSet()
 
+    # métrés par type déjà agrégés : quelques opérations, quel que soit le fichier
     info = simulate_transport(
-        LAST_POUTRELLES,
-        LAST_HOURDIS,
+        [],
+        [],
         distance_km,
         mode_transport,
         transport_mode,
         transport_prix_poutrelle_manuel,
         transport_prix_hourdis_manuel,
+        grid=current_grid(),
+        aggregate=ws.aggregate,
     )
     return JSONResponse(info)
 
 @app.get("/devis/historique", response_class=HTMLResponse)
-def devis_historique(request: Request):
-    """Affiche la liste des devis enregistrés en base."""
-    devis_list = fetch_devis_list(limit=200)
+def devis_historique(
+    request: Request,
+    code_commercial: str = "",
+    code_client: str = "",
+    client: str = "",
+    date_min: str = "",
+    date_max: str = "",
+    montant_min: str = "",
+    montant_max: str = "",
+    cursor: str = "",
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Liste des devis enregistrés, plus récents d'abord, par pages (curseur) ;
+    filtres commercial, client, période et montant HT.
+    """
+    filters = HistoryFilters.from_params(
+        code_commercial=code_commercial,
+        code_client=code_client,
+        client=client,
+        date_min=date_min,
+        date_max=date_max,
+        montant_min=montant_min,
+        montant_max=montant_max,
+    )
+    with get_connection() as conn:
+        devis_list, next_cursor = fetch_devis_page(conn, filters, cursor, limit)
+
+    params = filters.to_params()
+    if limit != PAGE_SIZE:
+        params["limit"] = str(limit)
+    next_url = f"/devis/historique?{urlencode({**params, 'cursor': next_cursor})}" if next_cursor else ""
     return templates.TemplateResponse(
         "devis_historique.html",
         {
             "request": request,
             "devis_list": devis_list,
+            "filters": filters,
+            "liste_commerciaux": COMMERCIAUX,
+            "next_url": next_url,
+            "first_url": f"/devis/historique?{urlencode(params)}" if cursor else "",
         },
     )
+
+
 @app.get("/api/clients")
 def api_search_clients(q: str = Query("", min_length=0, description="Code ou nom client")):
     """
@@ -910,35 +1261,15 @@ def api_search_clients(q: str = Query("", min_length=0, description="Code ou nom
         return JSONResponse(results)
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        # Recherche sur code_client OU nom_client (insensible à la casse)
-        cur.execute(
-            """
-            SELECT code_client, nom_client
-            FROM clients
-            WHERE code_client LIKE ? OR nom_client LIKE ?
-            ORDER BY nom_client
-            LIMIT 20
-            """,
-            (f"%{term}%", f"%{term}%"),
-        )
-        rows = cur.fetchall()
-        conn.close()
-
-        for code_client, nom_client in rows:
-            results.append(
-                {
-                    "code_client": code_client.strip() if code_client else "",
-                    "nom_client": nom_client.strip() if nom_client else "",
-                }
-            )
+        with get_connection() as conn:
+            # Préfixes de mots sur code_client / nom_client (casse + accents ignorés)
+            results = search_clients(conn, term)
     except Exception as e:
         print("⚠️ Erreur api_search_clients:", e)
 
     return JSONResponse(results)
 @app.post("/api/clients")
-async def api_create_client(payload: dict = Body(...)):
+def api_create_client(payload: dict = Body(...)):
     """
     Création rapide d'un client depuis le formulaire (+ Nouveau client).
     - Si le code_client n'existe pas encore => insertion.
@@ -953,40 +1284,136 @@ async def api_create_client(payload: dict = Body(...)):
             status_code=400,
         )
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-
-    try:
-        with conn:
-            cur = conn.execute(
-                "INSERT INTO clients (code_client, nom_client) VALUES (?, ?)",
-                (code, nom),
-            )
-        client_id = cur.lastrowid
-        status = "created"
-    except sqlite3.IntegrityError:
-        # Le code client existe déjà, on récupère la ligne
-        cur = conn.execute(
-            "SELECT id, code_client, nom_client FROM clients WHERE code_client = ?",
-            (code,),
-        )
-        row = cur.fetchone()
-        if not row:
-            conn.close()
-            return JSONResponse(
-                {"detail": "Erreur interne lors de la récupération du client."},
-                status_code=500,
-            )
-        client_id = row["id"]
-        code = row["code_client"]
-        nom = row["nom_client"]
-        status = "exists"
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        try:
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO clients (code_client, nom_client) VALUES (?, ?)",
+                    (code, nom),
+                )
+            client_id = cur.lastrowid
+            status = "created"
+        except sqlite3.IntegrityError:
+            # Le code client existe déjà, on récupère la ligne
+            row = conn.execute(
+                "SELECT id, code_client, nom_client FROM clients WHERE code_client = ?",
+                (code,),
+            ).fetchone()
+            if not row:
+                return JSONResponse(
+                    {"detail": "Erreur interne lors de la récupération du client."},
+                    status_code=500,
+                )
+            client_id = row["id"]
+            code = row["code_client"]
+            nom = row["nom_client"]
+            status = "exists"
 
     return {
         "status": status,          # "created" ou "exists"
         "id": client_id,
         "code_client": code,
         "nom_client": nom,
-    }
\ No newline at end of file
+    }
+
+
+@app.post("/admin/clients/import")
+def admin_import_clients(
+    request: Request,
+    fichier_csv: UploadFile | None = File(None),
+    prune: bool = Form(False),
+):
+    """
+    Ré-import du fichier clients (envoyé, sinon data/liste_client_sbbm.csv) :
+    une transaction, seul l'écart est appliqué ; prune=true supprime aussi
+    les clients absents du fichier. Retourne les compteurs de l'import.
+    """
+    require_user(request)
+    try:
+        with get_connection() as conn:
+            if fichier_csv and fichier_csv.filename:
+                report = sync_clients_file(conn, fichier_csv.file, prune=prune)
+            else:
+                report = sync_clients_csv(conn, CLIENTS_CSV, prune=prune, full=True)
+    except (OSError, ValueError, csv.Error) as e:
+        return JSONResponse({"detail": f"Fichier clients illisible : {e}"}, status_code=400)
+    print(f"Import clients (admin) : {report}")
+    return report.to_dict()
+
+
+@app.post("/api/repricing")
+def api_repricing(request: Request, payload: dict = Body(...)):
+    """
+    Impact d'une grille de prix candidate sur tout l'historique, ex. :
+      {"poutrelle_ml": {"113": 30.5}, "hourdis_u": {"H16": 5.9}, "etrier": 0.95}
+    Réponse NDJSON en flux : une ligne par devis (ancien / nouveau total),
+    puis une ligne {"summary": ...}.
+    """
+    require_user(request)
+    try:
+        grid = grid_from_dict(payload, base=current_grid())
+    except (TypeError, ValueError, AttributeError) as e:
+        return JSONResponse({"detail": f"Grille invalide : {e}"}, status_code=400)
+    return StreamingResponse(
+        iter_ndjson(stream_report(grid)), media_type="application/x-ndjson"
+    )
+
+
+@app.get("/api/stats")
+def api_stats(
+    request: Request,
+    group_by: str = Query("commercial,mois"),
+    code_commercial: str = Query(""),
+    code_client: str = Query(""),
+    mois_min: str = Query(""),
+    mois_max: str = Query(""),
+):
+    """
+    Ventes agrégées (nb de devis, HT, TTC, tonnage, transport), ex. :
+      /api/stats?group_by=commercial,mois&mois_min=2026-01&mois_max=2026-12
+    group_by parmi mois, commercial, client (vide = total seul).
+    Lit uniquement la table stats_ventes, jamais l'historique complet.
+    """
+    require_user(request)
+    filters = StatsFilters(
+        code_commercial=code_commercial,
+        code_client=code_client,
+        mois_min=mois_min.strip(),
+        mois_max=mois_max.strip(),
+    )
+    dims = [g.strip() for g in group_by.split(",") if g.strip()]
+    try:
+        with get_connection() as conn:
+            return fetch_stats(conn, dims, filters)
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
+
+
+@app.get("/api/refs/unused")
+def api_unused_refs(request: Request, limit: int = Query(200, ge=1, le=1000)):
+    """Références réservées mais jamais enregistrées (trous de numérotation)."""
+    require_user(request)
+    with get_connection() as conn:
+        return {"unused": list_unused_refs(conn, limit)}
+
+
+@app.get("/ready")
+def ready():
+    """Sonde de disponibilité : 503 tant que le démarrage n'est pas terminé."""
+    return JSONResponse(startup.to_dict(), status_code=200 if startup.ready else 503)
+
+
+@app.get("/api/metrics")
+def api_metrics():
+    """Compteurs internes (pool SQLite, ...) pour le suivi de charge."""
+    return {
+        "db_pool": pool_stats(),
+        "pdf_jobs": pdf_jobs.stats(),
+        "compute_pool": compute_pool.stats(),
+        "pdf_cache": pdf_cache_stats(),
+        "parse_cache": parse_cache.stats(),
+        "price_catalogue": catalogue.stats(),
+        "working_sets": working_sets.stats(),
+        "startup": startup.to_dict(),
+        "clients_watcher": clients_watcher.stats(),
+    }
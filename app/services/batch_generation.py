@@ -0,0 +1,234 @@
+# app/services/batch_generation.py
+from __future__ import annotations
+
+import io
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import PurePosixPath
+from typing import IO, Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from app.services.compute_pool import compute_pool
+from app.services.engine import PriceGrid, QuoteAggregate, compute_devis
+from app.services.parser_progiciel import parse_progiciel_csv
+
+# Génération de devis en lot à partir d'un zip d'exports progiciel (un CSV
+# par bâtiment / niveau), avec des paramètres commerciaux et transport communs.
+#
+# - l'upload est recopié par blocs dans un SpooledTemporaryFile (en mémoire
+#   jusqu'à SPOOL_MEMORY_BYTES, sur disque au-delà) et refusé au-delà de
+#   MAX_ZIP_BYTES ;
+# - chaque CSV est parsé (parse_progiciel_csv) et chiffré (compute_devis)
+#   dans le pool de processus partagé (compute_pool) ; on ne garde qu'un
+#   nombre borné de fichiers en vol ;
+# - les résultats remontent dans l'ordre où ils sont prêts : l'appelant
+#   enregistre le devis et lance le PDF (callback `persist`), puis on produit
+#   une ligne de progression par fichier et un résumé final.
+# Les fichiers sont lus un par un dans le zip : rien n'est extrait sur disque,
+# et la décompression d'un fichier s'arrête à MAX_CSV_BYTES octets réellement
+# produits (la taille déclarée dans le zip n'est qu'un premier filtre).
+
+BATCH_WORKERS = min(4, compute_pool.max_workers)
+MAX_PENDING_FILES = 2 * BATCH_WORKERS
+MAX_BATCH_FILES = 200
+MAX_CSV_BYTES = 50 * 1024 * 1024  # taille décompressée max d'un CSV du zip
+MAX_ZIP_BYTES = 200 * 1024 * 1024  # taille max du zip envoyé
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024  # au-delà, le zip reçu passe sur disque
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# paramètres communs transmis tels quels à compute_devis
+SHARED_ENGINE_PARAMS = (
+    "remise_poutrelle",
+    "remise_hourdis",
+    "prix_ct",
+    "prix_treillis",
+    "mode_transport",
+    "transport_mode",
+    "distance_km",
+    "transport_poutrelle_manuel",
+    "transport_hourdis_manuel",
+)
+
+
+class BatchError(ValueError):
+    """Zip illisible ou hors limites (refusé avant tout traitement)."""
+
+
+class BatchTooLarge(BatchError):
+    """Zip envoyé au-delà de MAX_ZIP_BYTES."""
+
+
+def spool_upload(src: IO[bytes], max_bytes: int = MAX_ZIP_BYTES) -> IO[bytes]:
+    """
+    Recopie l'upload par blocs dans un fichier temporaire borné en mémoire ;
+    BatchTooLarge dès que `max_bytes` est dépassé. Fichier rembobiné, à
+    fermer par l'appelant.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    try:
+        while True:
+            chunk = src.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise BatchTooLarge(f"Zip trop volumineux (maximum {max_bytes} octets).")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def list_csv_members(zf: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """CSV du zip, dans l'ordre du zip (dossiers et fichiers cachés ignorés)."""
+    members = []
+    for info in zf.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.suffix.lower() != ".csv":
+            continue
+        if any(part.startswith((".", "__MACOSX")) for part in path.parts):
+            continue
+        if info.file_size > MAX_CSV_BYTES:
+            raise BatchError(f"{info.filename} : fichier trop volumineux ({info.file_size} octets).")
+        members.append(info)
+    if not members:
+        raise BatchError("Aucun fichier CSV dans le zip.")
+    if len(members) > MAX_BATCH_FILES:
+        raise BatchError(f"{len(members)} CSV dans le zip (maximum {MAX_BATCH_FILES}).")
+    return members
+
+
+def open_batch_zip(fileobj: IO[bytes]) -> Tuple[zipfile.ZipFile, List[zipfile.ZipInfo]]:
+    """Zip lu depuis `fileobj` (laissé ouvert : à fermer par l'appelant)."""
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise BatchError(f"Zip illisible : {e}") from e
+    return zf, list_csv_members(zf)
+
+
+def read_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, limit: int = MAX_CSV_BYTES) -> bytes:
+    """Contenu d'un CSV du zip ; BatchError si la décompression dépasse `limit`."""
+    with zf.open(info) as f:
+        data = f.read(limit + 1)
+    if len(data) > limit:
+        raise BatchError(f"{info.filename} : fichier trop volumineux une fois décompressé.")
+    return data
+
+
+# ================== TRAVAIL D'UN WORKER ================================
+
+
+def price_progiciel_file(
+    name: str, data: bytes, params: Mapping[str, Any], grid: PriceGrid
+) -> Dict[str, Any]:
+    """
+    Exécuté dans un processus du pool : CSV progiciel → entrées du moteur +
+    résultat de compute_devis.
+    """
+    parsed = parse_progiciel_csv(io.BytesIO(data))
+    inputs: Dict[str, Any] = {
+        "poutrelles": parsed["poutrelles"],
+        "hourdis": parsed["hourdis"],
+        "surface_ct": float(parsed.get("surface_ct", 0.0) or 0.0),
+        "surface_ts": float(parsed.get("surface_ts", 0.0) or 0.0),
+        **{k: params[k] for k in SHARED_ENGINE_PARAMS},
+    }
+    aggregate = QuoteAggregate.from_dict(parsed.get("aggregate"))
+    return {
+        "file": name,
+        "inputs": inputs,
+        "result": compute_devis(**inputs, grid=grid, aggregate=aggregate),
+    }
+
+
+# ================== ORCHESTRATION ======================================
+
+
+def generate_batch(
+    zf: zipfile.ZipFile,
+    members: List[zipfile.ZipInfo],
+    params: Mapping[str, Any],
+    grid: PriceGrid,
+    persist: Callable[[Dict[str, Any]], Dict[str, Any]],
+    workers: int = BATCH_WORKERS,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Chiffre chaque CSV du zip avec les paramètres communs `params` et la
+    grille `grid` (dicts simples : elle est envoyée aux workers). Pour chaque
+    fichier chiffré, persist(priced) enregistre le devis et retourne les
+    champs à ajouter à la ligne de progression (ref_devis, totaux, job PDF).
+    Produit une ligne par fichier, puis {"summary": ...}.
+    """
+    total = len(members)
+    summary = {"files": total, "ok": 0, "errors": 0, "total_ht": 0.0, "total_ttc": 0.0}
+
+    def account(name: str, priced: Optional[Dict[str, Any]], error: str = "") -> Dict[str, Any]:
+        line: Dict[str, Any] = {"file": name, "status": "ok"}
+        if not error and not (len(priced["inputs"]["poutrelles"]) or len(priced["inputs"]["hourdis"])):
+            error = "Aucune poutrelle ni hourdis trouvé."
+        if not error:
+            try:
+                line.update(persist(priced))
+            except Exception as e:
+                error = f"Enregistrement impossible : {e}"
+        if error:
+            line = {"file": name, "status": "error", "error": error}
+            summary["errors"] += 1
+        else:
+            summary["ok"] += 1
+            summary["total_ht"] += priced["result"]["total_ht"]
+            summary["total_ttc"] += priced["result"]["total_ttc"]
+        line["done"] = summary["ok"] + summary["errors"]
+        line["total"] = total
+        return line
+
+    if total == 1 or workers <= 1:
+        # un seul fichier : pas la peine de passer par les processus
+        for info in members:
+            try:
+                priced = price_progiciel_file(info.filename, read_member(zf, info), params, grid)
+            except Exception as e:
+                yield account(info.filename, None, str(e) or e.__class__.__name__)
+                continue
+            yield account(info.filename, priced)
+    else:
+        pending: Dict[Future, str] = {}
+        max_pending = min(MAX_PENDING_FILES, 2 * workers)
+
+        def drain(block_until: int) -> Iterator[Dict[str, Any]]:
+            while len(pending) > block_until:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    exc = future.exception()
+                    if exc is not None:
+                        yield account(name, None, str(exc) or exc.__class__.__name__)
+                    else:
+                        yield account(name, future.result())
+
+        try:
+            for info in members:
+                yield from drain(max_pending - 1)
+                try:
+                    data = read_member(zf, info)
+                except BatchError as e:
+                    yield account(info.filename, None, str(e))
+                    continue
+                except (zipfile.BadZipFile, OSError, NotImplementedError) as e:
+                    yield account(info.filename, None, f"Lecture impossible dans le zip : {e}")
+                    continue
+                future = compute_pool.submit(price_progiciel_file, info.filename, data, params, grid)
+                pending[future] = info.filename
+            yield from drain(0)
+        finally:
+            # lot abandonné (client parti) : on libère les workers partagés
+            for future in pending:
+                future.cancel()
+
+    summary["total_ht"] = round(summary["total_ht"], 2)
+    summary["total_ttc"] = round(summary["total_ttc"], 2)
+    yield {"summary": summary}
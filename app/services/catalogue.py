@@ -0,0 +1,254 @@
+# app/services/catalogue.py
+from __future__ import annotations
+
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Optional
+
+from app.services.db import get_connection
+from app.services.engine import PriceGrid, standard_grid
+
+# Catalogue de prix versionné (tables price_catalogue_versions / price_catalogue).
+#
+# - chaque version a une date d'effet : la version active est la plus récente
+#   dont la date est passée (on peut publier à l'avance) ;
+# - la version active est chargée en mémoire dans une PriceGrid immuable
+#   (dictionnaires en lecture seule) : le calcul reste un simple .get() ;
+# - à chaque requête, au plus toutes les CHECK_INTERVAL_S secondes, une seule
+#   requête SQL compare le numéro de version actif ; s'il a changé, la nouvelle
+#   grille est construite à part puis échangée d'un coup (une requête en cours
+#   garde la grille qu'elle a prise au début).
+# La version 1 est initialisée avec les constantes de engine.py.
+
+CHECK_INTERVAL_S = 2.0
+
+KIND_POUTRELLE_ML = "poutrelle_ml"
+KIND_HOURDIS_U = "hourdis_u"
+KIND_ETRIER = "etrier"
+KIND_POIDS_POUTRELLE_ML = "poids_poutrelle_ml"
+KIND_POIDS_HOURDIS_U = "poids_hourdis_u"
+ETRIER_CODE = "STD"
+
+_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS price_catalogue_versions (
+        version INTEGER PRIMARY KEY,
+        effective_from TEXT NOT NULL,
+        label TEXT,
+        created_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_price_catalogue_versions_effective
+    ON price_catalogue_versions (effective_from, version)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS price_catalogue (
+        version INTEGER NOT NULL REFERENCES price_catalogue_versions(version),
+        kind TEXT NOT NULL,
+        code TEXT NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (version, kind, code)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+@dataclass(frozen=True)
+class Catalogue:
+    version: int
+    effective_from: str
+    grid: PriceGrid
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _freeze(grid: PriceGrid) -> PriceGrid:
+    return PriceGrid(
+        poutrelle_ml=MappingProxyType(dict(grid.poutrelle_ml)),
+        hourdis_u=MappingProxyType(dict(grid.hourdis_u)),
+        etrier=float(grid.etrier),
+        poids_poutrelle_ml=MappingProxyType(dict(grid.poids_poutrelle_ml)),
+        poids_hourdis_u=MappingProxyType(dict(grid.poids_hourdis_u)),
+    )
+
+
+# ================== SCHÉMA + ÉCRITURE ==================================
+
+
+def ensure_price_catalogue(conn: sqlite3.Connection) -> None:
+    """Crée les tables et y met la grille de engine.py si le catalogue est vide."""
+    with conn:
+        for ddl in _DDL:
+            conn.execute(ddl)
+    if conn.execute("SELECT 1 FROM price_catalogue_versions LIMIT 1").fetchone() is None:
+        publish_grid(conn, standard_grid(), "2000-01-01T00:00:00", "Grille standard initiale")
+
+
+def publish_grid(
+    conn: sqlite3.Connection,
+    grid: PriceGrid,
+    effective_from: Optional[str] = None,
+    label: str = "",
+) -> int:
+    """Enregistre une nouvelle version du catalogue ; retourne son numéro."""
+    rows = []
+    for kind, table in (
+        (KIND_POUTRELLE_ML, grid.poutrelle_ml),
+        (KIND_HOURDIS_U, grid.hourdis_u),
+        (KIND_POIDS_POUTRELLE_ML, grid.poids_poutrelle_ml),
+        (KIND_POIDS_HOURDIS_U, grid.poids_hourdis_u),
+    ):
+        rows.extend((kind, str(code), float(value)) for code, value in table.items())
+    rows.append((KIND_ETRIER, ETRIER_CODE, float(grid.etrier)))
+
+    with conn:
+        cur = conn.execute(
+            """
+            INSERT INTO price_catalogue_versions (effective_from, label, created_at)
+            VALUES (?, ?, ?)
+            """,
+            (effective_from or _now(), label, _now()),
+        )
+        version = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO price_catalogue (version, kind, code, value) VALUES (?, ?, ?, ?)",
+            [(version, *row) for row in rows],
+        )
+    return version
+
+
+# ================== LECTURE ============================================
+
+
+def active_version(conn: sqlite3.Connection, at: Optional[str] = None) -> Optional[sqlite3.Row]:
+    return conn.execute(
+        """
+        SELECT version, effective_from FROM price_catalogue_versions
+        WHERE effective_from <= ?
+        ORDER BY effective_from DESC, version DESC
+        LIMIT 1
+        """,
+        (at or _now(),),
+    ).fetchone()
+
+
+def load_catalogue(conn: sqlite3.Connection, version: int, effective_from: str) -> Catalogue:
+    tables: Dict[str, Dict[str, float]] = {
+        KIND_POUTRELLE_ML: {},
+        KIND_HOURDIS_U: {},
+        KIND_POIDS_POUTRELLE_ML: {},
+        KIND_POIDS_HOURDIS_U: {},
+    }
+    etrier = 0.0
+    for kind, code, value in conn.execute(
+        "SELECT kind, code, value FROM price_catalogue WHERE version = ?", (version,)
+    ):
+        if kind == KIND_ETRIER:
+            etrier = value
+        elif kind in tables:
+            tables[kind][code] = value
+    grid = _freeze(
+        PriceGrid(
+            poutrelle_ml=tables[KIND_POUTRELLE_ML],
+            hourdis_u=tables[KIND_HOURDIS_U],
+            etrier=etrier,
+            poids_poutrelle_ml=tables[KIND_POIDS_POUTRELLE_ML],
+            poids_hourdis_u=tables[KIND_POIDS_HOURDIS_U],
+        )
+    )
+    return Catalogue(version=version, effective_from=effective_from, grid=grid)
+
+
+# ================== CATALOGUE COURANT (en mémoire) =====================
+
+
+class CatalogueCache:
+    def __init__(self, check_interval: float = CHECK_INTERVAL_S) -> None:
+        self.check_interval = check_interval
+        # version 0 = constantes de engine.py, tant que la base n'a pas été lue
+        self._current = Catalogue(0, "", _freeze(standard_grid()))
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self) -> Catalogue:
+        """Catalogue actif ; vérifie la version au plus toutes les check_interval s."""
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+        return self._current
+
+    def refresh(self, force: bool = False) -> Catalogue:
+        if not self._lock.acquire(blocking=force):
+            return self._current  # un autre thread vérifie déjà
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                with get_connection() as conn:
+                    row = active_version(conn)
+                    if row is not None and (force or row["version"] != self._current.version):
+                        # construite à part, puis échangée en une affectation
+                        self._current = load_catalogue(conn, row["version"], row["effective_from"])
+                        self.reloads += 1
+                        print(
+                            f"Catalogue de prix v{self._current.version} "
+                            f"(effet {self._current.effective_from}) chargé."
+                        )
+            except sqlite3.Error as e:
+                print("⚠️ Catalogue de prix illisible, grille précédente conservée :", e)
+            return self._current
+        finally:
+            self._lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._current.version,
+            "effective_from": self._current.effective_from,
+            "reloads": self.reloads,
+        }
+
+
+catalogue = CatalogueCache()
+
+
+def get_catalogue() -> Catalogue:
+    return catalogue.get()
+
+
+def current_grid() -> PriceGrid:
+    return catalogue.get().grid
+
+
+if __name__ == "__main__":
+    # python -m app.services.catalogue show
+    # python -m app.services.catalogue publish grille.json [2026-11-01T00:00:00] [libellé]
+    import json
+
+    from app.services.repricing import grid_from_dict
+
+    args = sys.argv[1:]
+    with get_connection() as conn:
+        ensure_price_catalogue(conn)
+        if args[:1] == ["publish"] and len(args) >= 2:
+            with open(args[1], encoding="utf-8") as f:
+                base = catalogue.refresh(force=True).grid
+                grid = grid_from_dict(json.load(f), base=base)
+            version = publish_grid(
+                conn, grid, args[2] if len(args) > 2 else None, args[3] if len(args) > 3 else ""
+            )
+            print(f"Catalogue v{version} publié.")
+        elif args[:1] == ["show"]:
+            for row in conn.execute(
+                "SELECT version, effective_from, label FROM price_catalogue_versions ORDER BY version"
+            ):
+                print(f"v{row['version']:<4} {row['effective_from']}  {row['label'] or ''}")
+        else:
+            print("usage : python -m app.services.catalogue show | publish <grille.json> [date_effet] [libellé]")
+            sys.exit(2)
@@ -0,0 +1,484 @@
+# app/services/clients_import.py
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from app.services.db import get_connection
+from app.services.startup import file_fingerprint, get_meta, set_meta
+
+# Import du fichier clients (CSV « CODE_CLIENT;NOM_CLIENT ») en une seule
+# transaction :
+#   - le CSV est lu en flux, codes et noms normalisés (" 34200001O " →
+#     "34200001O", espaces multiples du nom réduits) ; la casse des codes
+#     est gardée, comme dans /clients/new et POST /api/clients ;
+#   - tout passe par un seul executemany dans une table temporaire
+#     (clients_staging, en mémoire) ;
+#   - seul l'écart est appliqué à clients : nouveaux codes insérés, noms
+#     modifiés mis à jour et, si prune=True, clients absents du fichier
+#     supprimés. Les triggers FTS ne travaillent que sur ces lignes-là.
+# Un ré-import du même fichier n'écrit donc rien dans clients.
+#
+# Synchronisation incrémentale du fichier de référence (sync_clients_csv,
+# au démarrage et par ClientsWatcher) :
+#   - empreinte taille + date (stat) puis SHA-256 du fichier : rien n'est
+#     relu ni écrit tant qu'elles n'ont pas changé ;
+#   - une empreinte par enregistrement CSV (clients_csv_rows, champs tels que
+#     rendus par csv.reader : guillemets doublés et champs sur plusieurs
+#     lignes compris) : seuls les enregistrements apparus ou disparus depuis
+#     la dernière synchro sont appliqués ; au-delà de MAX_DELTA_RATIO
+#     d'enregistrements modifiés, on repasse par la table de staging ;
+#   - empreintes et métadonnées sont rangées par fichier source (chemin
+#     absolu) : un import d'un autre fichier par la CLI ne touche pas celles
+#     du CSV de référence.
+#
+#   python import_clients.py [fichier.csv] [--prune]
+#   POST /admin/clients/import
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+CLIENTS_CSV = BASE_DIR / "data" / "liste_client_sbbm.csv"
+CSV_DELIMITER = ";"
+CODE_COLUMN = "CODE_CLIENT"
+NOM_COLUMN = "NOM_CLIENT"
+
+# PRAGMA de la connexion le temps de l'import (valeurs d'avant restaurées)
+IMPORT_PRAGMAS = {
+    "temp_store": "MEMORY",   # table de staging en RAM
+    "cache_size": "-65536",   # ~64 Mo : tout l'index clients tient en cache
+}
+
+MAX_DELTA_RATIO = 0.2   # part de lignes modifiées au-delà de laquelle on ré-importe tout
+# surveillance du CSV de référence (s) ; 0 = désactivée
+CLIENTS_WATCH_INTERVAL_S = float(os.environ.get("CLIENTS_WATCH_INTERVAL_S", "60"))
+
+META_STAT = "clients_csv_stat"
+META_SHA256 = "clients_csv_sha256"
+META_HEADER = "clients_csv_header"
+META_NORMALIZE = "clients_csv_normalize"
+# à incrémenter si _normalize change : la synchro suivante repart d'un import complet
+NORMALIZE_VERSION = "2"
+
+_STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS clients_staging (
+        code_client TEXT PRIMARY KEY,
+        nom_client TEXT NOT NULL
+    ) WITHOUT ROWID
+"""
+
+_SYNC_DDL = (
+    # empreinte de chaque enregistrement d'un CSV synchronisé → code client de
+    # l'enregistrement ('' s'il est invalide), pour retrouver ce qu'un
+    # enregistrement disparu a retiré
+    """
+    CREATE TABLE IF NOT EXISTS clients_csv_rows (
+        source TEXT NOT NULL,
+        row_hash INTEGER NOT NULL,
+        code_client TEXT NOT NULL,
+        PRIMARY KEY (source, row_hash)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_clients_csv_rows_source_code"
+    " ON clients_csv_rows (source, code_client)",
+)
+
+_INSERT_ROW_HASH = (
+    "INSERT OR REPLACE INTO clients_csv_rows (source, row_hash, code_client) VALUES (?, ?, ?)"
+)
+
+
+def ensure_clients_sync(conn: sqlite3.Connection) -> None:
+    with conn:
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(clients_csv_rows)")}
+        if cols and "source" not in cols:
+            # anciennes empreintes par ligne, sans source : recalculées à la
+            # prochaine synchro (les clés META par source sont neuves aussi)
+            conn.execute("DROP TABLE clients_csv_rows")
+        for ddl in _SYNC_DDL:
+            conn.execute(ddl)
+
+
+@dataclass
+class ImportReport:
+    mode: str = "complet"    # "complet" (staging) ou "delta" (lignes modifiées)
+    lues: int = 0
+    invalides: int = 0       # code ou nom vide
+    doublons: int = 0        # même code plusieurs fois (le dernier gagne)
+    inserees: int = 0
+    renommees: int = 0
+    supprimees: int = 0
+    inchangees: int = 0
+    duration_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.lues} lignes lues ({self.invalides} invalides, {self.doublons} doublons) : "
+            f"{self.inserees} insérées, {self.renommees} renommées, "
+            f"{self.supprimees} supprimées, {self.inchangees} inchangées "
+            f"en {self.duration_s:.3f} s ({self.mode})"
+        )
+
+
+def _columns(header: Sequence[str]) -> Tuple[int, int]:
+    # en-têtes éventuellement entourées d'espaces
+    names = [h.strip().upper() for h in header]
+    if CODE_COLUMN not in names or NOM_COLUMN not in names:
+        raise ValueError(f"colonnes {CODE_COLUMN} et {NOM_COLUMN} attendues, trouvé {names}")
+    return names.index(CODE_COLUMN), names.index(NOM_COLUMN)
+
+
+def _normalize(fields: Sequence[str], i_code: int, i_nom: int) -> Tuple[str, str]:
+    """(code, nom) normalisés ; ("", "") si la ligne est incomplète."""
+    if len(fields) <= max(i_code, i_nom):
+        return "", ""
+    # code : strip() seulement (un code tapé en minuscules reste un seul client)
+    return fields[i_code].strip(), " ".join(fields[i_nom].split())
+
+
+def iter_client_rows(f: IO[str], report: ImportReport) -> Iterator[Tuple[str, str]]:
+    """
+    (code, nom) normalisés d'un CSV texte ; les lignes invalides sont
+    comptées. ValueError si les colonnes CODE_CLIENT / NOM_CLIENT manquent.
+    """
+    reader = csv.reader(f, delimiter=CSV_DELIMITER)
+    i_code, i_nom = _columns(next(reader, []))
+    lues = invalides = 0
+    try:
+        for row in reader:
+            lues += 1
+            code, nom = _normalize(row, i_code, i_nom)
+            if not code or not nom:
+                invalides += 1
+                continue
+            yield code, nom
+    finally:
+        report.lues += lues
+        report.invalides += invalides
+
+
+def _set_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, str]) -> Dict[str, str]:
+    previous = {}
+    for name, value in pragmas.items():
+        previous[name] = str(conn.execute(f"PRAGMA {name}").fetchone()[0])
+        conn.execute(f"PRAGMA {name} = {value}")
+    return previous
+
+
+def _apply_staged(
+    conn: sqlite3.Connection,
+    rows: Iterable[Tuple[str, str]],
+    report: ImportReport,
+    prune: bool,
+    after: Optional[Any] = None,
+) -> ImportReport:
+    """Charge `rows` dans la table de staging et applique l'écart à clients."""
+    t0 = time.perf_counter()
+    previous = _set_pragmas(conn, IMPORT_PRAGMAS)
+    try:
+        conn.execute(_STAGING_DDL)
+        with conn:
+            conn.execute("DELETE FROM clients_staging")
+            conn.executemany(
+                "INSERT OR REPLACE INTO clients_staging (code_client, nom_client) VALUES (?, ?)",
+                rows,
+            )
+            (staged,) = conn.execute("SELECT COUNT(*) FROM clients_staging").fetchone()
+            report.doublons = report.lues - report.invalides - staged
+
+            report.renommees = conn.execute(
+                """
+                UPDATE clients SET nom_client = s.nom_client
+                FROM clients_staging s
+                WHERE clients.code_client = s.code_client
+                  AND clients.nom_client IS NOT s.nom_client
+                """
+            ).rowcount
+            report.inserees = conn.execute(
+                """
+                INSERT INTO clients (code_client, nom_client)
+                SELECT s.code_client, s.nom_client FROM clients_staging s
+                WHERE NOT EXISTS (SELECT 1 FROM clients c WHERE c.code_client = s.code_client)
+                ORDER BY s.code_client
+                """
+            ).rowcount
+            if prune and staged:
+                report.supprimees = conn.execute(
+                    """
+                    DELETE FROM clients WHERE NOT EXISTS
+                        (SELECT 1 FROM clients_staging s WHERE s.code_client = clients.code_client)
+                    """
+                ).rowcount
+            report.inchangees = staged - report.inserees - report.renommees
+            conn.execute("DELETE FROM clients_staging")
+            if after is not None:
+                after()  # même transaction (empreintes des lignes)
+    finally:
+        _set_pragmas(conn, previous)
+    report.duration_s = round(time.perf_counter() - t0, 3)
+    return report
+
+
+def sync_clients(
+    conn: sqlite3.Connection, f: IO[str], prune: bool = False
+) -> ImportReport:
+    """
+    Aligne la table clients sur le CSV `f` (ouvert en texte, newline="").
+    prune=True supprime aussi les clients absents du fichier (jamais si le
+    fichier ne contient aucune ligne valide).
+    """
+    report = ImportReport()
+    return _apply_staged(conn, iter_client_rows(f, report), report, prune)
+
+
+def sync_clients_file(
+    conn: sqlite3.Connection, source: Union[str, Path, IO[bytes]] = CLIENTS_CSV, prune: bool = False
+) -> ImportReport:
+    """sync_clients depuis un chemin ou un flux binaire (upload) ; BOM UTF-8 toléré."""
+    if isinstance(source, (str, Path)):
+        with open(source, "r", encoding="utf-8-sig", newline="") as f:
+            return sync_clients(conn, f, prune)
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        return sync_clients(conn, text, prune)
+    finally:
+        text.detach()  # le flux appartient à l'appelant
+
+
+# ================== SYNCHRO INCRÉMENTALE DU CSV DE RÉFÉRENCE ===========
+
+
+_FIELD_SEP = "\x1f"  # séparateur des champs dans l'empreinte d'un enregistrement
+
+
+def _source_key(path: Path) -> str:
+    return str(Path(path).resolve())
+
+
+def _meta_key(name: str, source: str) -> str:
+    return f"{name}:{source}"
+
+
+def _read_records(data: bytes) -> List[List[str]]:
+    """Enregistrements du CSV (en-tête compris), lus par csv.reader ; BOM
+    UTF-8 toléré, enregistrements vides ignorés."""
+    text = io.StringIO(data.decode("utf-8-sig"), newline="")
+    return [row for row in csv.reader(text, delimiter=CSV_DELIMITER) if "".join(row).strip()]
+
+
+def _row_hashes(records: Sequence[Sequence[str]]) -> List[int]:
+    """
+    Empreinte 63 bits de chaque enregistrement (CRC-32 + Adler-32 de ses
+    champs, tient dans un INTEGER SQLite) ; calculée en C par map().
+    """
+    raw = [_FIELD_SEP.join(row).encode("utf-8") for row in records]
+    return [
+        ((crc & 0x7FFFFFFF) << 32) | adler
+        for crc, adler in zip(map(zlib.crc32, raw), map(zlib.adler32, raw))
+    ]
+
+
+def _parse_records(
+    records: Sequence[Sequence[str]], hashes: Sequence[int], i_code: int, i_nom: int
+) -> List[Tuple[int, str, str]]:
+    """(empreinte, code, nom) de chaque enregistrement."""
+    return [(h, *_normalize(row, i_code, i_nom)) for h, row in zip(hashes, records)]
+
+
+def _apply_delta(
+    conn: sqlite3.Connection,
+    source: str,
+    added: List[Tuple[int, str, str]],
+    gone: List[int],
+    prune: bool,
+) -> ImportReport:
+    """Applique les enregistrements apparus (`added`) et disparus (`gone`) du CSV."""
+    t0 = time.perf_counter()
+    report = ImportReport(mode="delta", lues=len(added))
+    with conn:
+        gone_codes = set()
+        for h in gone:
+            row = conn.execute(
+                "SELECT code_client FROM clients_csv_rows WHERE source = ? AND row_hash = ?",
+                (source, h),
+            ).fetchone()
+            if row is not None and row[0]:
+                gone_codes.add(row[0])
+        conn.executemany(
+            "DELETE FROM clients_csv_rows WHERE source = ? AND row_hash = ?",
+            [(source, h) for h in gone],
+        )
+        conn.executemany(
+            _INSERT_ROW_HASH,
+            [(source, h, code if nom else "") for h, code, nom in added],
+        )
+        seen = set()
+        for _, code, nom in added:
+            if not code or not nom:
+                report.invalides += 1
+                continue
+            if code in seen:
+                report.doublons += 1
+            seen.add(code)
+            if conn.execute(
+                "UPDATE clients SET nom_client = ? WHERE code_client = ? AND nom_client IS NOT ?",
+                (nom, code, nom),
+            ).rowcount:
+                report.renommees += 1
+            elif conn.execute(
+                "INSERT OR IGNORE INTO clients (code_client, nom_client) VALUES (?, ?)", (code, nom)
+            ).rowcount:
+                report.inserees += 1
+            else:
+                report.inchangees += 1
+        if prune:
+            # code sorti du fichier (plus aucun enregistrement ne le porte)
+            for code in gone_codes - seen:
+                if conn.execute(
+                    "SELECT 1 FROM clients_csv_rows WHERE source = ? AND code_client = ? LIMIT 1",
+                    (source, code),
+                ).fetchone() is None:
+                    report.supprimees += conn.execute(
+                        "DELETE FROM clients WHERE code_client = ?", (code,)
+                    ).rowcount
+    report.duration_s = round(time.perf_counter() - t0, 3)
+    return report
+
+
+def _store_row_hashes(
+    conn: sqlite3.Connection, source: str, parsed: List[Tuple[int, str, str]]
+) -> None:
+    conn.execute("DELETE FROM clients_csv_rows WHERE source = ?", (source,))
+    conn.executemany(
+        _INSERT_ROW_HASH,
+        [(source, h, code if nom else "") for h, code, nom in parsed],
+    )
+
+
+def sync_clients_csv(
+    conn: sqlite3.Connection,
+    path: Path = CLIENTS_CSV,
+    prune: bool = False,
+    full: bool = False,
+) -> Optional[ImportReport]:
+    """
+    Synchronise clients avec le CSV `path` s'il a changé depuis la dernière
+    synchro de ce même fichier ; None s'il est inchangé. Seuls les
+    enregistrements modifiés sont appliqués, sauf full=True (ou en-tête
+    changé, gros écart).
+    """
+    t0 = time.perf_counter()
+    source = _source_key(path)
+    meta = {
+        name: _meta_key(name, source)
+        for name in (META_STAT, META_SHA256, META_HEADER, META_NORMALIZE)
+    }
+    if get_meta(conn, meta[META_NORMALIZE]) != NORMALIZE_VERSION:
+        full = True  # empreintes calculées avec une autre normalisation
+    stat = file_fingerprint(path)
+    if not full and get_meta(conn, meta[META_STAT]) == stat:
+        return None
+    data = path.read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    if not full and get_meta(conn, meta[META_SHA256]) == sha256:
+        set_meta(conn, meta[META_STAT], stat)  # touché mais contenu identique
+        return None
+
+    records = _read_records(data)
+    header = records[0] if records else []
+    header_hash = hashlib.sha256(_FIELD_SEP.join(header).encode("utf-8")).hexdigest()
+    i_code, i_nom = _columns(header)
+    body = records[1:]
+    hashes = _row_hashes(body)
+    incremental = not full and get_meta(conn, meta[META_HEADER]) == header_hash
+    if incremental:
+        cur = conn.cursor()
+        cur.row_factory = None  # tuples bruts : 100k empreintes en quelques ms
+        previous = set(
+            h for (h,) in cur.execute(
+                "SELECT row_hash FROM clients_csv_rows WHERE source = ?", (source,)
+            )
+        )
+        current = set(hashes)
+        added_idx = [i for i, h in enumerate(hashes) if h not in previous]
+        gone = list(previous - current)
+        incremental = len(added_idx) + len(gone) <= MAX_DELTA_RATIO * max(len(current), 1)
+    if incremental:
+        added = _parse_records(
+            [body[i] for i in added_idx], [hashes[i] for i in added_idx], i_code, i_nom
+        )
+        report = _apply_delta(conn, source, added, gone, prune)
+    else:
+        parsed = _parse_records(body, hashes, i_code, i_nom)
+        report = ImportReport(lues=len(parsed))
+        valid = [(code, nom) for _, code, nom in parsed if code and nom]
+        report.invalides = len(parsed) - len(valid)
+        _apply_staged(
+            conn, valid, report, prune, after=lambda: _store_row_hashes(conn, source, parsed)
+        )
+
+    set_meta(conn, meta[META_HEADER], header_hash)
+    set_meta(conn, meta[META_SHA256], sha256)
+    set_meta(conn, meta[META_STAT], stat)
+    set_meta(conn, meta[META_NORMALIZE], NORMALIZE_VERSION)
+    report.duration_s = round(time.perf_counter() - t0, 3)
+    return report
+
+
+class ClientsWatcher:
+    """Thread qui surveille le CSV de référence et applique ses modifications."""
+
+    def __init__(self, path: Path = CLIENTS_CSV, interval_s: float = CLIENTS_WATCH_INTERVAL_S) -> None:
+        self.path = path
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[ImportReport] = None
+
+    def check(self) -> Optional[ImportReport]:
+        if not self.path.exists():
+            return None
+        with get_connection() as conn:
+            report = sync_clients_csv(conn, self.path)
+        if report is not None:
+            self.last_report = report
+            print(f"Fichier clients modifié, synchro : {report}")
+        return report
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.check()
+            except Exception as e:
+                print("⚠️ Erreur synchro fichier clients :", e)
+
+    def start(self) -> None:
+        if self.interval_s <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="clients-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_s": self.interval_s,
+            "running": self._thread is not None,
+            "last_sync": self.last_report.to_dict() if self.last_report else None,
+        }
+
+
+clients_watcher = ClientsWatcher()
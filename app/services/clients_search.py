@@ -0,0 +1,193 @@
+# app/services/clients_search.py
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Dict, List, Optional
+
+# Index plein texte des clients pour l'auto-complétion (GET /api/clients).
+#
+# - table FTS5 "external content" branchée sur clients (pas de doublon des données) ;
+# - tokenizer unicode61 + remove_diacritics → "zoe" trouve "Zoé" ;
+# - index de préfixes 1 à 3 caractères → "abd*" ne parcourt pas tout le vocabulaire ;
+# - triggers sur clients : import_clients, POST /api/clients et /clients/new
+#   restent synchronisés sans rien changer de leur côté ;
+# - FTS5 détecté à la première recherche (table présente et utilisable),
+#   indépendamment des migrations : sinon recherche LIKE comme avant ;
+# - saisie avec un chiffre (code client) : les préfixes FTS sont complétés
+#   par un LIKE sur le code, "200001" trouve toujours "34200001O".
+
+FTS_TABLE = "clients_fts"
+MAX_RESULTS = 20
+MIN_RANKED_LEN = 2
+
+_FTS_DDL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    code_client,
+    nom_client,
+    content='clients',
+    content_rowid='id',
+    tokenize="unicode61 remove_diacritics 2 tokenchars '-'",
+    prefix='1 2 3'
+)
+"""
+
+_TRIGGERS_DDL = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, code_client, nom_client)
+        VALUES (new.id, new.code_client, new.nom_client);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code_client, nom_client)
+        VALUES ('delete', old.id, old.code_client, old.nom_client);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE ON clients BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, code_client, nom_client)
+        VALUES ('delete', old.id, old.code_client, old.nom_client);
+        INSERT INTO {FTS_TABLE}(rowid, code_client, nom_client)
+        VALUES (new.id, new.code_client, new.nom_client);
+    END
+    """,
+)
+
+# Les mots saisis sont découpés comme le ferait unicode61 : tout ce qui n'est
+# pas lettre/chiffre/tiret sépare (les guillemets FTS5 ne peuvent donc pas fuiter).
+_TOKEN_RE = re.compile(r"[\w-]+", re.UNICODE)
+
+FTS_AVAILABLE: Optional[bool] = None  # None = pas encore détecté
+
+
+def ensure_clients_fts(conn: sqlite3.Connection) -> bool:
+    """
+    Crée l'index FTS5 + les triggers si besoin et le reconstruit quand il vient
+    d'être créé (clients importés avant l'index). Retourne False si la version
+    de SQLite n'a pas FTS5 : la recherche retombe alors sur LIKE.
+    """
+    global FTS_AVAILABLE
+
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+    ).fetchone() is not None
+
+    try:
+        with conn:
+            conn.execute(_FTS_DDL)
+            for ddl in _TRIGGERS_DDL:
+                conn.execute(ddl)
+            if not existed:
+                conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except sqlite3.OperationalError as e:
+        print("⚠️ FTS5 indisponible, recherche clients en LIKE :", e)
+        FTS_AVAILABLE = False
+        return False
+
+    if not existed:
+        print("Index FTS clients construit.")
+    FTS_AVAILABLE = True
+    return True
+
+
+def rebuild_clients_fts(conn: sqlite3.Connection) -> None:
+    """Reconstruit l'index complet (après un import massif hors triggers)."""
+    with conn:
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fts_available(conn: sqlite3.Connection) -> bool:
+    """Index FTS5 présent et lisible (détecté une fois par processus)."""
+    global FTS_AVAILABLE
+    if FTS_AVAILABLE is None:
+        try:
+            conn.execute(f"SELECT 1 FROM {FTS_TABLE} LIMIT 1").fetchall()
+            FTS_AVAILABLE = True
+        except sqlite3.OperationalError:  # table absente ou SQLite sans FTS5
+            FTS_AVAILABLE = False
+    return FTS_AVAILABLE
+
+
+def _code_like(
+    conn: sqlite3.Connection, term: str, limit: int, seen: set
+) -> List[tuple]:
+    """Codes contenant `term` (sous-chaîne), hors codes déjà trouvés."""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    rows = conn.execute(
+        """
+        SELECT code_client, nom_client
+        FROM clients
+        WHERE code_client LIKE ? ESCAPE '\\'
+        ORDER BY code_client
+        LIMIT ?
+        """,
+        (f"%{escaped}%", limit + len(seen)),
+    ).fetchall()
+    return [tuple(r) for r in rows if r[0] not in seen][:limit]
+
+
+def _fts_query(term: str) -> str:
+    """'el bou' → '"el"* AND "bou"*' (chaque mot = préfixe)."""
+    tokens = _TOKEN_RE.findall(term)
+    return " AND ".join(f'"{t}"*' for t in tokens)
+
+
+def search_clients(
+    conn: sqlite3.Connection, term: str, limit: int = MAX_RESULTS
+) -> List[Dict[str, str]]:
+    """
+    Recherche code/nom client par préfixes de mots, insensible à la casse et aux
+    accents, triée par pertinence (bm25, le code client pèse plus que le nom),
+    puis, si la saisie contient un chiffre, codes qui la contiennent.
+    """
+    term = (term or "").strip()
+    if not term:
+        return []
+
+    if fts_available(conn):
+        query = _fts_query(term)
+        if not query:
+            return []
+        # 1 seul caractère : des dizaines de milliers de candidats, trier par
+        # pertinence coûterait plus cher que tout le reste → ordre de l'index.
+        order_by = (
+            f"ORDER BY bm25({FTS_TABLE}, 5.0, 1.0), c.nom_client"
+            if len(term) >= MIN_RANKED_LEN
+            else ""
+        )
+        rows = conn.execute(
+            f"""
+            SELECT c.code_client, c.nom_client
+            FROM {FTS_TABLE}
+            JOIN clients c ON c.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH ?
+            {order_by}
+            LIMIT ?
+            """,
+            (query, limit),
+        ).fetchall()
+        if len(rows) < limit and any(ch.isdigit() for ch in term):
+            # code saisi en partie (milieu / fin) : FTS ne voit que les débuts de mots
+            rows = [tuple(r) for r in rows]
+            rows += _code_like(conn, term, limit - len(rows), {r[0] for r in rows})
+    else:
+        rows = conn.execute(
+            """
+            SELECT code_client, nom_client
+            FROM clients
+            WHERE code_client LIKE ? OR nom_client LIKE ?
+            ORDER BY nom_client
+            LIMIT ?
+            """,
+            (f"%{term}%", f"%{term}%", limit),
+        ).fetchall()
+
+    return [
+        {
+            "code_client": code_client.strip() if code_client else "",
+            "nom_client": nom_client.strip() if nom_client else "",
+        }
+        for code_client, nom_client in rows
+    ]
@@ -0,0 +1,69 @@
+# app/services/compute_pool.py
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+# Pool de processus partagé pour les calculs lourds hors boucle asyncio
+# (re-tarification de l'historique, génération de devis en lot).
+#
+# Un seul pool par processus serveur, créé à la première demande et gardé
+# jusqu'à l'arrêt (lifespan) : pas de démarrage de processus spawn à chaque
+# requête, et des requêtes simultanées se partagent les mêmes workers au lieu
+# d'en lancer chacune les leurs. Chaque appelant borne lui-même le nombre de
+# tâches qu'il garde en vol.
+
+COMPUTE_WORKERS = max(1, min(8, os.cpu_count() or 2))
+
+
+class ComputePool:
+    """ProcessPoolExecutor (spawn) créé à la demande, recréé s'il est cassé."""
+
+    def __init__(self, max_workers: int = COMPUTE_WORKERS) -> None:
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn : pas de fork d'un serveur déjà multi-threadé
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # worker tué (OOM, ...) : on repart sur un pool neuf
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            future = self._get_executor().submit(fn, *args)
+        self.submitted += 1
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "started": self._executor is not None,
+            "submitted": self.submitted,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+compute_pool = ComputePool()
@@ -0,0 +1,208 @@
+# app/services/db.py
+from __future__ import annotations
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+# DEVIS_DB_PATH : autre base (copie de test, tir de charge, ...)
+DB_PATH = Path(os.environ.get("DEVIS_DB_PATH") or BASE_DIR / "devis.db")
+
+# ================== PARAMÈTRES DU POOL ==================================
+
+POOL_MAX_SIZE = 8           # connexions ouvertes au maximum
+POOL_TIMEOUT_S = 10.0       # attente max quand toutes les connexions sont prises
+STATEMENT_CACHE_SIZE = 256  # requêtes préparées gardées par connexion
+
+# PRAGMA appliqués une seule fois, à l'ouverture de chaque connexion
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # lecteurs non bloqués pendant /generate
+    "PRAGMA synchronous = NORMAL",      # sûr en WAL, beaucoup moins de fsync
+    "PRAGMA cache_size = -16000",       # ~16 Mo de cache pages
+    "PRAGMA mmap_size = 134217728",     # 128 Mo mappés en mémoire
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class PoolTimeout(RuntimeError):
+    """Aucune connexion libre dans le délai imparti."""
+
+
+class ConnectionPool:
+    """
+    Pool borné de connexions SQLite partagé par toutes les routes.
+
+    - une connexion est attribuée au thread qui la demande et reste la sienne
+      jusqu'à la sortie du bloc `with` le plus externe (appels imbriqués OK) ;
+    - les connexions libres sont réutilisées (LIFO = cache chaud) ;
+    - au-delà de `max_size`, on attend qu'une connexion se libère.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        max_size: int = POOL_MAX_SIZE,
+        timeout: float = POOL_TIMEOUT_S,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._stats: Dict[str, float] = {
+            "acquisitions": 0,
+            "reuses": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "peak_in_use": 0,
+            "wait_time_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # la connexion peut changer de thread entre deux prêts
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats["reuses"] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.max_size:
+                self._opened += 1
+                create = True
+            else:
+                create = False
+                self._stats["waits"] += 1
+
+        if create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        t0 = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"Pool SQLite saturé ({self.max_size} connexions) après {self.timeout}s"
+            )
+        with self._lock:
+            self._stats["wait_time_ms"] += (time.perf_counter() - t0) * 1000.0
+            self._stats["reuses"] += 1
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Prête une connexion au thread courant (réentrant)."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        with self._lock:
+            self._in_use += 1
+            self._stats["acquisitions"] += 1
+            if self._in_use > self._stats["peak_in_use"]:
+                self._stats["peak_in_use"] = self._in_use
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            if conn.in_transaction:
+                # transaction laissée ouverte par erreur : on ne la rend pas au suivant
+                conn.rollback()
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Connexion + transaction : commit en sortie, rollback sur exception."""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # déjà dans une transaction ouverte plus haut : on s'y greffe
+                yield conn
+                return
+            with conn:
+                yield conn
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+            }
+
+    def close_all(self) -> None:
+        """Ferme les connexions libres (arrêt du serveur, tests)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+# ================== POOL GLOBAL =========================================
+
+_POOL = ConnectionPool(DB_PATH)
+
+
+def get_pool() -> ConnectionPool:
+    return _POOL
+
+
+def get_connection():
+    """`with get_connection() as conn:` → connexion prêtée par le pool."""
+    return _POOL.connection()
+
+
+def transaction():
+    """`with transaction() as conn:` → écritures atomiques via le pool."""
+    return _POOL.transaction()
+
+
+def pool_stats() -> Dict[str, Any]:
+    return _POOL.stats()
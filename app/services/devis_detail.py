@@ -0,0 +1,175 @@
+# app/services/devis_detail.py
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, List, Mapping, Optional
+
+from app.services.lignes import LigneDevis
+
+# Détail complet de chaque devis, écrit dans la même transaction que l'en-tête
+# (table devis) :
+#   - devis_details : champs d'en-tête absents de devis (niveau, affaire,
+#     validité, ...), paramètres commerciaux, surfaces, TVA et ventilation
+#     transport / poids calculée par compute_devis ;
+#   - devis_lignes  : les lignes calculées, une par position (executemany).
+# Avec l'en-tête, de quoi ré-afficher le devis ou refaire son PDF sans
+# relire le CSV d'origine ni relancer le calcul.
+
+DETAIL_FIELDS = (
+    "niveau",
+    "affaire",
+    "mode_livraison",
+    "distance_km",
+    "validite",
+    "remise_poutrelle",
+    "remise_hourdis",
+    "prix_ct",
+    "prix_treillis",
+    "transport_prix_poutrelle_manuel",
+    "transport_prix_hourdis_manuel",
+    "surface_ct",
+    "surface_ts",
+    "tva",
+    "transport_total_auto",
+    "transport_total_choisi",
+    "transport_par_ml",
+    "transport_par_hourdis",
+    "nb_camions",
+    "poids_total",
+    "poids_poutrelles",
+    "poids_hourdis",
+)
+
+# colonnes de devis relues avec le détail (mêmes noms que le contexte de devis.html)
+HEADER_FIELDS = (
+    "ref_devis",
+    "date_devis",
+    "client",
+    "chantier",
+    "code_client",
+    "code_commercial",
+    "nom_commercial",
+    "total_ht",
+    "total_ttc",
+    "saisie_mode",
+    "mode_transport",
+    "transport_mode",
+)
+
+_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS devis_details (
+        ref_devis TEXT PRIMARY KEY,
+        niveau TEXT,
+        affaire TEXT,
+        mode_livraison TEXT,
+        distance_km REAL,
+        validite TEXT,
+        remise_poutrelle REAL,
+        remise_hourdis REAL,
+        prix_ct REAL,
+        prix_treillis REAL,
+        transport_prix_poutrelle_manuel REAL,
+        transport_prix_hourdis_manuel REAL,
+        surface_ct REAL,
+        surface_ts REAL,
+        tva REAL,
+        transport_total_auto REAL,
+        transport_total_choisi REAL,
+        transport_par_ml REAL,
+        transport_par_hourdis REAL,
+        nb_camions INTEGER,
+        poids_total REAL,
+        poids_poutrelles REAL,
+        poids_hourdis REAL,
+        FOREIGN KEY (ref_devis) REFERENCES devis(ref_devis) ON DELETE CASCADE
+    )
+    """,
+    # longueur / etrier / nombre sans type : 12, 4.0 et "" sont relus tels
+    # quels, donc le devis ré-affiché est identique à l'original
+    """
+    CREATE TABLE IF NOT EXISTS devis_lignes (
+        ref_devis TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        longueur,
+        etrier,
+        nombre,
+        prix_ml REAL,
+        prix REAL,
+        total REAL,
+        PRIMARY KEY (ref_devis, position),
+        FOREIGN KEY (ref_devis) REFERENCES devis(ref_devis) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+)
+
+_INSERT_DETAIL = (
+    f"INSERT OR REPLACE INTO devis_details (ref_devis, {', '.join(DETAIL_FIELDS)}) "
+    f"VALUES (?, {', '.join('?' * len(DETAIL_FIELDS))})"
+)
+
+
+def ensure_devis_detail(conn: sqlite3.Connection) -> None:
+    with conn:
+        for ddl in _DDL:
+            conn.execute(ddl)
+
+
+def save_devis_detail(
+    conn: sqlite3.Connection, ref_devis: str, detail: Mapping[str, Any]
+) -> None:
+    """
+    Détail du devis (à appeler dans la transaction de l'en-tête). `detail` =
+    contexte de devis.html : champs de DETAIL_FIELDS + "lignes" de compute_devis.
+    """
+    conn.execute(_INSERT_DETAIL, (ref_devis, *(detail.get(f) for f in DETAIL_FIELDS)))
+    # devis regénéré sous la même réf : on remplace toutes ses lignes
+    conn.execute("DELETE FROM devis_lignes WHERE ref_devis = ?", (ref_devis,))
+    conn.executemany(
+        """
+        INSERT INTO devis_lignes
+            (ref_devis, position, type, longueur, etrier, nombre, prix_ml, prix, total)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (ref_devis, pos, l.type, l.longueur, l.etrier, l.nombre, l.prix_ml, l.prix, l.total)
+            for pos, l in enumerate(detail.get("lignes") or ())
+        ],
+    )
+
+
+def load_lignes(conn: sqlite3.Connection, ref_devis: str) -> List[LigneDevis]:
+    return [
+        LigneDevis(*row)
+        for row in conn.execute(
+            """
+            SELECT type, longueur, etrier, nombre, prix_ml, prix, total
+            FROM devis_lignes WHERE ref_devis = ? ORDER BY position
+            """,
+            (ref_devis,),
+        )
+    ]
+
+
+def load_devis(conn: sqlite3.Connection, ref_devis: str) -> Optional[Dict[str, Any]]:
+    """
+    En-tête + détail + lignes d'un devis, sous les clés du contexte de
+    devis.html. None si le devis n'existe pas ou n'a pas de détail (devis
+    enregistrés avant la table devis_details).
+    """
+    row = conn.execute(
+        f"""
+        SELECT {', '.join('d.' + f for f in HEADER_FIELDS)},
+               {', '.join('x.' + f for f in DETAIL_FIELDS)}
+        FROM devis d
+        JOIN devis_details x ON x.ref_devis = d.ref_devis
+        WHERE d.ref_devis = ?
+        """,
+        (ref_devis,),
+    ).fetchone()
+    if row is None:
+        return None
+    data = dict(zip(HEADER_FIELDS + DETAIL_FIELDS, tuple(row)))
+    data["lignes"] = load_lignes(conn, ref_devis)
+    return data
@@ -0,0 +1,197 @@
+# app/services/devis_history.py
+from __future__ import annotations
+
+import base64
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Historique des devis :
+#   - date_devis reste la date affichée (jj/mm/aaaa, saisie libre) ; la colonne
+#     date_iso (aaaa-mm-jj) sert au tri et aux filtres, elle est remplie à
+#     l'enregistrement et rattrapée au démarrage pour les anciens devis ;
+#   - index composites (date_iso, id), (code_commercial, date_iso, id) et
+#     (code_client, date_iso, id) : chaque page est une lecture d'index ;
+#   - pagination par curseur (keyset) sur (date_iso, id) : le coût d'une page
+#     ne dépend pas de sa position dans l'historique (pas d'OFFSET).
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y")
+_ISO_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_devis_date_iso ON devis (date_iso, id)",
+    "CREATE INDEX IF NOT EXISTS idx_devis_commercial_date ON devis (code_commercial, date_iso, id)",
+    "CREATE INDEX IF NOT EXISTS idx_devis_client_date ON devis (code_client, date_iso, id)",
+)
+
+_COLUMNS = """
+    id, ref_devis, date_devis, date_iso, client, chantier, code_client,
+    total_ht, total_ttc, code_commercial, nom_commercial
+"""
+
+
+def date_to_iso(value: Any) -> str:
+    """'17/10/2026' (ou 2026-10-17, 17-10-2026, ...) → '2026-10-17' ; '' si illisible."""
+    s = str(value or "").strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return ""
+
+
+def ensure_devis_history(conn: sqlite3.Connection) -> None:
+    """Colonne date_iso (+ rattrapage des anciens devis) et index de l'historique."""
+    with conn:
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(devis)")}
+        if "date_iso" not in cols:
+            conn.execute("ALTER TABLE devis ADD COLUMN date_iso TEXT")
+        rows = conn.execute(
+            "SELECT id, date_devis FROM devis WHERE date_iso IS NULL"
+        ).fetchall()
+        if rows:
+            conn.executemany(
+                "UPDATE devis SET date_iso = ? WHERE id = ?",
+                [(date_to_iso(d), i) for i, d in rows],
+            )
+            print(f"Historique : date ISO calculée pour {len(rows)} devis.")
+        for ddl in _INDEXES:
+            conn.execute(ddl)
+
+
+# ================== FILTRES + CURSEUR ==================================
+
+
+@dataclass
+class HistoryFilters:
+    code_commercial: str = ""
+    code_client: str = ""
+    client: str = ""          # contenu dans le nom du client
+    date_min: str = ""        # aaaa-mm-jj inclus
+    date_max: str = ""
+    montant_min: Optional[float] = None  # total HT
+    montant_max: Optional[float] = None
+
+    @classmethod
+    def from_params(cls, **params: Any) -> "HistoryFilters":
+        """Valeurs brutes d'un formulaire GET (chaînes éventuellement vides)."""
+
+        def amount(v: Any) -> Optional[float]:
+            try:
+                return float(str(v).replace(",", ".").replace(" ", "")) if str(v or "").strip() else None
+            except ValueError:
+                return None
+
+        def day(v: Any) -> str:
+            s = str(v or "").strip()
+            return s if _ISO_RE.match(s) else date_to_iso(s)
+
+        return cls(
+            code_commercial=str(params.get("code_commercial") or "").strip().upper(),
+            code_client=str(params.get("code_client") or "").strip(),
+            client=str(params.get("client") or "").strip(),
+            date_min=day(params.get("date_min")),
+            date_max=day(params.get("date_max")),
+            montant_min=amount(params.get("montant_min")),
+            montant_max=amount(params.get("montant_max")),
+        )
+
+    def to_params(self) -> Dict[str, str]:
+        """Filtres actifs, pour reconstruire les liens de page."""
+        params = {
+            "code_commercial": self.code_commercial,
+            "code_client": self.code_client,
+            "client": self.client,
+            "date_min": self.date_min,
+            "date_max": self.date_max,
+            "montant_min": "" if self.montant_min is None else f"{self.montant_min:g}",
+            "montant_max": "" if self.montant_max is None else f"{self.montant_max:g}",
+        }
+        return {k: v for k, v in params.items() if v}
+
+    def where(self) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        args: List[Any] = []
+        if self.code_commercial:
+            clauses.append("code_commercial = ?")
+            args.append(self.code_commercial)
+        if self.code_client:
+            clauses.append("code_client = ?")
+            args.append(self.code_client)
+        if self.client:
+            clauses.append("client LIKE ? ESCAPE '\\'")
+            escaped = self.client.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            args.append(f"%{escaped}%")
+        if self.date_min:
+            clauses.append("date_iso >= ?")
+            args.append(self.date_min)
+        if self.date_max:
+            clauses.append("date_iso <= ?")
+            args.append(self.date_max)
+        if self.montant_min is not None:
+            clauses.append("total_ht >= ?")
+            args.append(self.montant_min)
+        if self.montant_max is not None:
+            clauses.append("total_ht <= ?")
+            args.append(self.montant_max)
+        return clauses, args
+
+
+def encode_cursor(date_iso: str, devis_id: int) -> str:
+    raw = f"{date_iso or ''}|{devis_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """Curseur illisible → None (on repart de la première page)."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        date_iso, devis_id = raw.rsplit("|", 1)
+        return date_iso, int(devis_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# ================== LECTURE ============================================
+
+
+def fetch_devis_page(
+    conn: sqlite3.Connection,
+    filters: Optional[HistoryFilters] = None,
+    cursor: str = "",
+    limit: int = PAGE_SIZE,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Une page de l'historique (plus récents d'abord) après `cursor`.
+    Retourne (devis, curseur de la page suivante ou None).
+    """
+    limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+    clauses, args = (filters or HistoryFilters()).where()
+    after = decode_cursor(cursor)
+    if after is not None:
+        clauses.append("(date_iso, id) < (?, ?)")
+        args.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"""
+        SELECT {_COLUMNS} FROM devis
+        {where}
+        ORDER BY date_iso DESC, id DESC
+        LIMIT ?
+        """,
+        (*args, limit + 1),
+    ).fetchall()
+    page = [dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last["date_iso"], last["id"])
+    return page, next_cursor
@@ -0,0 +1,183 @@
+# app/services/devis_refs.py
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+# Références de devis attribuées par la base, plus par « dernière réf + 1 » :
+#   - devis_ref_sequences : dernier numéro attribué par préfixe (D, D2026-,
+#     DGA-, ...), incrémenté dans une transaction d'écriture courte ; SQLite
+#     sérialise les écritures, donc deux requêtes simultanées (même dans deux
+#     workers uvicorn) n'obtiennent jamais le même numéro ;
+#   - devis_ref_reservations : chaque réf attribuée, avec qui l'a demandée et
+#     quand ; used_at est rempli à l'enregistrement du devis (dans la
+#     transaction de insert_devis_row). Une réf sans used_at = réservée mais
+#     jamais enregistrée (calcul en erreur, lot interrompu, ...).
+# Un nouveau préfixe démarre après le plus grand numéro déjà présent dans
+# devis pour ce préfixe : la numérotation D00001... existante continue.
+#
+# DEVIS_REF_SCHEME : "" (défaut, D00001), "annee" (D2026-00001),
+# "commercial" (DGA-00001) ou "annee,commercial" (D2026-GA-00001).
+
+DEVIS_REF_SCHEME = os.environ.get("DEVIS_REF_SCHEME", "")
+REF_BASE_PREFIX = "D"
+REF_DIGITS = 5
+
+_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS devis_ref_sequences (
+        prefix TEXT PRIMARY KEY,
+        last_value INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS devis_ref_reservations (
+        ref_devis TEXT PRIMARY KEY,
+        prefix TEXT NOT NULL,
+        reserved_at TEXT NOT NULL,
+        reserved_by TEXT NOT NULL DEFAULT '',
+        used_at TEXT
+    ) WITHOUT ROWID
+    """,
+    # réservations jamais utilisées : index partiel, reste minuscule
+    """
+    CREATE INDEX IF NOT EXISTS idx_ref_reservations_unused
+    ON devis_ref_reservations (reserved_at) WHERE used_at IS NULL
+    """,
+)
+
+
+def ensure_devis_refs(conn: sqlite3.Connection) -> None:
+    with conn:
+        for ddl in _DDL:
+            conn.execute(ddl)
+
+
+def ref_prefix(
+    code_commercial: str = "",
+    day: Optional[date] = None,
+    scheme: Optional[str] = None,
+) -> str:
+    """Préfixe de numérotation selon DEVIS_REF_SCHEME (ou `scheme`)."""
+    parts = {p.strip().lower() for p in (DEVIS_REF_SCHEME if scheme is None else scheme).split(",")}
+    prefix = REF_BASE_PREFIX
+    if "annee" in parts:
+        prefix += f"{(day or date.today()).year}-"
+    code = re.sub(r"[^A-Z0-9]", "", (code_commercial or "").upper())
+    if "commercial" in parts and code:
+        prefix += f"{code}-"
+    return prefix
+
+
+def _format(prefix: str, value: int) -> str:
+    return f"{prefix}{value:0{REF_DIGITS}d}"
+
+
+def _seed(conn: sqlite3.Connection, prefix: str) -> int:
+    """Plus grand numéro déjà utilisé dans devis pour ce préfixe (0 sinon)."""
+    suffix = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+    last = 0
+    for (ref,) in conn.execute(
+        "SELECT ref_devis FROM devis WHERE ref_devis >= ? AND ref_devis < ?",
+        (prefix, prefix + "\uffff"),
+    ):
+        m = suffix.match(ref or "")
+        if m:
+            last = max(last, int(m.group(1)))
+    return last
+
+
+def _taken(conn: sqlite3.Connection, ref_devis: str) -> bool:
+    return (
+        conn.execute("SELECT 1 FROM devis WHERE ref_devis = ?", (ref_devis,)).fetchone()
+        or conn.execute(
+            "SELECT 1 FROM devis_ref_reservations WHERE ref_devis = ?", (ref_devis,)
+        ).fetchone()
+    ) is not None
+
+
+def allocate_ref(conn: sqlite3.Connection, prefix: str = REF_BASE_PREFIX, reserved_by: str = "") -> str:
+    """
+    Attribue et réserve la réf suivante pour `prefix`, dans sa propre
+    transaction (commit en sortie). L'UPDATE ouvre directement une
+    transaction d'écriture : pas de lecture-puis-écriture concurrente.
+    """
+    with conn:
+        row = conn.execute(
+            "UPDATE devis_ref_sequences SET last_value = last_value + 1 "
+            "WHERE prefix = ? RETURNING last_value",
+            (prefix,),
+        ).fetchone()
+        if row is None:
+            value = _seed(conn, prefix) + 1
+            conn.execute(
+                "INSERT INTO devis_ref_sequences (prefix, last_value) VALUES (?, ?)",
+                (prefix, value),
+            )
+        else:
+            value = row[0]
+        ref_devis = _format(prefix, value)
+        # réf saisie à la main ou importée entre-temps : on la saute
+        while _taken(conn, ref_devis):
+            value += 1
+            ref_devis = _format(prefix, value)
+        conn.execute(
+            "UPDATE devis_ref_sequences SET last_value = ? WHERE prefix = ?", (value, prefix)
+        )
+        conn.execute(
+            "INSERT INTO devis_ref_reservations (ref_devis, prefix, reserved_at, reserved_by) "
+            "VALUES (?, ?, ?, ?)",
+            (ref_devis, prefix, datetime.now().isoformat(timespec="seconds"), reserved_by),
+        )
+    return ref_devis
+
+
+def peek_next_ref(conn: sqlite3.Connection, prefix: str = REF_BASE_PREFIX) -> str:
+    """Réf que recevrait le prochain devis (indicatif, rien n'est réservé)."""
+    row = conn.execute(
+        "SELECT last_value FROM devis_ref_sequences WHERE prefix = ?", (prefix,)
+    ).fetchone()
+    return _format(prefix, (row[0] if row is not None else _seed(conn, prefix)) + 1)
+
+
+def is_reserved_for(conn: sqlite3.Connection, ref_devis: str, reserved_by: str) -> bool:
+    """
+    Réf saisie à la main : acceptée seulement si c'est une réservation encore
+    libre, faite par `reserved_by` (pas de réf arbitraire ni déjà enregistrée).
+    """
+    return (
+        conn.execute(
+            "SELECT 1 FROM devis_ref_reservations "
+            "WHERE ref_devis = ? AND reserved_by = ? AND used_at IS NULL",
+            (ref_devis, reserved_by),
+        ).fetchone()
+        is not None
+    )
+
+
+def mark_ref_used(conn: sqlite3.Connection, ref_devis: str) -> None:
+    """À appeler dans la transaction d'enregistrement du devis."""
+    conn.execute(
+        "UPDATE devis_ref_reservations SET used_at = ? WHERE ref_devis = ? AND used_at IS NULL",
+        (datetime.now().isoformat(timespec="seconds"), ref_devis),
+    )
+
+
+def list_unused_refs(conn: sqlite3.Connection, limit: int = 200) -> List[Dict[str, Any]]:
+    """Réfs réservées mais jamais enregistrées, plus anciennes d'abord."""
+    return [
+        dict(zip(("ref_devis", "prefix", "reserved_at", "reserved_by"), tuple(r)))
+        for r in conn.execute(
+            """
+            SELECT ref_devis, prefix, reserved_at, reserved_by
+            FROM devis_ref_reservations
+            WHERE used_at IS NULL
+            ORDER BY reserved_at
+            LIMIT ?
+            """,
+            (limit,),
+        )
+    ]
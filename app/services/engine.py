@@ -1,10 +1,24 @@
 # app/services/engine.py
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from math import ceil
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+from app.services.lignes import (
+    Hourdis,
+    HourdisInput,
+    LigneDevis,
+    Poutrelle,
+    PoutrellesInput,
+    _flt,
+    hourdis_columns,
+    poutrelles_columns,
+)
 
 # ================== PRIX STANDARDS =====================================
+# Valeurs initiales du catalogue de prix (app.services.catalogue, version 1) :
+# en production, les prix appliqués sont ceux de la version active en base.
 
 PRICE_STD_POUTRELLE_ML: Dict[str, float] = {
     "113": 28.89,
@@ -45,70 +59,176 @@ WEIGHT_HOURDIS_U_KG: Dict[str, float] = {
 }
 
 
-def _flt(x: Any) -> float:
-    try:
-        return float(x)
-    except (TypeError, ValueError):
-        return 0.0
+# ================== GRILLE DE PRIX =====================================
 
 
-def _compute_poids(
-    poutrelles: List[Dict[str, Any]], hourdis: List[Dict[str, Any]]
-) -> Tuple[float, float, float, float, float]:
+@dataclass(frozen=True)
+class PriceGrid:
+    """Prix standards + poids utilisés par le calcul (grille courante ou candidate)."""
+
+    poutrelle_ml: Mapping[str, float]
+    hourdis_u: Mapping[str, float]
+    etrier: float
+    poids_poutrelle_ml: Mapping[str, float]
+    poids_hourdis_u: Mapping[str, float]
+
+
+def standard_grid() -> PriceGrid:
+    """Grille construite à partir des constantes ci-dessus."""
+    return PriceGrid(
+        poutrelle_ml=PRICE_STD_POUTRELLE_ML,
+        hourdis_u=PRICE_STD_HOURDIS_U,
+        etrier=ETRIER_STD_PRICE,
+        poids_poutrelle_ml=WEIGHT_POUTRELLE_ML_KG,
+        poids_hourdis_u=WEIGHT_HOURDIS_U_KG,
+    )
+
+
+# ================== AGRÉGATS PAR TYPE ==================================
+
+
+@dataclass
+class QuoteAggregate:
     """
-    Retourne :
-      total_ml_poutrelles, poids_poutrelles, total_u_hourdis, poids_hourdis, poids_total
+    Métrés d'un devis regroupés par type : ml par type de poutrelle, unités
+    par type de hourdis. Construit une fois (parsing / saisie manuelle) ;
+    le transport se calcule ensuite en quelques opérations, quel que soit
+    le nombre de lignes du fichier progiciel.
     """
-    total_ml_p = 0.0
-    poids_p = 0.0
 
-    for p in poutrelles:
-        t = str(p.get("type", "")).strip()
-        longueur = _flt(p.get("longueur"))
-        nb = _flt(p.get("nombre"))
+    ml_poutrelles: Dict[str, float] = field(default_factory=dict)
+    u_hourdis: Dict[str, float] = field(default_factory=dict)
+
+    def add_poutrelle(self, p: Union[Poutrelle, Mapping[str, Any]]) -> None:
+        if not isinstance(p, Poutrelle):
+            p = Poutrelle.from_mapping(p)
+        self.add_ml(p.type, p.longueur, p.nombre)
+
+    def add_ml(self, t: str, longueur: float, nb: float) -> None:
         if not t or longueur <= 0 or nb <= 0:
-            continue
-        ml = longueur * nb
-        total_ml_p += ml
-        poids_ml = WEIGHT_POUTRELLE_ML_KG.get(t, 0.0)
-        poids_p += ml * poids_ml
-
-    total_u_h = 0.0
-    poids_h = 0.0
-    for h in hourdis:
-        t = str(h.get("type", "")).upper()
-        qte = _flt(h.get("nombre"))
+            return
+        self.ml_poutrelles[t] = self.ml_poutrelles.get(t, 0.0) + longueur * nb
+
+    def add_hourdis(self, h: Union[Hourdis, Mapping[str, Any]]) -> None:
+        if not isinstance(h, Hourdis):
+            h = Hourdis.from_mapping(h)
+        self.add_units(h.type, h.nombre)
+
+    def add_units(self, t: str, qte: float) -> None:
         if not t or qte <= 0:
-            continue
-        total_u_h += qte
-        poids_u = WEIGHT_HOURDIS_U_KG.get(t, 0.0)
-        poids_h += qte * poids_u
+            return
+        self.u_hourdis[t] = self.u_hourdis.get(t, 0.0) + qte
+
+    @classmethod
+    def from_lines(cls, poutrelles: PoutrellesInput, hourdis: HourdisInput) -> "QuoteAggregate":
+        agg = cls()
+        pc = poutrelles_columns(poutrelles)
+        for t, longueur, nb in zip(pc.type, pc.longueur, pc.nombre):
+            agg.add_ml(t, longueur, nb)
+        hc = hourdis_columns(hourdis)
+        for t, qte in zip(hc.type, hc.nombre):
+            agg.add_units(t, qte)
+        return agg
+
+    def totals(self, grid: Optional[PriceGrid] = None) -> Tuple[float, float, float, float]:
+        """
+        total_ml_poutrelles, poids_poutrelles, total_u_hourdis, poids_hourdis.
+        Types parcourus dans l'ordre alphabétique : le résultat ne dépend pas
+        de l'ordre des lignes (engine_batch fait exactement les mêmes additions).
+        """
+        grid = grid or standard_grid()
+        total_ml_p = 0.0
+        poids_p = 0.0
+        for t in sorted(self.ml_poutrelles):
+            ml = self.ml_poutrelles[t]
+            total_ml_p += ml
+            poids_p += ml * grid.poids_poutrelle_ml.get(t, 0.0)
+
+        total_u_h = 0.0
+        poids_h = 0.0
+        for t in sorted(self.u_hourdis):
+            qte = self.u_hourdis[t]
+            total_u_h += qte
+            poids_h += qte * grid.poids_hourdis_u.get(t, 0.0)
+        return total_ml_p, poids_p, total_u_h, poids_h
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        return {"ml_poutrelles": dict(self.ml_poutrelles), "u_hourdis": dict(self.u_hourdis)}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Mapping[str, Any]]) -> "QuoteAggregate":
+        data = data or {}
+        return cls(
+            ml_poutrelles={str(k): float(v) for k, v in (data.get("ml_poutrelles") or {}).items()},
+            u_hourdis={str(k): float(v) for k, v in (data.get("u_hourdis") or {}).items()},
+        )
+
 
+def _compute_poids(
+    poutrelles: PoutrellesInput,
+    hourdis: HourdisInput,
+    grid: Optional[PriceGrid] = None,
+) -> Tuple[float, float, float, float, float]:
+    """
+    Retourne :
+      total_ml_poutrelles, poids_poutrelles, total_u_hourdis, poids_hourdis, poids_total
+    """
+    total_ml_p, poids_p, total_u_h, poids_h = QuoteAggregate.from_lines(
+        poutrelles, hourdis
+    ).totals(grid)
     poids_total = poids_p + poids_h
     return total_ml_p, poids_p, total_u_h, poids_h, poids_total
 
 
 def simulate_transport(
-    poutrelles: List[Dict[str, Any]],
-    hourdis: List[Dict[str, Any]],
+    poutrelles: PoutrellesInput,
+    hourdis: HourdisInput,
     distance_km: float,
     mode_transport: str,
     transport_mode: str,
     transport_poutrelle_manuel: float = 0.0,
     transport_hourdis_manuel: float = 0.0,
+    grid: Optional[PriceGrid] = None,
+    aggregate: Optional[QuoteAggregate] = None,
 ) -> Dict[str, float]:
     """
     Calcule le coût de transport :
      - transport_par_ml_auto / transport_par_hourdis_auto
      - transport_par_ml_effectif / transport_par_hourdis_effectif (auto ou manuel)
      - total transport, nb camions, poids, etc.
+    Si `aggregate` est fourni, les lignes ne sont pas relues (temps constant).
     """
-    distance_km = _flt(distance_km)
-
-    total_ml_p, poids_p, total_u_h, poids_h, poids_total = _compute_poids(
-        poutrelles, hourdis
+    if aggregate is None:
+        aggregate = QuoteAggregate.from_lines(poutrelles, hourdis)
+    total_ml_p, poids_p, total_u_h, poids_h = aggregate.totals(grid)
+    return transport_from_totals(
+        total_ml_p,
+        poids_p,
+        total_u_h,
+        poids_h,
+        distance_km,
+        mode_transport,
+        transport_mode,
+        transport_poutrelle_manuel,
+        transport_hourdis_manuel,
     )
 
+
+def transport_from_totals(
+    total_ml_p: float,
+    poids_p: float,
+    total_u_h: float,
+    poids_h: float,
+    distance_km: float,
+    mode_transport: str,
+    transport_mode: str,
+    transport_poutrelle_manuel: float = 0.0,
+    transport_hourdis_manuel: float = 0.0,
+) -> Dict[str, float]:
+    """Même calcul que simulate_transport, à partir des métrés / poids déjà cumulés."""
+    distance_km = _flt(distance_km)
+    poids_total = poids_p + poids_h
+
     result = {
         "poids_total": poids_total,
         "poids_poutrelles": poids_p,
@@ -178,8 +298,8 @@ def simulate_transport(
 
 
 def compute_devis(
-    poutrelles: List[Dict[str, Any]],
-    hourdis: List[Dict[str, Any]],
+    poutrelles: PoutrellesInput,
+    hourdis: HourdisInput,
     surface_ct: float,
     surface_ts: float,
     remise_poutrelle: float,
@@ -191,6 +311,8 @@ def compute_devis(
     distance_km: float,
     transport_poutrelle_manuel: float,
     transport_hourdis_manuel: float,
+    grid: Optional[PriceGrid] = None,
+    aggregate: Optional[QuoteAggregate] = None,
 ) -> Dict[str, Any]:
     """
     Calcule les lignes du devis + TOTAL HT / TVA / TTC
@@ -198,8 +320,15 @@ def compute_devis(
       - prix standards + remises
       - transport intégré au prix unitaire poutrelles & hourdis
       - contrôle technique (surface_ct) et treillis soudés (surface_ts)
+    `aggregate` (métrés par type déjà calculés) évite de relire les lignes
+    pour le transport.
     """
-    lignes: List[Dict[str, Any]] = []
+    grid = grid or standard_grid()
+    poutrelles = poutrelles_columns(poutrelles)
+    hourdis = hourdis_columns(hourdis)
+    if aggregate is None:
+        aggregate = QuoteAggregate.from_lines(poutrelles, hourdis)
+    lignes: List[LigneDevis] = []
     total_ht = 0.0
 
     # ================== TRANSPORT =======================================
@@ -211,6 +340,8 @@ def compute_devis(
         transport_mode,
         transport_poutrelle_manuel,
         transport_hourdis_manuel,
+        grid,
+        aggregate,
     )
 
     tr_ml = info_tr["transport_par_ml_effectif"]
@@ -219,17 +350,14 @@ def compute_devis(
     # ================== POUTRELLES ======================================
     total_etriers_global = 0.0
 
-    for p in poutrelles:
-        t = str(p.get("type", "")).strip()
-        longueur = _flt(p.get("longueur"))
-        nb = _flt(p.get("nombre"))
-        etrier = _flt(p.get("etrier"))
-
+    for t, longueur, nb, etrier in zip(
+        poutrelles.type, poutrelles.longueur, poutrelles.nombre, poutrelles.etrier
+    ):
         if not t or longueur <= 0 or nb <= 0:
             continue
 
         # Prix standard + remise
-        base_ml = PRICE_STD_POUTRELLE_ML.get(t, 0.0)
+        base_ml = grid.poutrelle_ml.get(t, 0.0)
         base_ml_remise = base_ml * (1.0 - remise_poutrelle / 100.0)
 
         # Transport intégré
@@ -238,15 +366,15 @@ def compute_devis(
         total = prix * nb
 
         lignes.append(
-            {
-                "type": t,
-                "longueur": round(longueur, 2),
-                "etrier": int(etrier) if etrier else "",
-                "nombre": int(nb),
-                "prix_ml": round(prix_ml, 2),
-                "prix": round(prix, 2),
-                "total": round(total, 2),
-            }
+            LigneDevis(
+                type=t,
+                longueur=round(longueur, 2),
+                etrier=int(etrier) if etrier else "",
+                nombre=int(nb),
+                prix_ml=round(prix_ml, 2),
+                prix=round(prix, 2),
+                total=round(total, 2),
+            )
         )
 
         total_ht += total
@@ -256,46 +384,43 @@ def compute_devis(
     # ================== ETRIERS =========================================
     if total_etriers_global > 0:
         qte_e = total_etriers_global
-        prix_etrier = ETRIER_STD_PRICE * (1.0 - remise_poutrelle / 100.0)
+        prix_etrier = grid.etrier * (1.0 - remise_poutrelle / 100.0)
         total_e = qte_e * prix_etrier
 
         lignes.append(
-            {
-                "type": "ETRIERS",
-                "longueur": "",
-                "etrier": "",
-                "nombre": int(qte_e),
-                "prix_ml": round(prix_etrier, 4),
-                "prix": round(prix_etrier, 4),
-                "total": round(total_e, 2),
-            }
+            LigneDevis(
+                type="ETRIERS",
+                longueur="",
+                etrier="",
+                nombre=int(qte_e),
+                prix_ml=round(prix_etrier, 4),
+                prix=round(prix_etrier, 4),
+                total=round(total_e, 2),
+            )
         )
         total_ht += total_e
 
     # ================== HOURDIS =========================================
-    for h in hourdis:
-        t = str(h.get("type", "")).upper()
-        qte = _flt(h.get("nombre"))
-
+    for t, qte in zip(hourdis.type, hourdis.nombre):
         if not t or qte <= 0:
             continue
 
-        base_u = PRICE_STD_HOURDIS_U.get(t, 0.0)
+        base_u = grid.hourdis_u.get(t, 0.0)
         base_u_remise = base_u * (1.0 - remise_hourdis / 100.0)
 
         prix_u = base_u_remise + tr_h
         total = prix_u * qte
 
         lignes.append(
-            {
-                "type": t,
-                "longueur": "",  
-                "etrier": "",
-                "nombre": int(qte),
-                "prix_ml": round(prix_u, 2),
-                "prix": round(prix_u, 2),
-                "total": round(total, 2),
-            }
+            LigneDevis(
+                type=t,
+                longueur="",
+                etrier="",
+                nombre=int(qte),
+                prix_ml=round(prix_u, 2),
+                prix=round(prix_u, 2),
+                total=round(total, 2),
+            )
         )
         total_ht += total
 
@@ -304,15 +429,15 @@ def compute_devis(
     if surface_ct > 0 and prix_ct > 0:
         total_ct = surface_ct * prix_ct
         lignes.append(
-            {
-                "type": "CONTROLE TECHNIQUE",
-                "longueur": "",
-                "etrier": "",
-                "nombre": round(surface_ct, 2),
-                "prix_ml": round(prix_ct, 2),
-                "prix": round(prix_ct, 2),
-                "total": round(total_ct, 2),
-            }
+            LigneDevis(
+                type="CONTROLE TECHNIQUE",
+                longueur="",
+                etrier="",
+                nombre=round(surface_ct, 2),
+                prix_ml=round(prix_ct, 2),
+                prix=round(prix_ct, 2),
+                total=round(total_ct, 2),
+            )
         )
         total_ht += total_ct
 
@@ -322,15 +447,15 @@ def compute_devis(
         nb_ts = ceil(surface_ts / 10.0)
         total_tr = nb_ts * prix_treillis
         lignes.append(
-            {
-                "type": "TREILLES SOUDEES",
-                "longueur": "",
-                "etrier": "",
-                "nombre": int(nb_ts),
-                "prix_ml": round(prix_treillis, 2),
-                "prix": round(prix_treillis, 2),
-                "total": round(total_tr, 2),
-            }
+            LigneDevis(
+                type="TREILLES SOUDEES",
+                longueur="",
+                etrier="",
+                nombre=int(nb_ts),
+                prix_ml=round(prix_treillis, 2),
+                prix=round(prix_treillis, 2),
+                total=round(total_tr, 2),
+            )
         )
         total_ht += total_tr
 
@@ -0,0 +1,452 @@
+# app/services/engine_batch.py
+from __future__ import annotations
+
+from array import array
+from math import ceil
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from app.services.engine import PriceGrid, standard_grid, transport_from_totals
+from app.services.lignes import LigneDevis, _flt, hourdis_columns, poutrelles_columns
+
+# Moteur de calcul "par lots" : mêmes règles que engine.compute_devis, mais les
+# lignes de TOUS les devis du lot sont mises dans des tableaux NumPy typés
+# (index de quote, code type, longueur, nombre, étrier) et les prix / poids /
+# étriers sont calculés d'un seul coup.
+#
+# Résultats identiques au centime près à compute_devis : les opérations
+# élément par élément sont les mêmes en double précision, et les cumuls sont
+# faits dans le même ordre que la boucle Python (_segment_totals), jamais
+# avec np.sum / np.add.reduceat (sommation par paires → derniers bits
+# différents). Les poids suivent QuoteAggregate : cumul par type, types dans l'ordre alphabétique.
+
+QUOTE_PARAMS = (
+    "surface_ct",
+    "surface_ts",
+    "remise_poutrelle",
+    "remise_hourdis",
+    "prix_ct",
+    "prix_treillis",
+    "mode_transport",
+    "transport_mode",
+    "distance_km",
+    "transport_poutrelle_manuel",
+    "transport_hourdis_manuel",
+)
+
+# au-delà, un segment (lignes d'un devis / d'un type) est cumulé à part
+LONG_SEGMENT = 64
+
+_DEFAULTS: Dict[str, Any] = {
+    "surface_ct": 0.0,
+    "surface_ts": 0.0,
+    "remise_poutrelle": 0.0,
+    "remise_hourdis": 0.0,
+    "prix_ct": 0.0,
+    "prix_treillis": 0.0,
+    "mode_transport": "depart",
+    "transport_mode": "auto",
+    "distance_km": 0.0,
+    "transport_poutrelle_manuel": 0.0,
+    "transport_hourdis_manuel": 0.0,
+}
+
+
+class _TypeCodes:
+    """Libellé de type → index entier ; les prix/poids deviennent des vecteurs."""
+
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+        self.labels: List[str] = []
+
+    def code(self, label: str) -> int:
+        idx = self.index.get(label)
+        if idx is None:
+            idx = len(self.labels)
+            self.index[label] = idx
+            self.labels.append(label)
+        return idx
+
+    def vector(self, table: Mapping[str, float]) -> np.ndarray:
+        return np.array([table.get(t, 0.0) for t in self.labels], dtype=np.float64)
+
+
+class _ColumnsBuffer:
+    """
+    Concatène les colonnes de plusieurs devis (copies de array.array, sans
+    boucle Python par ligne), puis filtre les lignes invalides d'un coup.
+    """
+
+    def __init__(self, n_quotes: int, fields: Sequence[str]) -> None:
+        self.n_quotes = n_quotes
+        self.fields = fields
+        self.values = {f: array("d") for f in fields}
+        self.codes = array("I")
+        self.labels: List[str] = []      # libellés de chaque devis, bout à bout
+        self.label_offset: List[int] = []
+        self.counts: List[int] = []
+
+    def add(self, cols: Any) -> None:
+        self.label_offset.append(len(self.labels))
+        self.labels.extend(cols.type.labels)
+        self.codes.extend(cols.type.codes)
+        for f in self.fields:
+            self.values[f].extend(getattr(cols, f))
+        self.counts.append(len(cols))
+
+    def build(self, types: _TypeCodes, *positive_fields: str):
+        counts = np.array(self.counts, dtype=np.int64)
+        quote = np.repeat(np.arange(self.n_quotes, dtype=np.int64), counts)
+        label_type = np.array([types.code(t) for t in self.labels] or [0], dtype=np.int32)
+        label_ok = np.array([bool(t) for t in self.labels] or [False])
+        label_idx = _as_array(self.codes).astype(np.int64)
+        label_idx += np.repeat(np.array(self.label_offset, dtype=np.int64), counts)
+
+        values = {f: _as_array(v) for f, v in self.values.items()}
+        # mêmes filtres que compute_devis : type non vide, quantités > 0
+        mask = label_ok[label_idx] if label_idx.size else np.zeros(0, dtype=bool)
+        for f in positive_fields:
+            mask &= values[f] > 0
+
+        quote = quote[mask]
+        bounds = np.zeros(self.n_quotes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(quote, minlength=self.n_quotes), out=bounds[1:])
+        type_code = label_type[label_idx[mask]] if label_idx.size else np.zeros(0, np.int32)
+        return quote, bounds, type_code, {f: v[mask] for f, v in values.items()}
+
+
+def _as_array(buf: array) -> np.ndarray:
+    # les codes de array.array ("d", "I") sont aussi des codes de dtype NumPy
+    return np.frombuffer(buf, dtype=buf.typecode) if len(buf) else np.zeros(0, dtype=buf.typecode)
+
+
+class QuoteArrays:
+    """Lignes poutrelles / hourdis d'un lot de devis, en colonnes NumPy."""
+
+    def __init__(self, quotes: Sequence[Mapping[str, Any]]) -> None:
+        self.n_quotes = len(quotes)
+        self.p_types = _TypeCodes()
+        self.h_types = _TypeCodes()
+
+        p_buf = _ColumnsBuffer(self.n_quotes, ("longueur", "nombre", "etrier"))
+        h_buf = _ColumnsBuffer(self.n_quotes, ("nombre",))
+        for quote in quotes:
+            # colonnes du parser, forme JSON (devis_inputs) ou liste de dicts
+            p_buf.add(poutrelles_columns(quote.get("poutrelles")))
+            h_buf.add(hourdis_columns(quote.get("hourdis")))
+
+        # bornes [début, fin) des lignes de chaque devis dans les colonnes
+        self.p_quote, self.p_bounds, self.p_type, p_values = p_buf.build(
+            self.p_types, "longueur", "nombre"
+        )
+        self.p_longueur = p_values["longueur"]
+        self.p_nombre = p_values["nombre"]
+        self.p_etrier = p_values["etrier"]
+
+        self.h_quote, self.h_bounds, self.h_type, h_values = h_buf.build(
+            self.h_types, "nombre"
+        )
+        self.h_nombre = h_values["nombre"]
+
+
+def _segment_totals(
+    values: np.ndarray, bounds: np.ndarray, start: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Somme de chaque segment values[bounds[g]:bounds[g + 1]], dans l'ordre
+    (comme `total += x` en Python), en partant de `start` (0 par défaut).
+      - segments courts (≤ LONG_SEGMENT) : on avance d'un rang à la fois sur
+        tous ceux encore "ouverts", au plus LONG_SEGMENT itérations ;
+      - segments longs (gros devis) : np.cumsum sur le segment, séquentiel
+        lui aussi (np.add.reduceat, par paires, ne l'est pas).
+    Nombre d'appels NumPy : O(LONG_SEGMENT + nb lignes / LONG_SEGMENT).
+    """
+    n_groups = len(bounds) - 1
+    acc = np.zeros(n_groups, dtype=np.float64) if start is None else start.astype(np.float64)
+    if n_groups == 0 or values.size == 0:
+        return acc
+    starts = bounds[:-1]
+    lengths = np.diff(bounds)
+
+    for g in np.flatnonzero(lengths > LONG_SEGMENT).tolist():
+        segment = values[starts[g] : bounds[g + 1]]
+        acc[g] = np.cumsum(np.concatenate((acc[g : g + 1], segment)))[-1]
+
+    short = np.flatnonzero((lengths > 0) & (lengths <= LONG_SEGMENT))
+    if short.size == 0:
+        return acc
+    by_length = short[np.argsort(-lengths[short], kind="stable")]
+    neg_sorted = -lengths[by_length]
+    for k in range(int(lengths[by_length[0]])):
+        active = by_length[: np.searchsorted(neg_sorted, -k, side="left")]
+        acc[active] += values[starts[active] + k]
+    return acc
+
+
+def _totals_by_type(
+    values: np.ndarray,
+    weights_by_code: np.ndarray,
+    quote: np.ndarray,
+    type_code: np.ndarray,
+    labels: Sequence[str],
+    n_quotes: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Même calcul que QuoteAggregate.totals pour chaque devis : cumul par
+    (devis, type) dans l'ordre des lignes, puis types pris dans l'ordre
+    alphabétique. Retourne (total, poids) par devis.
+    """
+    total = np.zeros(n_quotes, dtype=np.float64)
+    poids = np.zeros(n_quotes, dtype=np.float64)
+    n_types = len(labels)
+    if n_types == 0 or values.size == 0:
+        return total, poids
+
+    order = sorted(range(n_types), key=labels.__getitem__)
+    rank = np.empty(n_types, dtype=np.int64)
+    rank[order] = np.arange(n_types)
+    group = quote * n_types + rank[type_code]
+    idx = np.argsort(group, kind="stable")  # stable : ordre des lignes conservé
+    bounds = np.searchsorted(group[idx], np.arange(n_quotes * n_types + 1))
+    by_type = _segment_totals(values[idx], bounds).reshape(n_quotes, n_types)
+
+    # type absent d'un devis : + 0.0, ce qui ne change pas la somme
+    for j, code in enumerate(order):
+        column = by_type[:, j]
+        total += column
+        poids += column * weights_by_code[code]
+    return total, poids
+
+
+def compute_devis_batch(
+    quotes: Sequence[Mapping[str, Any]],
+    grid: Optional[PriceGrid] = None,
+    with_lignes: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Calcule plusieurs devis d'un coup. Chaque quote est un dict avec les
+    arguments de compute_devis (poutrelles, hourdis, surface_ct, remise_poutrelle, ...).
+    Retourne, dans l'ordre, le même dict que compute_devis ; sans les lignes si
+    with_lignes=False (re-tarification en masse : seuls les totaux comptent).
+    """
+    grid = grid or standard_grid()
+    arr = QuoteArrays(quotes)
+    params = [{**_DEFAULTS, **{k: q[k] for k in QUOTE_PARAMS if k in q}} for q in quotes]
+
+    # ================== PRIX / MÉTRÉS (vectorisé) ======================
+    p_prix_ml = arr.p_types.vector(grid.poutrelle_ml)[arr.p_type]
+    h_prix_u = arr.h_types.vector(grid.hourdis_u)[arr.h_type]
+
+    p_ml = arr.p_longueur * arr.p_nombre
+    p_etriers = arr.p_nombre * arr.p_etrier * 2.0
+
+    # ================== TRANSPORT (agrégats par type, puis par devis) ==
+    ml_p, poids_p = _totals_by_type(
+        p_ml,
+        arr.p_types.vector(grid.poids_poutrelle_ml),
+        arr.p_quote,
+        arr.p_type,
+        arr.p_types.labels,
+        arr.n_quotes,
+    )
+    u_h, poids_h = _totals_by_type(
+        arr.h_nombre,
+        arr.h_types.vector(grid.poids_hourdis_u),
+        arr.h_quote,
+        arr.h_type,
+        arr.h_types.labels,
+        arr.n_quotes,
+    )
+    ml_p, poids_p = ml_p.tolist(), poids_p.tolist()
+    u_h, poids_h = u_h.tolist(), poids_h.tolist()
+
+    infos_tr: List[Dict[str, float]] = []
+    for q, prm in enumerate(params):
+        infos_tr.append(
+            transport_from_totals(
+                ml_p[q],
+                poids_p[q],
+                u_h[q],
+                poids_h[q],
+                prm["distance_km"],
+                prm["mode_transport"],
+                prm["transport_mode"],
+                prm["transport_poutrelle_manuel"],
+                prm["transport_hourdis_manuel"],
+            )
+        )
+    tr_ml = np.array([i["transport_par_ml_effectif"] for i in infos_tr], dtype=np.float64)
+    tr_h = np.array([i["transport_par_hourdis_effectif"] for i in infos_tr], dtype=np.float64)
+
+    # ================== PRIX DES LIGNES (vectorisé) =====================
+    remise_p = np.array([float(p["remise_poutrelle"]) for p in params], dtype=np.float64)
+    remise_h = np.array([float(p["remise_hourdis"]) for p in params], dtype=np.float64)
+
+    p_px_ml = p_prix_ml * (1.0 - remise_p[arr.p_quote] / 100.0) + tr_ml[arr.p_quote]
+    p_prix = p_px_ml * arr.p_longueur
+    p_total = p_prix * arr.p_nombre
+
+    h_px_u = h_prix_u * (1.0 - remise_h[arr.h_quote] / 100.0) + tr_h[arr.h_quote]
+    h_total = h_px_u * arr.h_nombre
+
+    # étriers, contrôle technique, treillis : une valeur par devis
+    nb_etriers = _segment_totals(p_etriers, arr.p_bounds)
+    prix_etrier = grid.etrier * (1.0 - remise_p / 100.0)
+    total_e = np.where(nb_etriers > 0, nb_etriers * prix_etrier, 0.0)
+
+    surface_ct = np.array([_flt(p["surface_ct"]) for p in params], dtype=np.float64)
+    prix_ct = np.array([float(p["prix_ct"]) for p in params], dtype=np.float64)
+    has_ct = (surface_ct > 0) & (prix_ct > 0)
+    total_ct = np.where(has_ct, surface_ct * prix_ct, 0.0)
+
+    surface_ts = np.array([_flt(p["surface_ts"]) for p in params], dtype=np.float64)
+    prix_ts = np.array([float(p["prix_treillis"]) for p in params], dtype=np.float64)
+    has_ts = (surface_ts > 0) & (prix_ts > 0)
+    nb_ts = np.ceil(surface_ts / 10.0)
+    total_ts = np.where(has_ts, nb_ts * prix_ts, 0.0)
+
+    # TOTAL HT : même ordre d'addition que compute_devis
+    # (poutrelles, étriers, hourdis, contrôle technique, treillis)
+    total_ht = _segment_totals(p_total, arr.p_bounds) + total_e
+    total_ht = _segment_totals(h_total, arr.h_bounds, start=total_ht)
+    total_ht = total_ht + total_ct + total_ts
+    # ================== RÉSULTATS (arrondis Python, comme compute_devis)
+    total_ht_l = total_ht.tolist()
+    nb_etriers_l = nb_etriers.tolist()
+    prix_etrier_l = prix_etrier.tolist()
+    total_e_l = total_e.tolist()
+    results: List[Dict[str, Any]] = []
+    for q in range(arr.n_quotes):
+        info_tr = infos_tr[q]
+        result: Dict[str, Any] = {}
+        if with_lignes:
+            result["lignes"] = _lignes(
+                arr, q, p_px_ml, p_prix, p_total, h_px_u, h_total,
+                nb_etriers_l[q], prix_etrier_l[q], total_e_l[q], params[q],
+            )
+        ht = total_ht_l[q]
+        tva = round(ht * 0.20, 2)
+        result.update(
+            {
+                "total_ht": round(ht, 2),
+                "tva": tva,
+                "total_ttc": round(ht + tva, 2),
+                "transport_total_auto": round(info_tr["transport_total_auto"], 2),
+                "transport_total_choisi": round(info_tr["transport_total_effectif"], 2),
+                "transport_par_ml": round(info_tr["transport_par_ml_effectif"], 4),
+                "transport_par_hourdis": round(info_tr["transport_par_hourdis_effectif"], 4),
+                "nb_camions": info_tr["nb_camions"],
+                "poids_total": round(info_tr["poids_total"], 2),
+                "poids_poutrelles": round(info_tr["poids_poutrelles"], 2),
+                "poids_hourdis": round(info_tr["poids_hourdis"], 2),
+            }
+        )
+        results.append(result)
+
+    return results
+
+
+def _lignes(
+    arr: QuoteArrays,
+    q: int,
+    p_px_ml: np.ndarray,
+    p_prix: np.ndarray,
+    p_total: np.ndarray,
+    h_px_u: np.ndarray,
+    h_total: np.ndarray,
+    nb_etriers: float,
+    prix_etrier: float,
+    total_e: float,
+    prm: Mapping[str, Any],
+) -> List[LigneDevis]:
+    """Lignes du devis n° q, au même format que compute_devis."""
+    ps, pe = arr.p_bounds[q], arr.p_bounds[q + 1]
+    hs, he = arr.h_bounds[q], arr.h_bounds[q + 1]
+    lignes: List[LigneDevis] = []
+
+    labels = arr.p_types.labels
+    for t, longueur, etrier, nb, prix_ml, prix, total in zip(
+        arr.p_type[ps:pe].tolist(),
+        arr.p_longueur[ps:pe].tolist(),
+        arr.p_etrier[ps:pe].tolist(),
+        arr.p_nombre[ps:pe].tolist(),
+        p_px_ml[ps:pe].tolist(),
+        p_prix[ps:pe].tolist(),
+        p_total[ps:pe].tolist(),
+    ):
+        lignes.append(
+            LigneDevis(
+                type=labels[t],
+                longueur=round(longueur, 2),
+                etrier=int(etrier) if etrier else "",
+                nombre=int(nb),
+                prix_ml=round(prix_ml, 2),
+                prix=round(prix, 2),
+                total=round(total, 2),
+            )
+        )
+
+    if nb_etriers > 0:
+        lignes.append(
+            LigneDevis(
+                type="ETRIERS",
+                longueur="",
+                etrier="",
+                nombre=int(nb_etriers),
+                prix_ml=round(prix_etrier, 4),
+                prix=round(prix_etrier, 4),
+                total=round(total_e, 2),
+            )
+        )
+
+    labels = arr.h_types.labels
+    for t, qte, prix_u, total in zip(
+        arr.h_type[hs:he].tolist(),
+        arr.h_nombre[hs:he].tolist(),
+        h_px_u[hs:he].tolist(),
+        h_total[hs:he].tolist(),
+    ):
+        lignes.append(
+            LigneDevis(
+                type=labels[t],
+                longueur="",
+                etrier="",
+                nombre=int(qte),
+                prix_ml=round(prix_u, 2),
+                prix=round(prix_u, 2),
+                total=round(total, 2),
+            )
+        )
+
+    surface_ct = _flt(prm["surface_ct"])
+    prix_ct = float(prm["prix_ct"])
+    if surface_ct > 0 and prix_ct > 0:
+        lignes.append(
+            LigneDevis(
+                type="CONTROLE TECHNIQUE",
+                longueur="",
+                etrier="",
+                nombre=round(surface_ct, 2),
+                prix_ml=round(prix_ct, 2),
+                prix=round(prix_ct, 2),
+                total=round(surface_ct * prix_ct, 2),
+            )
+        )
+
+    surface_ts = _flt(prm["surface_ts"])
+    prix_treillis = float(prm["prix_treillis"])
+    if surface_ts > 0 and prix_treillis > 0:
+        nb_ts = ceil(surface_ts / 10.0)
+        lignes.append(
+            LigneDevis(
+                type="TREILLES SOUDEES",
+                longueur="",
+                etrier="",
+                nombre=int(nb_ts),
+                prix_ml=round(prix_treillis, 2),
+                prix=round(prix_treillis, 2),
+                total=round(nb_ts * prix_treillis, 2),
+            )
+        )
+    return lignes
@@ -0,0 +1,320 @@
+# app/services/lignes.py
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+# Modèle des lignes de devis :
+#   - Poutrelle / Hourdis : lignes d'entrée (progiciel ou saisie manuelle) ;
+#   - LigneDevis          : ligne calculée (affichée par devis.html) ;
+#   - PoutrelleColumns / HourdisColumns : une liste de lignes rangée en
+#     colonnes (array('d') pour les nombres, code entier pour le type), ce que
+#     le parser produit et ce que le moteur parcourt.
+# Les classes ont des __slots__ (pas de __dict__ par ligne) et gardent un
+# accès "à la dict" (l["type"], l.get("type")) pour le code existant.
+# Les anciennes listes de dicts passent par poutrelles_columns / hourdis_columns.
+
+
+def _flt(x: Any) -> float:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _SlotsRecord:
+    __slots__ = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _SlotsRecord):
+            return type(self) is type(other) and all(
+                getattr(self, k) == getattr(other, k) for k in self.__slots__
+            )
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Poutrelle(_SlotsRecord):
+    __slots__ = ("type", "longueur", "etrier", "nombre")
+
+    def __init__(self, type: str, longueur: float, etrier: float, nombre: float) -> None:
+        self.type = type
+        self.longueur = longueur
+        self.etrier = etrier
+        self.nombre = nombre
+
+    @classmethod
+    def from_mapping(cls, p: Mapping[str, Any]) -> "Poutrelle":
+        """Dict historique → Poutrelle, normalisé comme le moteur (type sans espaces)."""
+        return cls(
+            str(p.get("type", "")).strip(),
+            _flt(p.get("longueur")),
+            _flt(p.get("etrier")),
+            _flt(p.get("nombre")),
+        )
+
+
+class Hourdis(_SlotsRecord):
+    __slots__ = ("type", "nombre")
+
+    def __init__(self, type: str, nombre: float) -> None:
+        self.type = type
+        self.nombre = nombre
+
+    @classmethod
+    def from_mapping(cls, h: Mapping[str, Any]) -> "Hourdis":
+        """Dict historique → Hourdis, normalisé comme le moteur (type en majuscules)."""
+        return cls(str(h.get("type", "")).upper(), _flt(h.get("nombre")))
+
+
+class LigneDevis(_SlotsRecord):
+    """Ligne calculée : poutrelle, ETRIERS, hourdis, CONTROLE TECHNIQUE, TREILLES SOUDEES."""
+
+    __slots__ = ("type", "longueur", "etrier", "nombre", "prix_ml", "prix", "total")
+
+    def __init__(
+        self,
+        type: str,
+        longueur: Union[float, str],
+        etrier: Union[int, str],
+        nombre: Union[int, float],
+        prix_ml: float,
+        prix: float,
+        total: float,
+    ) -> None:
+        self.type = type
+        self.longueur = longueur
+        self.etrier = etrier
+        self.nombre = nombre
+        self.prix_ml = prix_ml
+        self.prix = prix
+        self.total = total
+
+
+# ================== CONTENEURS EN COLONNES =============================
+
+
+class _TypeColumn:
+    """Libellés de type stockés une fois ; une ligne = un code entier."""
+
+    __slots__ = ("labels", "_index", "codes")
+
+    def __init__(self) -> None:
+        self.labels: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.codes = array("I")
+
+    def append(self, label: str) -> None:
+        code = self._index.get(label)
+        if code is None:
+            code = len(self.labels)
+            label = sys.intern(label)
+            self._index[label] = code
+            self.labels.append(label)
+        self.codes.append(code)
+
+    def __getitem__(self, i: int) -> str:
+        return self.labels[self.codes[i]]
+
+    def __iter__(self) -> Iterator[str]:
+        labels = self.labels
+        return (labels[c] for c in self.codes)
+
+    def tolist(self) -> List[str]:
+        labels = self.labels
+        return [labels[c] for c in self.codes]
+
+    def copy(self) -> "_TypeColumn":
+        col = _TypeColumn()
+        col.labels = list(self.labels)
+        col._index = dict(self._index)
+        col.codes = self.codes[:]
+        return col
+
+
+class PoutrelleColumns:
+    """Lignes poutrelles en colonnes : type, longueur, etrier, nombre."""
+
+    __slots__ = ("type", "longueur", "etrier", "nombre")
+
+    def __init__(self) -> None:
+        self.type = _TypeColumn()
+        self.longueur = array("d")
+        self.etrier = array("d")
+        self.nombre = array("d")
+
+    def append(self, p: Union[Poutrelle, Mapping[str, Any]]) -> None:
+        if not isinstance(p, Poutrelle):
+            p = Poutrelle.from_mapping(p)
+        self.add(p.type, p.longueur, p.etrier, p.nombre)
+
+    def add(self, type: str, longueur: float, etrier: float, nombre: float) -> None:
+        self.type.append(type)
+        self.longueur.append(longueur)
+        self.etrier.append(etrier)
+        self.nombre.append(nombre)
+
+    def __len__(self) -> int:
+        return len(self.longueur)
+
+    def __getitem__(self, i: int) -> Poutrelle:
+        return Poutrelle(self.type[i], self.longueur[i], self.etrier[i], self.nombre[i])
+
+    def __iter__(self) -> Iterator[Poutrelle]:
+        for row in zip(self.type, self.longueur, self.etrier, self.nombre):
+            yield Poutrelle(*row)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PoutrelleColumns):
+            return NotImplemented
+        return self.to_json() == other.to_json()
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [p.to_dict() for p in self]
+
+    def copy(self) -> "PoutrelleColumns":
+        """Copie indépendante (les array sont copiés, pas partagés)."""
+        cols = PoutrelleColumns()
+        cols.type = self.type.copy()
+        cols.longueur = self.longueur[:]
+        cols.etrier = self.etrier[:]
+        cols.nombre = self.nombre[:]
+        return cols
+
+    def to_json(self) -> Dict[str, list]:
+        return {
+            "type": self.type.tolist(),
+            "longueur": self.longueur.tolist(),
+            "etrier": self.etrier.tolist(),
+            "nombre": self.nombre.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, list]) -> "PoutrelleColumns":
+        cols = cls()
+        for row in zip(data["type"], data["longueur"], data["etrier"], data["nombre"]):
+            cols.add(*row)
+        return cols
+
+
+class HourdisColumns:
+    """Lignes hourdis en colonnes : type, nombre."""
+
+    __slots__ = ("type", "nombre")
+
+    def __init__(self) -> None:
+        self.type = _TypeColumn()
+        self.nombre = array("d")
+
+    def append(self, h: Union[Hourdis, Mapping[str, Any]]) -> None:
+        if not isinstance(h, Hourdis):
+            h = Hourdis.from_mapping(h)
+        self.add(h.type, h.nombre)
+
+    def add(self, type: str, nombre: float) -> None:
+        self.type.append(type)
+        self.nombre.append(nombre)
+
+    def __len__(self) -> int:
+        return len(self.nombre)
+
+    def __getitem__(self, i: int) -> Hourdis:
+        return Hourdis(self.type[i], self.nombre[i])
+
+    def __iter__(self) -> Iterator[Hourdis]:
+        for row in zip(self.type, self.nombre):
+            yield Hourdis(*row)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, HourdisColumns):
+            return NotImplemented
+        return self.to_json() == other.to_json()
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [h.to_dict() for h in self]
+
+    def copy(self) -> "HourdisColumns":
+        """Copie indépendante (les array sont copiés, pas partagés)."""
+        cols = HourdisColumns()
+        cols.type = self.type.copy()
+        cols.nombre = self.nombre[:]
+        return cols
+
+    def to_json(self) -> Dict[str, list]:
+        return {"type": self.type.tolist(), "nombre": self.nombre.tolist()}
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, list]) -> "HourdisColumns":
+        cols = cls()
+        for row in zip(data["type"], data["nombre"]):
+            cols.add(*row)
+        return cols
+
+
+# ================== ADAPTATEURS ========================================
+
+PoutrellesInput = Union[PoutrelleColumns, Mapping[str, list], Iterable[Any], None]
+HourdisInput = Union[HourdisColumns, Mapping[str, list], Iterable[Any], None]
+
+
+def poutrelles_columns(data: PoutrellesInput) -> PoutrelleColumns:
+    """
+    Accepte des colonnes, leur forme JSON ({"type": [...], ...}) ou une liste
+    de dicts / Poutrelle (format historique).
+    """
+    if isinstance(data, PoutrelleColumns):
+        return data
+    if isinstance(data, Mapping):
+        return PoutrelleColumns.from_json(data)
+    cols = PoutrelleColumns()
+    for p in data or ():
+        cols.append(p)
+    return cols
+
+
+def hourdis_columns(data: HourdisInput) -> HourdisColumns:
+    if isinstance(data, HourdisColumns):
+        return data
+    if isinstance(data, Mapping):
+        return HourdisColumns.from_json(data)
+    cols = HourdisColumns()
+    for h in data or ():
+        cols.append(h)
+    return cols
+
+
+def json_default(obj: Any) -> Any:
+    """Pour json.dumps(..., default=json_default) : colonnes → forme JSON compacte."""
+    if isinstance(obj, (PoutrelleColumns, HourdisColumns)):
+        return obj.to_json()
+    if isinstance(obj, _SlotsRecord):
+        return obj.to_dict()
+    raise TypeError(f"{type(obj).__name__} non sérialisable en JSON")
+
+
+def restore_lines(result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Résultat de parsing relu depuis JSON : colonnes reconstruites sur place."""
+    if result is not None:
+        result["poutrelles"] = poutrelles_columns(result.get("poutrelles"))
+        result["hourdis"] = hourdis_columns(result.get("hourdis"))
+    return result
@@ -0,0 +1,271 @@
+# app/services/parse_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+import brotli
+
+from app.services.lignes import json_default, restore_lines
+from app.services.parser_progiciel import (
+    CHUNK_SIZE,
+    PARSER_VERSION,
+    parse_progiciel_csv,
+)
+
+# Cache des résultats de parse_progiciel_csv, clé = SHA-256 du fichier uploadé.
+#
+# - niveau mémoire : LRU borné (nombre d'entrées + nombre total de lignes) ;
+#   chaque appel reçoit sa propre copie des colonnes (jamais celles du cache) ;
+# - niveau disque (désactivé par défaut, PROGICIEL_CACHE_DIR=<dossier>) :
+#   l'original compressé en brotli (<sha>.csv.br) + le résultat JSON
+#   compressé (<sha>.json.br) avec la version du parser qui l'a produit.
+#   Si le parser a changé depuis, on re-parse l'original stocké au lieu
+#   de redemander le fichier au commercial. Le dossier est borné à
+#   PROGICIEL_CACHE_MAX_MB : au-delà, les entrées les moins récemment
+#   utilisées sont supprimées.
+
+DISK_CACHE_DIR: Optional[Path] = (
+    Path(os.environ["PROGICIEL_CACHE_DIR"]) if os.environ.get("PROGICIEL_CACHE_DIR") else None
+)
+DISK_MAX_BYTES = int(float(os.environ.get("PROGICIEL_CACHE_MAX_MB", "256")) * 1024 * 1024)
+MEMORY_MAX_ENTRIES = 128
+MEMORY_MAX_LINES = 500_000
+BROTLI_QUALITY = 5  # 11 = trop lent pour un upload interactif
+
+
+def _result_lines(result: dict) -> int:
+    return len(result.get("poutrelles", [])) + len(result.get("hourdis", [])) + 1
+
+
+def _copy_result(result: dict) -> dict:
+    """Copie rendue à l'appelant : colonnes et métrés modifiables sans toucher au cache."""
+    aggregate = result.get("aggregate") or {}
+    return {
+        **result,
+        "poutrelles": result["poutrelles"].copy(),
+        "hourdis": result["hourdis"].copy(),
+        "aggregate": {k: dict(v) for k, v in aggregate.items()},
+    }
+
+
+class ParseCache:
+    def __init__(
+        self,
+        disk_dir: Optional[Path] = DISK_CACHE_DIR,
+        max_entries: int = MEMORY_MAX_ENTRIES,
+        max_lines: int = MEMORY_MAX_LINES,
+        disk_max_bytes: int = DISK_MAX_BYTES,
+    ) -> None:
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.max_entries = max_entries
+        self.max_lines = max_lines
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self._mem_lines = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "reparsed_from_original": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Niveau mémoire (LRU)
+    def _mem_get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            result = self._mem.get(key)
+            if result is not None:
+                self._mem.move_to_end(key)
+            return result
+
+    def _mem_put(self, key: str, result: dict) -> None:
+        lines = _result_lines(result)
+        if lines > self.max_lines:
+            return  # un seul fichier plus gros que tout le cache : on ne le garde pas
+        with self._lock:
+            if key in self._mem:
+                self._mem_lines -= _result_lines(self._mem.pop(key))
+            self._mem[key] = result
+            self._mem_lines += lines
+            while len(self._mem) > self.max_entries or self._mem_lines > self.max_lines:
+                _, old = self._mem.popitem(last=False)
+                self._mem_lines -= _result_lines(old)
+                self._stats["evictions"] += 1
+
+    # ------------------------------------------------------------------
+    # Niveau disque
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        assert self.disk_dir is not None
+        return self.disk_dir / f"{key}.csv.br", self.disk_dir / f"{key}.json.br"
+
+    def _disk_get(self, key: str) -> Optional[dict]:
+        if self.disk_dir is None:
+            return None
+        original, parsed = self._paths(key)
+        try:
+            payload = json.loads(brotli.decompress(parsed.read_bytes()))
+            if payload.get("parser_version") == PARSER_VERSION:
+                self._count("disk_hits")
+                os.utime(parsed)  # date d'accès pour l'éviction
+                return restore_lines(payload["result"])
+        except (OSError, ValueError, KeyError, brotli.error):
+            pass
+
+        if original.exists():
+            # parser modifié depuis : on repart de l'original stocké
+            result = parse_progiciel_csv(_iter_brotli(original))
+            self._write_json(parsed, result)
+            self._count("reparsed_from_original")
+            return result
+        return None
+
+    def _write_json(self, path: Path, result: dict) -> None:
+        payload = json.dumps(
+            {"parser_version": PARSER_VERSION, "result": result}, default=json_default
+        )
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(brotli.compress(payload.encode("utf-8"), quality=BROTLI_QUALITY))
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    def _count(self, event: str) -> None:
+        with self._lock:
+            self._stats[event] += 1
+
+    def parse(self, fileobj: BinaryIO) -> dict:
+        """
+        parse_progiciel_csv avec cache. `fileobj` doit être un fichier binaire
+        repositionnable (UploadFile.file) ; sinon on parse sans cache.
+        """
+        if not _seekable(fileobj):
+            return parse_progiciel_csv(fileobj)
+
+        # 1) empreinte du contenu (lecture seule, par blocs)
+        start = fileobj.tell()
+        h = hashlib.sha256()
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+        key = h.hexdigest()
+
+        result = self._mem_get(key)
+        if result is not None:
+            self._count("memory_hits")
+            return _copy_result(result)
+
+        result = self._disk_get(key)
+        if result is None:
+            # 2) vrai parsing ; l'original est compressé au passage si disque actif
+            self._count("misses")
+            fileobj.seek(start)
+            if self.disk_dir is not None:
+                result = self._parse_and_store(key, fileobj, start)
+            else:
+                result = parse_progiciel_csv(fileobj)
+
+        self._mem_put(key, result)
+        return _copy_result(result)
+
+    def _parse_and_store(self, key: str, fileobj: BinaryIO, start: int) -> dict:
+        assert self.disk_dir is not None
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        original, parsed = self._paths(key)
+        tmp = original.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        try:
+            with tmp.open("wb") as out:
+
+                def tee() -> Iterator[bytes]:
+                    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                        out.write(compressor.process(chunk))
+                        yield chunk
+
+                result = parse_progiciel_csv(tee())
+                out.write(compressor.finish())
+            os.replace(tmp, original)
+            self._write_json(parsed, result)
+            self._evict_disk()
+        except OSError as e:
+            print("⚠️ Cache progiciel disque indisponible :", e)
+            if tmp.exists():
+                tmp.unlink()
+            fileobj.seek(start)
+            result = parse_progiciel_csv(fileobj)
+        return result
+
+    def _evict_disk(self) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de disk_max_bytes."""
+        assert self.disk_dir is not None
+        entries: Dict[str, list] = {}  # clé -> [dernier accès, taille totale]
+        for path in self.disk_dir.glob("*.br"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entry = entries.setdefault(path.name.split(".", 1)[0], [0.0, 0])
+            entry[0] = max(entry[0], st.st_mtime)
+            entry[1] += st.st_size
+        total = sum(size for _, size in entries.values())
+        for key, (_, size) in sorted(entries.items(), key=lambda kv: kv[1][0]):
+            if total <= self.disk_max_bytes:
+                break
+            for path in self._paths(key):
+                path.unlink(missing_ok=True)
+            total -= size
+            self._count("disk_evictions")
+
+    def reparse_stored(self) -> int:
+        """Re-parse tous les originaux stockés avec le parser actuel (après mise à jour)."""
+        if self.disk_dir is None or not self.disk_dir.exists():
+            return 0
+        n = 0
+        for original in sorted(self.disk_dir.glob("*.csv.br")):
+            key = original.name[: -len(".csv.br")]
+            result = parse_progiciel_csv(_iter_brotli(original))
+            self._write_json(self._paths(key)[1], result)
+            with self._lock:
+                if key in self._mem:
+                    self._mem_lines -= _result_lines(self._mem.pop(key))
+            n += 1
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._mem),
+                "lines": self._mem_lines,
+                "disk": self.disk_dir is not None,
+            }
+
+
+def _iter_brotli(path: Path) -> Iterator[bytes]:
+    decompressor = brotli.Decompressor()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            data = decompressor.process(chunk)
+            if data:
+                yield data
+
+
+def _seekable(fileobj: Any) -> bool:
+    try:
+        return bool(fileobj.seekable())
+    except (AttributeError, ValueError):
+        return False
+
+
+parse_cache = ParseCache()
+
+
+if __name__ == "__main__":
+    # python -m app.services.parse_cache → re-parse des originaux après évolution du parser
+    print(f"{parse_cache.reparse_stored()} fichier(s) progiciel re-parsé(s).")
@@ -1,10 +1,33 @@
 # app/services/parser_progiciel.py
 from __future__ import annotations
 
-from dataclasses import dataclass
 from pathlib import Path
+import codecs
 import csv
-from typing import Any
+import logging
+import re
+from collections import deque
+from typing import Any, AsyncIterable, BinaryIO, Iterable, Iterator, List, Tuple, Union
+
+from app.services.engine import QuoteAggregate
+from app.services.lignes import Hourdis, HourdisColumns, Poutrelle, PoutrelleColumns
+
+logger = logging.getLogger(__name__)
+
+# Un export progiciel peut faire plusieurs Mo : on lit par blocs, on décode
+# au fil de l'eau et on produit les enregistrements sans tout garder en mémoire.
+CHUNK_SIZE = 64 * 1024
+
+# À incrémenter à chaque changement des règles de lecture : les résultats mis
+# en cache (parse_cache) par une version précédente sont alors re-calculés.
+# 2 : + agrégats par type (QuoteAggregate) ; 3 : lignes en colonnes ;
+# 4 : enregistrements sur plusieurs lignes lus d'un bloc (sync et async)
+PARSER_VERSION = 4
+
+Source = Union[str, Path, BinaryIO, Iterable[bytes]]
+Record = Tuple[str, Any]  # ("poutrelle", Poutrelle) / ("hourdis", Hourdis) / ("surface_ct", 94.2) ...
+
+_SURFACE_RE = re.compile("SURFACE", re.IGNORECASE)
 
 
 def _to_float(x: Any) -> float:
@@ -27,79 +50,174 @@ def _to_str(x: Any) -> str:
     return str(x).strip() if x is not None else ""
 
 
-@dataclass
-class LigneDevis:
-    type: str
-    longueur: float | None
-    etrier: float | None
-    nombre: float
-    prix_ml: float
-    prix: float
-    total: float
+def _iter_chunks(fileobj: BinaryIO) -> Iterator[bytes]:
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
 
 
-def parse_progiciel_csv(file_path: str | Path) -> dict:
-    """
-    Parse le CSV brut du progiciel (structure réelle comme dans ton exemple).
+_LINE_RE = re.compile(r"[^\r\n]*(?:\r\n?|\n)")
 
-    On extrait :
-      - poutrelles : depuis le tableau REPERE;SOUS TYPE;LONGUEUR/PAS ETRIERS;...;NOMBRE;LONGUEUR;...
-      - hourdis   : depuis le tableau FAMILLE;DESIGNATION;...;NOMBRE;...
-      - surface_ct  : valeur après 'SURFACE'
-      - surface_ts  : valeur après 'SURFACE TS'
+
+def _split_lines(text: str) -> list[str]:
+    """
+    Lignes de `text` (terminé par une fin de ligne), fins de ligne gardées,
+    comme un fichier ouvert avec newline="" : coupure sur \n, \r\n et \r
+    seul uniquement (pas sur \x0b, \x0c, \x1c-\x1e, \x85, \u2028, \u2029
+    comme str.splitlines).
     """
-    p = Path(file_path)
-    if not p.exists():
-        raise FileNotFoundError(f"Fichier introuvable: {p}")
+    if text.count("\r") != text.count("\r\n"):
+        return _LINE_RE.findall(text)  # \r seul (ancien format Mac) : cas rare
+    lines = text.split("\n")
+    lines.pop()  # vide : text finit par \n
+    return [line + "\n" for line in lines]
 
-    with p.open("r", encoding="utf-8", errors="ignore", newline="") as f:
-        reader = csv.reader(f, delimiter=";")
-        rows = list(reader)
 
-    poutrelles: list[dict[str, Any]] = []
-    hourdis: list[dict[str, Any]] = []
-    surface_ct: float = 0.0
-    surface_ts: float = 0.0
+class _LineDecoder:
+    """Décodage UTF-8 incrémental (octets invalides ignorés) + découpage en lignes."""
 
-    in_poutrelles = False
-    in_hourdis = False
+    def __init__(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._pending = ""
 
-    for raw in rows:
-        # on nettoie les cellules
-        row = [_to_str(c) for c in raw]
-        if not any(row):
-            # ligne complètement vide : on sort des tableaux
-            in_poutrelles = False
-            in_hourdis = False
-            continue
+    def feed(self, chunk: bytes) -> list[str]:
+        text = self._pending + self._decoder.decode(chunk)
+        # on coupe sur la dernière fin de ligne ; un \r final attend le bloc
+        # suivant (début possible d'un \r\n à cheval sur deux blocs)
+        end = len(text) - 1 if text.endswith("\r") else len(text)
+        cut = max(text.rfind("\n", 0, end), text.rfind("\r", 0, end))
+        if cut < 0:
+            self._pending = text
+            return []
+        self._pending = text[cut + 1:]
+        return _split_lines(text[: cut + 1])
 
-        joined_upper = ";".join(row).upper()
+    def close(self) -> list[str]:
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        lines = _LINE_RE.findall(text)
+        rest = text[sum(map(len, lines)):]
+        return lines + [rest] if rest else lines
 
-        # === SURFACE (CT) ===
-        if "SURFACE TS" in joined_upper:
-            # SURFACE TS
-            try:
-                idx = next(
-                    i for i, c in enumerate(row) if "SURFACE TS" in c.upper()
-                )
-                # chercher la première cellule non vide après
-                for j in range(idx + 1, len(row)):
-                    if row[j]:
-                        surface_ts = _to_float(row[j])
-                        break
-            except StopIteration:
-                pass
 
-        elif "SURFACE" in joined_upper and "SURFACE TS" not in joined_upper:
-            # SURFACE (CT)
+def _iter_line_blocks(source: Source) -> Iterator[list[str]]:
+    """Lignes texte, par bloc lu, depuis un chemin, un fichier binaire ou un itérable d'octets."""
+    if isinstance(source, (str, Path)):
+        p = Path(source)
+        if not p.exists():
+            raise FileNotFoundError(f"Fichier introuvable: {p}")
+        with p.open("rb") as f:
+            yield from _iter_line_blocks(f)
+        return
+
+    chunks = _iter_chunks(source) if hasattr(source, "read") else source
+    decoder = _LineDecoder()
+    for chunk in chunks:
+        yield decoder.feed(chunk)
+    yield decoder.close()
+
+
+def _iter_lines(source: Source) -> Iterator[str]:
+    for block in _iter_line_blocks(source):
+        yield from block
+
+
+class _NeedMore(Exception):
+    """Enregistrement CSV (cellule entre guillemets) à cheval sur deux blocs."""
+
+
+class _RecordReader:
+    """
+    Un seul csv.reader pour tout le fichier, alimenté bloc par bloc (sync ou
+    async) : une cellule entre guillemets peut contenir des fins de ligne.
+    feed() rend (texte brut de l'enregistrement, cellules) ; un enregistrement
+    incomplet en fin de bloc est relu en entier au bloc suivant (csv.reader
+    repart de zéro à chaque enregistrement).
+    """
+
+    def __init__(self) -> None:
+        self._lines: deque[str] = deque()   # pas encore lues par csv.reader
+        self._record: List[str] = []        # lignes de l'enregistrement en cours
+        self._eof = False
+        self._reader = csv.reader(self, delimiter=";")
+
+    def __iter__(self) -> "_RecordReader":
+        return self
+
+    def __next__(self) -> str:
+        if not self._lines:
+            if self._record and not self._eof:
+                raise _NeedMore
+            raise StopIteration
+        line = self._lines.popleft()
+        self._record.append(line)
+        return line
+
+    def feed(self, lines: Iterable[str]) -> Iterator[Tuple[str, list[str]]]:
+        self._lines.extend(lines)
+        while self._lines:
             try:
-                idx = next(i for i, c in enumerate(row) if c.upper() == "SURFACE")
-                for j in range(idx + 1, len(row)):
-                    if row[j]:
-                        surface_ct = _to_float(row[j])
-                        break
+                raw = next(self._reader)
+            except _NeedMore:
+                self._lines.extendleft(reversed(self._record))
+                self._record = []
+                return
             except StopIteration:
-                pass
+                return
+            record, self._record = self._record, []
+            yield (record[0] if len(record) == 1 else "".join(record)), raw
+
+    def close(self) -> Iterator[Tuple[str, list[str]]]:
+        self._eof = True
+        return self.feed(())
+
+
+def _first_value_after(row: list[str], idx: int) -> float | None:
+    """Première cellule non vide après idx, convertie en float."""
+    for j in range(idx + 1, len(row)):
+        if row[j]:
+            return _to_float(row[j])
+    return None
+
+
+class _ProgicielParser:
+    """
+    Machine à états ligne à ligne (structure réelle du CSV progiciel) :
+      - poutrelles : tableau REPERE;SOUS TYPE;LONGUEUR/PAS ETRIERS;...;NOMBRE;LONGUEUR;...
+      - hourdis   : tableau FAMILLE;DESIGNATION;...;NOMBRE;...
+      - surface_ct  : valeur après 'SURFACE'
+      - surface_ts  : valeur après 'SURFACE TS'
+    """
+
+    def __init__(self) -> None:
+        self.in_poutrelles = False
+        self.in_hourdis = False
+
+    def feed(self, text: str, raw: list[str]) -> Iterator[Record]:
+        # on nettoie les cellules
+        row = [c.strip() for c in raw]
+        if not any(row):
+            # ligne complètement vide : on sort des tableaux
+            self.in_poutrelles = False
+            self.in_hourdis = False
+            return
+
+        # === SURFACE (CT) / SURFACE TS : test sur la ligne brute d'abord ===
+        if _SURFACE_RE.search(text):
+            cells_upper = [c.upper() for c in row]
+            idx_ts = next((i for i, c in enumerate(cells_upper) if "SURFACE TS" in c), None)
+            if idx_ts is not None:
+                value = _first_value_after(row, idx_ts)
+                if value is not None:
+                    yield ("surface_ts", value)
+            else:
+                idx_ct = next((i for i, c in enumerate(cells_upper) if c == "SURFACE"), None)
+                if idx_ct is not None:
+                    value = _first_value_after(row, idx_ct)
+                    if value is not None:
+                        yield ("surface_ct", value)
 
         # === Début tableau POUTRELLES ===
         if (
@@ -108,32 +226,21 @@ def parse_progiciel_csv(file_path: str | Path) -> dict:
             and row[1].upper().startswith("SOUS")
             and row[4].upper() == "NOMBRE"
         ):
-            in_poutrelles = True
-            in_hourdis = False
-            continue
+            self.in_poutrelles = True
+            self.in_hourdis = False
+            return
 
         # === Lignes de POUTRELLES ===
-        if in_poutrelles:
+        if self.in_poutrelles:
             # ex: D;157;12;0;9;6,9;...
-            repere = row[0]
-            t = row[1]
-            if not t:
-                continue
+            t = row[1] if len(row) > 1 else ""
             if t.isdigit():  # 113 / 114 / 115 / 135 / 157
-                type_p = t
-                etrier = _to_float(row[2])   # LONGUEUR/PAS ETRIERS
-                nb = _to_float(row[4])       # NOMBRE
-                longueur = _to_float(row[5]) # LONGUEUR
+                etrier = _to_float(row[2]) if len(row) > 2 else 0.0    # LONGUEUR/PAS ETRIERS
+                nb = _to_float(row[4]) if len(row) > 4 else 0.0        # NOMBRE
+                longueur = _to_float(row[5]) if len(row) > 5 else 0.0  # LONGUEUR
                 if longueur > 0 and nb > 0:
-                    poutrelles.append(
-                        {
-                            "type": type_p,
-                            "longueur": longueur,
-                            "etrier": etrier,
-                            "nombre": nb,
-                        }
-                    )
-            continue
+                    yield ("poutrelle", Poutrelle(t, longueur, etrier, nb))
+            return
 
         # === Début tableau HOURDIS ===
         if (
@@ -142,34 +249,122 @@ def parse_progiciel_csv(file_path: str | Path) -> dict:
             and row[1].upper() == "DESIGNATION"
             and row[6].upper() == "NOMBRE"
         ):
-            in_hourdis = True
-            in_poutrelles = False
-            continue
+            self.in_hourdis = True
+            self.in_poutrelles = False
+            return
 
         # === Lignes de HOURDIS ===
-        if in_hourdis:
+        if self.in_hourdis:
             # ex: BETON;H16;...;NOMBRE=113;...
             if not row[0]:
-                continue
-            type_h = row[1].upper()
-            qte = _to_float(row[6])  # NOMBRE
+                return
+            type_h = row[1].upper() if len(row) > 1 else ""
+            qte = _to_float(row[6]) if len(row) > 6 else 0.0  # NOMBRE
             if type_h.startswith("H") and qte > 0:
-                hourdis.append(
-                    {
-                        "type": type_h,
-                        "nombre": qte,
-                    }
-                )
-            continue
-
-    print(
-        f"DEBUG parse_progiciel_csv: trouvé {len(poutrelles)} poutrelles "
-        f"et {len(hourdis)} lignes hourdis, SURFACE CT={surface_ct}, SURFACE TS={surface_ts}"
-    )
-
-    return {
-        "poutrelles": poutrelles,
-        "hourdis": hourdis,
-        "surface_ct": surface_ct,
-        "surface_ts": surface_ts,
-    }
+                yield ("hourdis", Hourdis(type_h, qte))
+
+
+def iter_progiciel_records(source: Source) -> Iterator[Record]:
+    """
+    Générateur d'enregistrements ("poutrelle" | "hourdis" | "surface_ct" |
+    "surface_ts", valeur) depuis un chemin, un fichier binaire (UploadFile.file)
+    ou un itérable de blocs d'octets. Rien n'est copié sur disque.
+    """
+    parser = _ProgicielParser()
+    reader = _RecordReader()
+    for block in _iter_line_blocks(source):
+        for text, raw in reader.feed(block):
+            yield from parser.feed(text, raw)
+    for text, raw in reader.close():
+        yield from parser.feed(text, raw)
+
+
+class _ResultBuilder:
+    """
+    Accumule les enregistrements dans le dict de parse_progiciel_csv ; les
+    lignes sont rangées en colonnes (PoutrelleColumns / HourdisColumns).
+    """
+
+    def __init__(self) -> None:
+        self.poutrelles = PoutrelleColumns()
+        self.hourdis = HourdisColumns()
+        self.surface_ct: float = 0.0
+        self.surface_ts: float = 0.0
+        self.aggregate = QuoteAggregate()
+
+    def add(self, record: Record) -> None:
+        kind, value = record
+        if kind == "poutrelle":
+            self.poutrelles.add(value.type, value.longueur, value.etrier, value.nombre)
+            self.aggregate.add_poutrelle(value)
+        elif kind == "hourdis":
+            self.hourdis.add(value.type, value.nombre)
+            self.aggregate.add_hourdis(value)
+        elif kind == "surface_ct":
+            self.surface_ct = value
+        elif kind == "surface_ts":
+            self.surface_ts = value
+
+    def result(self) -> dict:
+        logger.debug(
+            "parse_progiciel_csv : %d poutrelles, %d lignes hourdis, surface CT=%s, surface TS=%s",
+            len(self.poutrelles), len(self.hourdis), self.surface_ct, self.surface_ts,
+        )
+        return {
+            "poutrelles": self.poutrelles,
+            "hourdis": self.hourdis,
+            "surface_ct": self.surface_ct,
+            "surface_ts": self.surface_ts,
+            # métrés par type : transport recalculé sans relire les lignes
+            "aggregate": self.aggregate.to_dict(),
+        }
+
+
+def parse_progiciel_csv(file_path: Source) -> dict:
+    """
+    Parse le CSV brut du progiciel (structure réelle comme dans ton exemple).
+
+    Accepte un chemin, un fichier binaire ouvert ou un itérable de blocs d'octets.
+    On extrait :
+      - poutrelles : depuis le tableau REPERE;SOUS TYPE;LONGUEUR/PAS ETRIERS;...;NOMBRE;LONGUEUR;...
+      - hourdis   : depuis le tableau FAMILLE;DESIGNATION;...;NOMBRE;...
+      - surface_ct  : valeur après 'SURFACE'
+      - surface_ts  : valeur après 'SURFACE TS'
+    """
+    builder = _ResultBuilder()
+    for record in iter_progiciel_records(file_path):
+        builder.add(record)
+    return builder.result()
+
+
+async def _aiter_line_blocks(stream: Any) -> AsyncIterable[list[str]]:
+    decoder = _LineDecoder()
+    if hasattr(stream, "read"):
+        # UploadFile & co : read() asynchrone par blocs
+        while True:
+            chunk = await stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield decoder.feed(chunk)
+    else:
+        async for chunk in stream:
+            yield decoder.feed(chunk)
+    yield decoder.close()
+
+
+async def aparse_progiciel_csv(stream: Any) -> dict:
+    """
+    Variante asynchrone : lit un flux d'octets asynchrone (UploadFile,
+    request.stream(), ...) bloc par bloc, sans fichier temporaire.
+    """
+    parser = _ProgicielParser()
+    reader = _RecordReader()
+    builder = _ResultBuilder()
+    async for block in _aiter_line_blocks(stream):
+        for text, raw in reader.feed(block):
+            for record in parser.feed(text, raw):
+                builder.add(record)
+    for text, raw in reader.close():
+        for record in parser.feed(text, raw):
+            builder.add(record)
+    return builder.result()
@@ -0,0 +1,85 @@
+# app/services/pdf_cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Cache PDF adressé par contenu :
+#   clé = SHA-256(HTML rendu + feuille de style + base_url)
+#   fichier = generated_pdfs/cas/ab/abcdef....pdf
+# Un devis re-soumis à l'identique réutilise le PDF déjà rendu : le fichier
+# Devis_SBBM_{ref}.pdf devient un lien (hardlink, sinon copie) vers l'entrée.
+
+_css_digests: Dict[str, Tuple[float, int, str]] = {}
+_lock = threading.Lock()
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "inflight_dedup": 0}
+
+
+def css_digest(css_path: Optional[str]) -> str:
+    """Hash de la feuille de style, recalculé seulement si le fichier change."""
+    if not css_path:
+        return ""
+    try:
+        st = os.stat(css_path)
+    except OSError:
+        return ""
+    cached = _css_digests.get(css_path)
+    if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+        return cached[2]
+    with open(css_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _css_digests[css_path] = (st.st_mtime, st.st_size, digest)
+    return digest
+
+
+def cache_key(html: str, css_path: Optional[str], base_url: str) -> str:
+    h = hashlib.sha256()
+    h.update(html.encode("utf-8"))
+    h.update(b"\0")
+    h.update(css_digest(css_path).encode("ascii"))
+    h.update(b"\0")
+    h.update(base_url.encode("utf-8"))
+    return h.hexdigest()
+
+
+def cas_path(pdf_dir: Path, key: str) -> Path:
+    return pdf_dir / "cas" / key[:2] / f"{key}.pdf"
+
+
+def link_into(src: str | Path, dst: str | Path) -> None:
+    """Fait pointer dst sur src (remplacement atomique, hardlink sinon copie)."""
+    src, dst = str(src), str(dst)
+    try:
+        if os.path.samefile(src, dst):
+            return  # déjà relié (rename entre deux liens du même fichier = no-op)
+    except OSError:
+        pass
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.lnk"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+
+
+def record(event: str) -> None:
+    with _lock:
+        _stats[event] += 1
+
+
+def cache_stats() -> Dict[str, float]:
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+        total = hits + misses
+        return {
+            **_stats,
+            "hit_ratio": round(hits / total, 3) if total else 0.0,
+        }
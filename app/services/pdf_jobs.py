@@ -0,0 +1,247 @@
+# app/services/pdf_jobs.py
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.services import pdf_cache
+from app.services.pdf_renderer import get_renderer, warm_up_worker
+
+# Rendu PDF WeasyPrint hors de la boucle asyncio :
+#   /pdf/{ref} rend l'HTML du devis depuis la base et dépose un job ici à la
+#   première demande (ou /generate dès l'enregistrement si PDF_EAGER_RENDER=1) ;
+#   le PDF est produit dans un pool de processus borné ;
+#   /pdf/{ref} attend le job en cours au lieu de répondre 404 ; des demandes
+#   simultanées du même PDF se rattachent au même job (même clé de contenu).
+# Les PDF sont stockés par contenu (voir pdf_cache) : un HTML déjà rendu
+# n'est pas re-rendu, le fichier du devis est simplement relié à l'entrée.
+# Chaque processus garde un moteur chaud (voir pdf_renderer).
+
+PDF_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_JOBS_KEPT = 500          # historique des jobs gardé en mémoire
+PDF_WAIT_TIMEOUT_S = 60.0    # attente max côté /pdf/{ref}
+# 1 : rendu dès /generate ; 0 (défaut) : rendu au premier téléchargement
+PDF_EAGER_RENDER = os.environ.get("PDF_EAGER_RENDER", "0") == "1"
+
+STATUS_QUEUED = "queued"
+STATUS_RENDERING = "rendering"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def _noop() -> int:
+    return os.getpid()
+
+
+def _render_pdf_worker(
+    html: str, base_url: str, css_path: Optional[str], cache_file: str, out_path: str
+) -> str:
+    """
+    Exécuté dans un processus du pool : HTML → entrée du cache (écriture
+    atomique), puis le fichier du devis est relié à cette entrée.
+    """
+    pdf_bytes = get_renderer(css_path, base_url).render(html)
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_path = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, cache_file)
+    pdf_cache.link_into(cache_file, out_path)
+    return out_path
+
+
+@dataclass
+class PdfJob:
+    job_id: str
+    ref_devis: str
+    path: Path
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    error: str = ""
+    cache_key: str = ""
+    cache_hit: bool = False
+    future: Optional[Future] = field(default=None, repr=False)
+    _status: str = STATUS_QUEUED
+
+    @property
+    def status(self) -> str:
+        if self._status == STATUS_QUEUED and self.future is not None and self.future.running():
+            return STATUS_RENDERING
+        return self._status
+
+    @property
+    def finished(self) -> bool:
+        return self._status in (STATUS_DONE, STATUS_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = None
+        if self.finished_at is not None:
+            duration = round(self.finished_at - self.created_at, 3)
+        return {
+            "job_id": self.job_id,
+            "ref_devis": self.ref_devis,
+            "status": self.status,
+            "error": self.error,
+            "duration_s": duration,
+            "cache_hit": self.cache_hit,
+            "pdf_url": f"/pdf/{self.ref_devis}",
+        }
+
+
+class PdfJobManager:
+    """Pool de processus + registre des jobs (par id et par réf devis)."""
+
+    def __init__(self, max_workers: int = PDF_WORKERS) -> None:
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, PdfJob]" = OrderedDict()
+        self._by_ref: Dict[str, str] = {}
+        self._inflight: Dict[str, PdfJob] = {}  # clé de cache → job en cours
+        self._lock = threading.Lock()
+        self._warmup_args: Optional[tuple] = None
+
+    def configure(self, css_path: Optional[str], base_url: str) -> None:
+        """Feuille de style / base_url avec lesquelles les workers se préchauffent."""
+        self._warmup_args = (css_path, base_url)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn : pas de fork d'un serveur déjà multi-threadé
+            kwargs: Dict[str, Any] = {}
+            if self._warmup_args is not None:
+                kwargs = {"initializer": warm_up_worker, "initargs": self._warmup_args}
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                **kwargs,
+            )
+        return self._executor
+
+    def start(self) -> None:
+        """Démarre les workers tout de suite (warm-up au lancement du serveur)."""
+        with self._lock:
+            executor = self._get_executor()
+            for _ in range(self.max_workers):
+                executor.submit(_noop)
+
+    def _remember(self, job: PdfJob) -> None:
+        self._jobs[job.job_id] = job
+        self._by_ref[job.ref_devis] = job.job_id
+        # on oublie les plus vieux jobs terminés
+        while len(self._jobs) > MAX_JOBS_KEPT:
+            old_id, old = next(iter(self._jobs.items()))
+            if not old.finished:
+                break
+            del self._jobs[old_id]
+            if self._by_ref.get(old.ref_devis) == old_id:
+                del self._by_ref[old.ref_devis]
+
+    def submit(
+        self,
+        ref_devis: str,
+        html: str,
+        out_path: Path,
+        base_url: str,
+        css_path: Optional[str] = None,
+    ) -> PdfJob:
+        key = pdf_cache.cache_key(html, css_path, base_url)
+        cache_file = pdf_cache.cas_path(out_path.parent, key)
+        job = PdfJob(
+            job_id=uuid.uuid4().hex, ref_devis=ref_devis, path=out_path, cache_key=key
+        )
+
+        with self._lock:
+            running = self._inflight.get(key)
+            if running is not None and running.path == out_path and not running.finished:
+                # même contenu déjà en cours de rendu : on s'y rattache
+                pdf_cache.record("inflight_dedup")
+                return running
+
+            if cache_file.exists():
+                try:
+                    pdf_cache.link_into(cache_file, out_path)
+                    pdf_cache.record("hits")
+                    job.cache_hit = True
+                    job._status = STATUS_DONE
+                    job.finished_at = time.time()
+                    self._remember(job)
+                    return job
+                except OSError as e:
+                    print("⚠️ Cache PDF inutilisable, nouveau rendu :", e)
+
+            pdf_cache.record("misses")
+            args = (_render_pdf_worker, html, base_url, css_path, str(cache_file), str(out_path))
+            try:
+                future = self._get_executor().submit(*args)
+            except (BrokenProcessPool, RuntimeError):
+                # worker mort (OOM, crash natif) : on repart sur un pool neuf
+                self._executor = None
+                future = self._get_executor().submit(*args)
+            job.future = future
+            self._inflight[key] = job
+            self._remember(job)
+        future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+        return job
+
+    def _on_done(self, job: PdfJob, future: Future) -> None:
+        job.finished_at = time.time()
+        with self._lock:
+            if self._inflight.get(job.cache_key) is job:
+                del self._inflight[job.cache_key]
+        exc = future.exception()
+        if exc is None:
+            job._status = STATUS_DONE
+            print(f"PDF sauvegardé : {job.path}")
+        else:
+            job._status = STATUS_FAILED
+            job.error = str(exc) or exc.__class__.__name__
+            print("⚠️ Erreur génération PDF :", job.error)
+            if isinstance(exc, BrokenProcessPool):
+                with self._lock:
+                    self._executor = None
+
+    def get(self, job_id: str) -> Optional[PdfJob]:
+        return self._jobs.get(job_id)
+
+    def latest_for_ref(self, ref_devis: str) -> Optional[PdfJob]:
+        job_id = self._by_ref.get(ref_devis)
+        return self._jobs.get(job_id) if job_id else None
+
+    async def wait(self, job: PdfJob, timeout: float = PDF_WAIT_TIMEOUT_S) -> PdfJob:
+        """Attend la fin du job sans bloquer la boucle asyncio."""
+        if job.finished or job.future is None:
+            return job
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(job.future)), timeout
+            )
+        except asyncio.TimeoutError:
+            pass
+        except Exception:
+            pass  # l'erreur est déjà portée par job.error
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        counts = {STATUS_QUEUED: 0, STATUS_RENDERING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        for job in list(self._jobs.values()):
+            counts[job.status] += 1
+        return {"workers": self.max_workers, **counts}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pdf_jobs = PdfJobManager()
@@ -0,0 +1,146 @@
+# app/services/pdf_renderer.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# Moteur WeasyPrint "chaud", un par processus de rendu :
+#   - style.css parsé une seule fois (re-parsé automatiquement s'il change) ;
+#   - FontConfiguration gardée d'un rendu à l'autre (fontconfig déjà initialisé) ;
+#   - cache d'images partagé entre les rendus : le logo n'est décodé qu'une fois ;
+#   - les URL /static/... du template pointent sur les fichiers locaux (plus de
+#     logo en base64 dans l'HTML à re-parser à chaque PDF).
+
+_WARMUP_HTML = """<!doctype html>
+<html lang="fr"><head><meta charset="utf-8"/>
+<link rel="stylesheet" href="/static/style.css"></head>
+<body class="app-body"><div class="page devis-page">
+<header class="header-pro"><div class="logo-box"><img src="/static/logo_sbbm.jpg"></div></header>
+<section class="devis-banner"><div class="devis-title-main">DEVIS N° D00000</div></section>
+<table class="devis-table"><tr><td class="num">0,00</td></tr></table>
+</div></body></html>"""
+
+_weasyprint_ok: Optional[bool] = None
+_weasyprint_lock = threading.Lock()
+
+
+def weasyprint_available() -> bool:
+    """
+    WeasyPrint importable (avec ses libs natives) ? L'import, lent, n'est
+    tenté qu'une fois par processus, à la première question.
+    """
+    global _weasyprint_ok
+    if _weasyprint_ok is None:
+        with _weasyprint_lock:
+            if _weasyprint_ok is None:
+                try:
+                    import weasyprint  # noqa: F401
+
+                    _weasyprint_ok = True
+                    print("WeasyPrint détecté : génération PDF activée.")
+                except Exception as e:  # ImportError + libs natives manquantes
+                    _weasyprint_ok = False
+                    print("⚠️ WeasyPrint indisponible, PDF désactivé :", e)
+    return _weasyprint_ok
+
+
+class PdfRenderer:
+    def __init__(self, css_path: Optional[str], base_url: str) -> None:
+        from weasyprint import default_url_fetcher  # noqa: F401 (échoue tôt si absent)
+
+        self.css_path = css_path
+        self.base_url = base_url
+        self.static_dir = Path(css_path).parent if css_path else Path(base_url) / "static"
+        self._static_prefix = "file:///static/"
+        self._css = None
+        self._css_stamp: Tuple[float, int] = (0.0, -1)
+        self._font_config = None
+        self._image_cache: Dict[str, Any] = {}
+        self.renders = 0
+        self.css_reloads = 0
+
+    # ------------------------------------------------------------------
+    def _url_fetcher(self, url: str, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        from weasyprint import default_url_fetcher
+        from weasyprint.urls import path2url
+
+        if url.startswith(self._static_prefix):
+            name = url[len(self._static_prefix):]
+            if self.css_path and name == os.path.basename(self.css_path):
+                # déjà appliquée via la feuille pré-parsée : rien à recharger
+                return {"string": b"", "mime_type": "text/css"}
+            url = path2url(str(self.static_dir / name))
+        return default_url_fetcher(url, *args, **kwargs)
+
+    def _stylesheets(self) -> list:
+        """Feuille pré-parsée, invalidée dès que style.css change sur disque."""
+        if not self.css_path:
+            return []
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        st = os.stat(self.css_path)
+        stamp = (st.st_mtime, st.st_size)
+        if self._css is None or stamp != self._css_stamp:
+            if self._css is not None:
+                self.css_reloads += 1
+                print("style.css modifié → feuille de style PDF rechargée.")
+            # nouvelle config de polices : les @font-face de l'ancienne feuille disparaissent
+            self._font_config = FontConfiguration()
+            self._css = CSS(
+                filename=self.css_path,
+                font_config=self._font_config,
+                url_fetcher=self._url_fetcher,
+            )
+            self._css_stamp = stamp
+        return [self._css]
+
+    def render(self, html: str) -> bytes:
+        from weasyprint import HTML
+
+        stylesheets = self._stylesheets()
+        if self._font_config is None:
+            from weasyprint.text.fonts import FontConfiguration
+
+            self._font_config = FontConfiguration()
+        pdf_bytes = HTML(
+            string=html, base_url=self.base_url, url_fetcher=self._url_fetcher
+        ).write_pdf(
+            stylesheets=stylesheets,
+            font_config=self._font_config,
+            cache=self._image_cache,
+        )
+        self.renders += 1
+        return pdf_bytes
+
+    def warm_up(self) -> float:
+        """Rendu à blanc : parse CSS, init polices, décode le logo. Retourne la durée (s)."""
+        t0 = time.perf_counter()
+        self.render(_WARMUP_HTML)
+        return time.perf_counter() - t0
+
+
+# ================== UN MOTEUR PAR PROCESSUS =============================
+
+_renderers: Dict[Tuple[Optional[str], str], PdfRenderer] = {}
+
+
+def get_renderer(css_path: Optional[str], base_url: str) -> PdfRenderer:
+    key = (css_path, base_url)
+    renderer = _renderers.get(key)
+    if renderer is None:
+        renderer = PdfRenderer(css_path, base_url)
+        _renderers[key] = renderer
+    return renderer
+
+
+def warm_up_worker(css_path: Optional[str], base_url: str) -> None:
+    """Initializer du pool de rendu : chaque processus démarre déjà chaud."""
+    try:
+        duration = get_renderer(css_path, base_url).warm_up()
+        print(f"Moteur PDF prêt (pid {os.getpid()}, warm-up {duration * 1000:.0f} ms).")
+    except Exception as e:
+        print("⚠️ Warm-up PDF impossible :", e)
@@ -2,27 +2,24 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional
 
+from app.services.engine import (
+    ETRIER_STD_PRICE,
+    PRICE_STD_HOURDIS_U,
+    PRICE_STD_POUTRELLE_ML,
+    PriceGrid,
+    standard_grid,
+)
+
 TVA_RATE = 0.20
 
-# Prix standards AVANT remise (comme Excel)
-POUTRELLE_PRIX_ML = {
-    113: 28.89,
-    114: 33.33,
-    115: 38.89,
-    135: 51.11,
-    157: 64.44,
-}
+# Prix standards AVANT remise (comme Excel) : grille de engine.py, clés entières
+# comme avant. Les fonctions de prix prennent la grille en paramètre (par défaut
+# la grille standard ; l'appelant passe celle du catalogue : get_catalogue().grid).
+POUTRELLE_PRIX_ML = {int(k): v for k, v in PRICE_STD_POUTRELLE_ML.items()}
 
-HOURDIS_PRIX_U = {
-    "H8": 4.00,
-    "H12": 4.11,
-    "H16": 5.47,
-    "H20": 6.40,
-    "H25": 7.73,
-    "H30": 9.07,
-}
+HOURDIS_PRIX_U = dict(PRICE_STD_HOURDIS_U)
 
-ETRIER_PRIX_U = 0.89  # HT / unité AVANT remise poutrelles
+ETRIER_PRIX_U = ETRIER_STD_PRICE  # HT / unité AVANT remise poutrelles
 
 
 @dataclass
@@ -34,17 +31,17 @@ class Params:
     prix_treillis_u: float  # F8 (HT / unité)
     prix_controle_m2: float # F9 (HT / m²)
 
-def price_poutrelle_ml(type_p: int, params: Params) -> float:
-    base = POUTRELLE_PRIX_ML.get(type_p, 0.0)
+def price_poutrelle_ml(type_p: int, params: Params, grid: Optional[PriceGrid] = None) -> float:
+    base = (grid or standard_grid()).poutrelle_ml.get(str(type_p), 0.0)
     if base <= 0:
         return 0.0
     return base * (1 - params.remise_poutrelle) + params.transport_poutrelle_ml
 
-def price_hourdis_u(code: str, params: Params) -> float:
-    base = HOURDIS_PRIX_U.get(code.upper(), 0.0)
+def price_hourdis_u(code: str, params: Params, grid: Optional[PriceGrid] = None) -> float:
+    base = (grid or standard_grid()).hourdis_u.get(code.upper(), 0.0)
     if base <= 0:
         return 0.0
     return base * (1 - params.remise_hourdis) + params.transport_hourdis_u
 
-def price_etrier_u(params: Params) -> float:
-    return ETRIER_PRIX_U * (1 - params.remise_poutrelle)
+def price_etrier_u(params: Params, grid: Optional[PriceGrid] = None) -> float:
+    return (grid or standard_grid()).etrier * (1 - params.remise_poutrelle)
@@ -0,0 +1,241 @@
+# app/services/repricing.py
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from app.services.compute_pool import compute_pool
+from app.services.db import DB_PATH
+from app.services.engine import PriceGrid, standard_grid
+from app.services.engine_batch import compute_devis_batch
+from app.services.lignes import json_default
+
+# Re-tarification de l'historique avec une grille de prix candidate.
+#
+# Les entrées du moteur (poutrelles, hourdis, surfaces, remises, transport)
+# sont gardées pour chaque devis dans devis_inputs, écrites dans la même
+# transaction que l'en-tête. On les rejoue par paquets dans le moteur
+# vectorisé (engine_batch), en parallèle dans le pool de processus partagé
+# (compute_pool), sans passer
+# par le HTML ni le PDF ; le rapport est produit au fil de l'eau (une ligne
+# JSON par devis, puis un résumé).
+
+CHUNK_SIZE = 2_000                   # devis par paquet envoyé à un worker
+REPRICING_WORKERS = compute_pool.max_workers
+MAX_PENDING_CHUNKS = 2 * REPRICING_WORKERS
+
+_DEVIS_INPUTS_DDL = """
+CREATE TABLE IF NOT EXISTS devis_inputs (
+    ref_devis TEXT PRIMARY KEY,
+    inputs TEXT NOT NULL,
+    FOREIGN KEY (ref_devis) REFERENCES devis(ref_devis) ON DELETE CASCADE
+)
+"""
+
+ChunkRow = Tuple[str, str, str, float, float, str]
+
+
+def ensure_devis_inputs(conn: sqlite3.Connection) -> None:
+    with conn:
+        conn.execute(_DEVIS_INPUTS_DDL)
+
+
+def save_devis_inputs(
+    conn: sqlite3.Connection, ref_devis: str, inputs: Mapping[str, Any]
+) -> None:
+    """Entrées de compute_devis du devis (à appeler dans la transaction de l'en-tête)."""
+    conn.execute(
+        "INSERT OR REPLACE INTO devis_inputs (ref_devis, inputs) VALUES (?, ?)",
+        (ref_devis, json.dumps(inputs, separators=(",", ":"), default=json_default)),
+    )
+
+
+# ================== GRILLE CANDIDATE ===================================
+
+
+def grid_from_dict(payload: Mapping[str, Any], base: Optional[PriceGrid] = None) -> PriceGrid:
+    """
+    Grille candidate = grille de base + prix modifiés. Exemple :
+      {"poutrelle_ml": {"113": 30.5}, "hourdis_u": {"H16": 5.9}, "etrier": 0.95}
+    Les types non mentionnés gardent leur prix actuel.
+    """
+    base = base or standard_grid()
+    unknown = set(payload) - {"poutrelle_ml", "hourdis_u", "etrier"}
+    if unknown:
+        raise ValueError(f"Clés de grille inconnues : {', '.join(sorted(unknown))}")
+    poutrelle_ml = {**base.poutrelle_ml, **{str(k): float(v) for k, v in (payload.get("poutrelle_ml") or {}).items()}}
+    hourdis_u = {**base.hourdis_u, **{str(k).upper(): float(v) for k, v in (payload.get("hourdis_u") or {}).items()}}
+    etrier = float(payload["etrier"]) if payload.get("etrier") is not None else base.etrier
+    return PriceGrid(
+        poutrelle_ml=poutrelle_ml,
+        hourdis_u=hourdis_u,
+        etrier=etrier,
+        poids_poutrelle_ml=dict(base.poids_poutrelle_ml),
+        poids_hourdis_u=dict(base.poids_hourdis_u),
+    )
+
+
+# ================== TRAVAIL D'UN WORKER ================================
+
+
+def reprice_chunk(rows: Sequence[ChunkRow], grid: PriceGrid) -> List[Dict[str, Any]]:
+    """Re-calcule un paquet de devis ; exécuté dans un processus du pool."""
+    quotes = [json.loads(r[5]) for r in rows]
+    totals = compute_devis_batch(quotes, grid=grid, with_lignes=False)
+    report = []
+    for (ref, date_devis, client, old_ht, old_ttc, _), new in zip(rows, totals):
+        old_ht = float(old_ht or 0.0)
+        old_ttc = float(old_ttc or 0.0)
+        report.append(
+            {
+                "ref_devis": ref,
+                "date_devis": date_devis,
+                "client": client,
+                "old_total_ht": old_ht,
+                "new_total_ht": new["total_ht"],
+                "delta_ht": round(new["total_ht"] - old_ht, 2),
+                "old_total_ttc": old_ttc,
+                "new_total_ttc": new["total_ttc"],
+                "delta_ttc": round(new["total_ttc"] - old_ttc, 2),
+            }
+        )
+    return report
+
+
+# ================== LECTURE + ORCHESTRATION ============================
+
+
+def _iter_chunks(conn: sqlite3.Connection, chunk_size: int) -> Iterator[List[ChunkRow]]:
+    cur = conn.execute(
+        """
+        SELECT d.ref_devis, d.date_devis, d.client, d.total_ht, d.total_ttc, i.inputs
+        FROM devis d
+        JOIN devis_inputs i ON i.ref_devis = d.ref_devis
+        ORDER BY d.id
+        """
+    )
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield [tuple(r) for r in rows]
+
+
+def _count_without_inputs(conn: sqlite3.Connection) -> int:
+    return conn.execute(
+        """
+        SELECT COUNT(*) FROM devis d
+        WHERE NOT EXISTS (SELECT 1 FROM devis_inputs i WHERE i.ref_devis = d.ref_devis)
+        """
+    ).fetchone()[0]
+
+
+def reprice_all(
+    conn: sqlite3.Connection,
+    grid: PriceGrid,
+    chunk_size: int = CHUNK_SIZE,
+    workers: int = REPRICING_WORKERS,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Rejoue tous les devis stockés avec `grid`. Produit une ligne par devis
+    (ancien / nouveau total HT et TTC) dans l'ordre de la base, puis un
+    dict {"summary": ...}. Les paquets sont calculés en parallèle ; on n'en
+    garde qu'un nombre borné en vol pour ne pas charger tout l'historique.
+    """
+    t0 = time.perf_counter()
+    summary = {
+        "devis": 0,
+        "changed": 0,
+        "without_inputs": _count_without_inputs(conn),
+        "old_total_ht": 0.0,
+        "new_total_ht": 0.0,
+    }
+
+    def account(report: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for line in report:
+            summary["devis"] += 1
+            summary["old_total_ht"] += line["old_total_ht"]
+            summary["new_total_ht"] += line["new_total_ht"]
+            if line["delta_ht"] or line["delta_ttc"]:
+                summary["changed"] += 1
+            yield line
+
+    chunks = _iter_chunks(conn, chunk_size)
+    first = next(chunks, None)
+    second = next(chunks, None) if first is not None else None
+
+    if second is None or workers <= 1:
+        # petit historique : pas la peine de démarrer des processus
+        for chunk in filter(None, (first, second)):
+            yield from account(reprice_chunk(chunk, grid))
+        for chunk in chunks:
+            yield from account(reprice_chunk(chunk, grid))
+    else:
+        pending: List[Future] = []
+        try:
+            for chunk in (first, second):
+                pending.append(compute_pool.submit(reprice_chunk, chunk, grid))
+            for chunk in chunks:
+                if len(pending) >= MAX_PENDING_CHUNKS:
+                    yield from account(pending.pop(0).result())
+                pending.append(compute_pool.submit(reprice_chunk, chunk, grid))
+            while pending:
+                yield from account(pending.pop(0).result())
+        finally:
+            # rapport abandonné (client parti) : on libère les workers partagés
+            for future in pending:
+                future.cancel()
+
+    summary["old_total_ht"] = round(summary["old_total_ht"], 2)
+    summary["new_total_ht"] = round(summary["new_total_ht"], 2)
+    summary["delta_ht"] = round(summary["new_total_ht"] - summary["old_total_ht"], 2)
+    summary["duration_s"] = round(time.perf_counter() - t0, 3)
+    yield {"summary": summary}
+
+
+def stream_report(grid: PriceGrid, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    reprice_all sur une connexion dédiée en lecture seule : le rapport peut
+    être consommé depuis n'importe quel thread (StreamingResponse) sans
+    immobiliser une connexion du pool pendant toute la durée du job.
+    """
+    # as_uri() encode ?, # et % d'un chemin que l'URI prendrait pour des séparateurs
+    conn = sqlite3.connect(
+        Path(DB_PATH).resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False
+    )
+    try:
+        yield from reprice_all(conn, grid, **kwargs)
+    finally:
+        conn.close()
+
+
+def iter_ndjson(lines: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    for line in lines:
+        yield (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+if __name__ == "__main__":
+    # python -m app.services.repricing grille.json > rapport.ndjson
+    from contextlib import redirect_stdout
+
+    from app.services.catalogue import catalogue, ensure_price_catalogue
+    from app.services.db import get_connection
+
+    if len(sys.argv) != 2:
+        print("usage : python -m app.services.repricing <grille_candidate.json>", file=sys.stderr)
+        sys.exit(2)
+    with get_connection() as conn:
+        ensure_devis_inputs(conn)
+        ensure_price_catalogue(conn)
+    # prix non cités dans le fichier = ceux du catalogue actif, comme /api/repricing
+    with redirect_stdout(sys.stderr):  # stdout = NDJSON seulement
+        base = catalogue.refresh(force=True).grid
+    with open(sys.argv[1], encoding="utf-8") as f:
+        candidate = grid_from_dict(json.load(f), base=base)
+    for chunk in iter_ndjson(stream_report(candidate)):
+        sys.stdout.buffer.write(chunk)
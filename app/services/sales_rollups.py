@@ -0,0 +1,222 @@
+# app/services/sales_rollups.py
+from __future__ import annotations
+
+import sqlite3
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Statistiques de vente pré-agrégées (tableau de bord direction) :
+#   - stats_ventes : une ligne par (mois, commercial, client) avec nombre de
+#     devis, total HT, total TTC, tonnage (poids_total / 1000) et transport
+#     retenu (transport_total_choisi) ;
+#   - tenue à jour dans la transaction d'écriture : insert_devis_row ajoute
+#     le nouveau devis après l'en-tête et le détail (record_devis) ;
+#     delete_devis retire la contribution avant la suppression ; pour
+#     réécrire un devis existant : retract_devis, mise à jour, record_devis ;
+#   - /api/stats ne lit que cette table : quelques lignes par mois et par
+#     commercial au lieu d'un GROUP BY sur tout l'historique.
+# Pas de triggers SQLite : la contribution d'un devis dépend aussi de
+# devis_details, que la cascade de suppression efface avant eux.
+# rebuild_rollups recalcule tout depuis devis + devis_details (rattrapage,
+# ou pour effacer les écarts d'arrondi accumulés) :
+#   python -m app.services.sales_rollups rebuild
+
+_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS stats_ventes (
+        mois TEXT NOT NULL,              -- aaaa-mm ('' si date illisible)
+        code_commercial TEXT NOT NULL,
+        code_client TEXT NOT NULL,
+        nb_devis INTEGER NOT NULL DEFAULT 0,
+        total_ht REAL NOT NULL DEFAULT 0,
+        total_ttc REAL NOT NULL DEFAULT 0,
+        tonnage REAL NOT NULL DEFAULT 0,
+        transport REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (mois, code_commercial, code_client)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_stats_commercial ON stats_ventes (code_commercial, mois)",
+    "CREATE INDEX IF NOT EXISTS idx_stats_client ON stats_ventes (code_client, mois)",
+)
+
+_MEASURES = ("nb_devis", "total_ht", "total_ttc", "tonnage", "transport")
+
+# contribution d'un devis (ou de tous) : même requête pour l'incrémental et
+# pour la reconstruction, donc mêmes résultats aux arrondis près
+_CONTRIBUTION = """
+    SELECT substr(coalesce(d.date_iso, ''), 1, 7) AS mois,
+           coalesce(d.code_commercial, '') AS code_commercial,
+           coalesce(d.code_client, '') AS code_client,
+           1 AS nb_devis,
+           coalesce(d.total_ht, 0) AS total_ht,
+           coalesce(d.total_ttc, 0) AS total_ttc,
+           coalesce(x.poids_total, 0) / 1000.0 AS tonnage,
+           coalesce(x.transport_total_choisi, 0) AS transport
+    FROM devis d
+    LEFT JOIN devis_details x ON x.ref_devis = d.ref_devis
+"""
+
+_APPLY = f"""
+    INSERT INTO stats_ventes (mois, code_commercial, code_client, {', '.join(_MEASURES)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (mois, code_commercial, code_client) DO UPDATE SET
+        {', '.join(f'{m} = {m} + excluded.{m}' for m in _MEASURES)}
+"""
+
+# dimensions de regroupement acceptées par fetch_stats
+GROUP_COLUMNS = {"mois": "mois", "commercial": "code_commercial", "client": "code_client"}
+
+
+def ensure_sales_rollups(conn: sqlite3.Connection) -> None:
+    """
+    Table des statistiques ; à sa création, elle est remplie depuis les devis
+    existants. (Après ensure_devis_detail / ensure_devis_history.)
+    """
+    with conn:
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_ventes'"
+        ).fetchone()
+        for ddl in _DDL:
+            conn.execute(ddl)
+    if not existed:
+        n = rebuild_rollups(conn)
+        if n:
+            print(f"Statistiques de vente : {n} devis agrégés.")
+
+
+# ================== MISE À JOUR INCRÉMENTALE ===========================
+
+
+def _apply(conn: sqlite3.Connection, ref_devis: str, sign: int) -> None:
+    row = conn.execute(f"{_CONTRIBUTION} WHERE d.ref_devis = ?", (ref_devis,)).fetchone()
+    if row is None:
+        return
+    mois, commercial, client, *measures = tuple(row)
+    conn.execute(_APPLY, (mois, commercial, client, *(sign * v for v in measures)))
+    if sign < 0:
+        conn.execute(
+            """
+            DELETE FROM stats_ventes
+            WHERE mois = ? AND code_commercial = ? AND code_client = ? AND nb_devis <= 0
+            """,
+            (mois, commercial, client),
+        )
+
+
+def retract_devis(conn: sqlite3.Connection, ref_devis: str) -> None:
+    """Retire la version enregistrée du devis (avant remplacement ou suppression)."""
+    _apply(conn, ref_devis, -1)
+
+
+def record_devis(conn: sqlite3.Connection, ref_devis: str) -> None:
+    """Ajoute le devis tel qu'il vient d'être écrit (en-tête + détail)."""
+    _apply(conn, ref_devis, 1)
+
+
+def delete_devis(conn: sqlite3.Connection, ref_devis: str) -> bool:
+    """
+    Supprime un devis (détail, lignes et entrées suivent par cascade) en
+    tenant les statistiques à jour. À appeler dans une transaction.
+    """
+    retract_devis(conn, ref_devis)
+    return conn.execute("DELETE FROM devis WHERE ref_devis = ?", (ref_devis,)).rowcount > 0
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> int:
+    """Recalcule toute la table depuis devis + devis_details ; retourne le nb de devis."""
+    with conn:
+        conn.execute("DELETE FROM stats_ventes")
+        conn.execute(
+            f"""
+            INSERT INTO stats_ventes (mois, code_commercial, code_client, {', '.join(_MEASURES)})
+            SELECT mois, code_commercial, code_client,
+                   {', '.join(f'sum({m})' for m in _MEASURES)}
+            FROM ({_CONTRIBUTION})
+            GROUP BY mois, code_commercial, code_client
+            """
+        )
+        (n,) = conn.execute("SELECT coalesce(sum(nb_devis), 0) FROM stats_ventes").fetchone()
+    return int(n)
+
+
+# ================== LECTURE ============================================
+
+
+@dataclass
+class StatsFilters:
+    code_commercial: str = ""
+    code_client: str = ""
+    mois_min: str = ""   # aaaa-mm inclus
+    mois_max: str = ""
+
+    def where(self) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        args: List[Any] = []
+        if self.code_commercial:
+            clauses.append("code_commercial = ?")
+            args.append(self.code_commercial.strip().upper())
+        if self.code_client:
+            clauses.append("code_client = ?")
+            args.append(self.code_client.strip())
+        if self.mois_min:
+            clauses.append("mois >= ?")
+            args.append(self.mois_min[:7])
+        if self.mois_max:
+            clauses.append("mois <= ?")
+            args.append(self.mois_max[:7])
+        return clauses, args
+
+
+def fetch_stats(
+    conn: sqlite3.Connection,
+    group_by: Sequence[str] = ("commercial", "mois"),
+    filters: Optional[StatsFilters] = None,
+) -> Dict[str, Any]:
+    """
+    Totaux regroupés par `group_by` (parmi "mois", "commercial", "client"),
+    plus le total général. ValueError si une dimension est inconnue.
+    """
+    unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Regroupement inconnu : {', '.join(unknown)}")
+    columns = list(dict.fromkeys(GROUP_COLUMNS[g] for g in group_by))
+    clauses, args = (filters or StatsFilters()).where()
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sums = ", ".join(f"sum({m}) AS {m}" for m in _MEASURES)
+    select = ", ".join(columns + [sums]) if columns else sums
+    group = f"GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}" if columns else ""
+
+    rows = [
+        _rounded(dict(zip([*columns, *_MEASURES], tuple(r))))
+        for r in conn.execute(f"SELECT {select} FROM stats_ventes {where} {group}", args)
+    ]
+    total = {m: 0 for m in _MEASURES}
+    for r in rows:
+        for m in _MEASURES:
+            total[m] += r[m] or 0
+    if not columns:
+        rows = []
+    return {"group_by": list(group_by), "rows": rows, "total": _rounded(total)}
+
+
+def _rounded(values: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(values)
+    out["nb_devis"] = int(out.get("nb_devis") or 0)
+    for m in ("total_ht", "total_ttc", "transport"):
+        out[m] = round(out.get(m) or 0.0, 2)
+    out["tonnage"] = round(out.get("tonnage") or 0.0, 3)
+    return out
+
+
+if __name__ == "__main__":
+    # python -m app.services.sales_rollups rebuild
+    from app.services.db import get_connection
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage : python -m app.services.sales_rollups rebuild", file=sys.stderr)
+        sys.exit(2)
+    with get_connection() as conn:
+        ensure_sales_rollups(conn)
+        n = rebuild_rollups(conn)
+    print(f"Statistiques de vente reconstruites : {n} devis.")
@@ -0,0 +1,203 @@
+# app/services/startup.py
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+try:  # verrou inter-processus (plusieurs workers uvicorn) ; absent sous Windows
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+# Démarrage du serveur (lifespan FastAPI), au lieu d'un travail fait à
+# l'import de app.main dans chaque worker :
+#   - schéma : toutes les étapes (fonctions ensure_*, idempotentes : IF NOT
+#     EXISTS, PRAGMA table_info) tournent à chaque démarrage, un seul worker
+#     à la fois (verrou fichier). Un index, une colonne ou un rattrapage
+#     ajouté plus tard à une étape existante atteint donc aussi les bases
+#     déjà en service, sans numéro de version à penser à incrémenter ; la
+#     première exécution de chaque étape est notée dans app_meta (journal) ;
+#   - import clients : sauté tant que l'empreinte du CSV (taille + date de
+#     modification, un simple stat) n'a pas changé ;
+#   - WeasyPrint, pool PDF : en arrière-plan, /ready passe à 200 une fois fini ;
+#   - durée de chaque étape dans les logs.
+
+# Reporté dans PRAGMA user_version (indicatif, pour les outils externes).
+SCHEMA_VERSION = 2
+MIGRATION_META_PREFIX = "migration:"
+
+_META_DDL = """
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    ) WITHOUT ROWID
+"""
+
+
+# ================== SCHÉMA =============================================
+
+
+@contextmanager
+def _migration_lock(db_path: Path) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(f"{db_path}.migrate.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def ensure_app_meta(conn: sqlite3.Connection) -> None:
+    with conn:
+        conn.execute(_META_DDL)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def step_name(step: Callable[..., Any]) -> str:
+    # nom seul : stable si la fonction change de module
+    return step.__name__
+
+
+def _applied_steps(conn: sqlite3.Connection) -> set:
+    return {
+        key[len(MIGRATION_META_PREFIX):]
+        for (key,) in conn.execute(
+            "SELECT key FROM app_meta WHERE key >= ? AND key < ?",
+            (MIGRATION_META_PREFIX, MIGRATION_META_PREFIX + "\uffff"),
+        )
+    }
+
+
+def run_migrations(
+    conn: sqlite3.Connection,
+    db_path: Path,
+    steps: Sequence[Callable[[sqlite3.Connection], Any]],
+    version: int = SCHEMA_VERSION,
+) -> bool:
+    """
+    Exécute, dans l'ordre et sous le verrou de migration, toutes les `steps`
+    (fonctions ensure_*, idempotentes) ; note dans app_meta celles qui
+    passent pour la première fois sur cette base, puis fixe user_version.
+    True si au moins une étape était nouvelle.
+    """
+    ensure_app_meta(conn)
+    with _migration_lock(db_path):
+        applied = _applied_steps(conn)
+        new = [s for s in steps if step_name(s) not in applied]
+        for step in steps:
+            step(conn)
+            if step in new:
+                set_meta(
+                    conn,
+                    MIGRATION_META_PREFIX + step_name(step),
+                    time.strftime("%Y-%m-%dT%H:%M:%S"),
+                )
+        if schema_version(conn) < version:
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+    if not new:
+        return False
+    print(f"Schéma SQLite migré : {', '.join(step_name(s) for s in new)}.")
+    return True
+
+
+# ================== EMPREINTES (app_meta) ==============================
+
+
+def get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+    with conn:
+        conn.execute(
+            "INSERT INTO app_meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+
+def file_fingerprint(path: Path) -> str:
+    """Empreinte bon marché d'un fichier : taille + date de modification (ns)."""
+    st = path.stat()
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+# ================== SUIVI DU DÉMARRAGE =================================
+
+
+class StartupReport:
+    """Durée des étapes du démarrage + état « prêt » pour /ready."""
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.timings_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._ready = threading.Event()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str, required: bool = True) -> Iterator[None]:
+        """Chronomètre une étape ; en erreur, le démarrage échoue si `required`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = str(e) or e.__class__.__name__
+            print(f"⚠️ Démarrage, étape {name} en erreur :", e)
+            if required:
+                raise
+        finally:
+            self.timings_ms[name] = round((time.perf_counter() - t0) * 1000.0, 1)
+
+    def in_background(self, name: str, fn: Callable[[], Any]) -> None:
+        """Étape lancée dans un thread ; le serveur n'est prêt qu'à sa fin."""
+        with self._lock:
+            self._pending += 1
+
+        def run() -> None:
+            with self.step(name, required=False):
+                fn()
+            with self._lock:
+                self._pending -= 1
+                done = self._pending == 0
+            if done:
+                self.mark_ready()
+
+        threading.Thread(target=run, name=f"startup-{name}", daemon=True).start()
+
+    def mark_ready(self) -> None:
+        with self._lock:
+            if self._pending or self._ready.is_set():
+                return
+            self.timings_ms["total"] = round((time.perf_counter() - self.t0) * 1000.0, 1)
+            self._ready.set()
+        self.log()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def log(self) -> None:
+        steps = ", ".join(f"{k} {v:g} ms" for k, v in self.timings_ms.items())
+        print(f"Démarrage : {steps}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "pid": os.getpid(),
+            "timings_ms": dict(self.timings_ms),
+            "errors": dict(self.errors),
+        }
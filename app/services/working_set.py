@@ -0,0 +1,193 @@
+# app/services/working_set.py
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app.services.db import get_connection, transaction
+from app.services.engine import QuoteAggregate
+
+# Métrés du dernier devis (CSV progiciel ou saisie manuelle) de chaque
+# session, pour /simulate-transport. Seul l'agrégat par type est gardé (pas
+# les lignes) : la simulation se fait en temps constant. Remplace les
+# globales LAST_* qui mélangeaient les commerciaux et n'existaient que dans
+# un seul worker.
+#
+#   WORKING_SET_BACKEND=sqlite (défaut) : table quote_working_sets, partagée
+#                                         par tous les workers uvicorn ;
+#   WORKING_SET_BACKEND=memory          : dict LRU dans le processus
+#                                         (un seul worker, ou tests).
+# Dans les deux cas : expiration après WORKING_SET_TTL_S et nombre de
+# sessions gardées borné par WORKING_SET_MAX_ENTRIES.
+
+SESSION_COOKIE = "devis_session"
+WORKING_SET_BACKEND = os.environ.get("WORKING_SET_BACKEND", "sqlite").lower()
+WORKING_SET_TTL_S = float(os.environ.get("WORKING_SET_TTL_S", 8 * 3600))
+WORKING_SET_MAX_ENTRIES = int(os.environ.get("WORKING_SET_MAX_ENTRIES", 2000))
+PURGE_EVERY_PUTS = 100  # SQLite : nettoyage des sessions expirées
+
+_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS quote_working_sets (
+        session_id TEXT PRIMARY KEY,
+        payload TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_quote_working_sets_updated ON quote_working_sets (updated_at)",
+)
+
+
+def ensure_working_sets(conn: sqlite3.Connection) -> None:
+    with conn:
+        for ddl in _DDL:
+            conn.execute(ddl)
+
+
+@dataclass
+class WorkingSet:
+    aggregate: QuoteAggregate = field(default_factory=QuoteAggregate)
+    surface_ct: float = 0.0
+    surface_ts: float = 0.0
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "aggregate": self.aggregate.to_dict(),
+                "surface_ct": self.surface_ct,
+                "surface_ts": self.surface_ts,
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, payload: str) -> "WorkingSet":
+        data = json.loads(payload)
+        aggregate = QuoteAggregate.from_dict(data.get("aggregate"))
+        return cls(aggregate, float(data.get("surface_ct") or 0.0), float(data.get("surface_ts") or 0.0))
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(24)
+
+
+class MemoryWorkingSetStore:
+    """LRU + TTL en mémoire (propre au processus)."""
+
+    backend = "memory"
+
+    def __init__(
+        self, ttl: float = WORKING_SET_TTL_S, max_entries: int = WORKING_SET_MAX_ENTRIES
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, WorkingSet]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def get(self, session_id: str) -> Optional[WorkingSet]:
+        with self._lock:
+            item = self._data.get(session_id)
+            if item is None:
+                return None
+            if time.time() - item[0] > self.ttl:
+                del self._data[session_id]
+                return None
+            self._data.move_to_end(session_id)
+            return item[1]
+
+    def put(self, session_id: str, ws: WorkingSet) -> None:
+        with self._lock:
+            self._data[session_id] = (time.time(), ws)
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": self.backend, "entries": len(self._data), "evictions": self._evictions}
+
+
+class SqliteWorkingSetStore:
+    """Table quote_working_sets (ensure_working_sets) : visible par tous les workers."""
+
+    backend = "sqlite"
+
+    def __init__(
+        self, ttl: float = WORKING_SET_TTL_S, max_entries: int = WORKING_SET_MAX_ENTRIES
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[WorkingSet]:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT payload FROM quote_working_sets WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        return WorkingSet.from_json(row[0])
+
+    def put(self, session_id: str, ws: WorkingSet) -> None:
+        payload = ws.to_json()
+        with self._lock:
+            self._puts += 1
+            purge = self._puts % PURGE_EVERY_PUTS == 0
+        with transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO quote_working_sets (session_id, payload, updated_at) "
+                "VALUES (?, ?, ?)",
+                (session_id, payload, time.time()),
+            )
+            if purge:
+                self._purge(conn)
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "DELETE FROM quote_working_sets WHERE updated_at < ?", (time.time() - self.ttl,)
+        )
+        # au-delà de max_entries : on oublie les sessions les moins récentes
+        conn.execute(
+            """
+            DELETE FROM quote_working_sets WHERE session_id IN (
+                SELECT session_id FROM quote_working_sets
+                ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def delete(self, session_id: str) -> None:
+        with transaction() as conn:
+            conn.execute("DELETE FROM quote_working_sets WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with get_connection() as conn:
+            n = conn.execute("SELECT COUNT(*) FROM quote_working_sets").fetchone()[0]
+        return {"backend": self.backend, "entries": n}
+
+
+def make_store(backend: str = WORKING_SET_BACKEND):
+    if backend == "memory":
+        return MemoryWorkingSetStore()
+    if backend != "sqlite":
+        print(f"⚠️ WORKING_SET_BACKEND={backend!r} inconnu, stockage SQLite utilisé.")
+    return SqliteWorkingSetStore()
+
+
+working_sets = make_store()
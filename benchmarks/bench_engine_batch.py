@@ -0,0 +1,116 @@
+# benchmarks/bench_engine_batch.py
+"""
+Compare engine.compute_devis (un devis à la fois) et
+engine_batch.compute_devis_batch (tout le lot en NumPy).
+
+    python -m benchmarks.bench_engine_batch [nb_devis] [nb_lignes_gros_devis]
+
+Deux cas : beaucoup de petits devis (3 à 25 lignes), puis un seul gros devis
+de plusieurs dizaines de milliers de lignes (cumuls par devis très longs).
+Vérifie aussi que les deux moteurs donnent exactement les mêmes résultats.
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+from app.services.engine import (
+    PRICE_STD_HOURDIS_U,
+    PRICE_STD_POUTRELLE_ML,
+    compute_devis,
+)
+from app.services.engine_batch import compute_devis_batch
+
+
+def random_quotes(n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    types_p = list(PRICE_STD_POUTRELLE_ML)
+    types_h = list(PRICE_STD_HOURDIS_U)
+    quotes = []
+    for _ in range(n):
+        quotes.append(
+            {
+                "poutrelles": [
+                    {
+                        "type": rnd.choice(types_p),
+                        "longueur": round(rnd.uniform(1.0, 7.5), 2),
+                        "nombre": rnd.randint(1, 40),
+                        "etrier": rnd.randint(0, 25),
+                    }
+                    for _ in range(rnd.randint(3, 25))
+                ],
+                "hourdis": [
+                    {"type": rnd.choice(types_h), "nombre": rnd.randint(50, 2500)}
+                    for _ in range(rnd.randint(1, 4))
+                ],
+                "surface_ct": round(rnd.uniform(0, 400), 2),
+                "surface_ts": round(rnd.uniform(0, 400), 2),
+                "remise_poutrelle": rnd.choice([0.0, 5.0, 10.0, 12.5]),
+                "remise_hourdis": rnd.choice([0.0, 5.0, 8.0]),
+                "prix_ct": rnd.choice([0.0, 12.0]),
+                "prix_treillis": rnd.choice([0.0, 180.0]),
+                "mode_transport": rnd.choice(["rendu", "depart"]),
+                "transport_mode": "auto",
+                "distance_km": round(rnd.uniform(5, 250), 1),
+                "transport_poutrelle_manuel": 0.0,
+                "transport_hourdis_manuel": 0.0,
+            }
+        )
+    return quotes
+
+
+def _best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def big_quote(nb_lignes: int, seed: int = 7) -> Dict[str, Any]:
+    """Un seul devis de `nb_lignes` poutrelles (+ un dixième de hourdis)."""
+    quote = random_quotes(1, seed)[0]
+    rnd = random.Random(seed)
+    pool = random_quotes(max(1, nb_lignes // 10), seed)
+    poutrelles = [p for q in pool for p in q["poutrelles"]]
+    hourdis = [h for q in pool for h in q["hourdis"]]
+    quote["poutrelles"] = [rnd.choice(poutrelles) for _ in range(nb_lignes)]
+    quote["hourdis"] = [rnd.choice(hourdis) for _ in range(max(1, nb_lignes // 10))]
+    return quote
+
+
+def compare(quotes: List[Dict[str, Any]]) -> None:
+    ref = [compute_devis(**q) for q in quotes]
+    assert compute_devis_batch(quotes) == ref, "résultats différents !"
+    totaux = [{k: v for k, v in r.items() if k != "lignes"} for r in ref]
+    assert compute_devis_batch(quotes, with_lignes=False) == totaux
+
+    t_loop = _best_of(lambda: [compute_devis(**q) for q in quotes])
+    t_batch = _best_of(lambda: compute_devis_batch(quotes))
+    t_totaux = _best_of(lambda: compute_devis_batch(quotes, with_lignes=False))
+
+    print(f"compute_devis (boucle)       : {t_loop:7.3f} s")
+    print(f"compute_devis_batch          : {t_batch:7.3f} s  (x{t_loop / t_batch:.1f})")
+    print(f"compute_devis_batch (totaux) : {t_totaux:7.3f} s  (x{t_loop / t_totaux:.1f})")
+
+
+def main(n: int = 20_000, nb_lignes: int = 90_000) -> None:
+    quotes = random_quotes(n)
+    nb = sum(len(q["poutrelles"]) + len(q["hourdis"]) for q in quotes)
+    print(f"{n} devis, {nb} lignes")
+    compare(quotes)
+
+    quote = big_quote(nb_lignes)
+    nb = len(quote["poutrelles"]) + len(quote["hourdis"])
+    print(f"\n1 devis, {nb} lignes")
+    compare([quote])
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 90_000,
+    )
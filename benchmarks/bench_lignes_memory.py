@@ -0,0 +1,135 @@
+# benchmarks/bench_lignes_memory.py
+"""
+Mémoire occupée par les lignes d'un gros export progiciel, selon leur
+représentation :
+  - liste de dicts (format historique) ;
+  - liste d'objets Poutrelle / Hourdis (__slots__) ;
+  - PoutrelleColumns / HourdisColumns (array + types codés).
+
+    python -m benchmarks.bench_lignes_memory [nb_lignes]
+
+Mesure faite avec tracemalloc ; vérifie aussi que compute_devis donne le
+même résultat pour les trois formes.
+"""
+from __future__ import annotations
+
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.services.engine import (
+    PRICE_STD_HOURDIS_U,
+    PRICE_STD_POUTRELLE_ML,
+    compute_devis,
+)
+from app.services.lignes import (
+    Hourdis,
+    HourdisColumns,
+    Poutrelle,
+    PoutrelleColumns,
+)
+
+
+def _random_rows(n: int, seed: int = 42) -> Tuple[List[tuple], List[tuple]]:
+    rnd = random.Random(seed)
+    types_p = list(PRICE_STD_POUTRELLE_ML)
+    types_h = list(PRICE_STD_HOURDIS_U)
+    n_h = max(1, n // 10)
+    poutrelles = [
+        (
+            rnd.choice(types_p),
+            round(rnd.uniform(1.0, 7.5), 2),
+            float(rnd.randint(0, 25)),
+            float(rnd.randint(1, 40)),
+        )
+        for _ in range(n - n_h)
+    ]
+    hourdis = [(rnd.choice(types_h), float(rnd.randint(50, 2500))) for _ in range(n_h)]
+    return poutrelles, hourdis
+
+
+def as_dicts(rows_p: List[tuple], rows_h: List[tuple]) -> Tuple[list, list]:
+    # comme l'ancien parser : une chaîne de type neuve par ligne (csv.reader)
+    return (
+        [
+            {"type": "".join(t), "longueur": L, "etrier": e, "nombre": n}
+            for t, L, e, n in rows_p
+        ],
+        [{"type": "".join(t), "nombre": n} for t, n in rows_h],
+    )
+
+
+def as_slots(rows_p: List[tuple], rows_h: List[tuple]) -> Tuple[list, list]:
+    return (
+        [Poutrelle("".join(t), L, e, n) for t, L, e, n in rows_p],
+        [Hourdis("".join(t), n) for t, n in rows_h],
+    )
+
+
+def as_columns(rows_p: List[tuple], rows_h: List[tuple]) -> Tuple[Any, Any]:
+    poutrelles = PoutrelleColumns()
+    for t, L, e, n in rows_p:
+        poutrelles.add("".join(t), L, e, n)
+    hourdis = HourdisColumns()
+    for t, n in rows_h:
+        hourdis.add("".join(t), n)
+    return poutrelles, hourdis
+
+
+PARAMS: Dict[str, Any] = {
+    "surface_ct": 120.0,
+    "surface_ts": 80.0,
+    "remise_poutrelle": 5.0,
+    "remise_hourdis": 0.0,
+    "prix_ct": 12.0,
+    "prix_treillis": 180.0,
+    "mode_transport": "rendu",
+    "transport_mode": "auto",
+    "distance_km": 80.0,
+    "transport_poutrelle_manuel": 0.0,
+    "transport_hourdis_manuel": 0.0,
+}
+
+
+def _measure(build: Callable[[], Any]) -> Tuple[Any, int, float]:
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - t0
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size, elapsed
+
+
+def main(n: int = 500_000) -> None:
+    rows_p, rows_h = _random_rows(n)
+    print(f"{len(rows_p)} poutrelles + {len(rows_h)} hourdis")
+
+    results: Dict[str, Any] = {}
+    ref_size = 0
+    for name, build in (
+        ("liste de dicts", as_dicts),
+        ("objets __slots__", as_slots),
+        ("colonnes", as_columns),
+    ):
+        lines, size, elapsed = _measure(lambda: build(rows_p, rows_h))
+        ref_size = ref_size or size
+        print(
+            f"{name:<18}: {size / 1e6:8.1f} Mo  ({size / n:6.1f} o/ligne, "
+            f"x{ref_size / size:.1f})  construit en {elapsed:.2f} s"
+        )
+        t0 = time.perf_counter()
+        results[name] = compute_devis(*lines, **PARAMS)
+        print(f"{'':<18}  compute_devis : {time.perf_counter() - t0:.2f} s")
+        del lines
+
+    first, *others = results.values()
+    assert all(r == first for r in others), "résultats différents !"
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
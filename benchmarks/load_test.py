@@ -0,0 +1,459 @@
+# benchmarks/load_test.py
+"""
+Tir de charge de l'application FastAPI, dans le même processus :
+  - asgi    : httpx.ASGITransport directement sur l'app (défaut, pas de réseau) ;
+  - uvicorn : serveur uvicorn local lancé sur la même boucle asyncio ;
+  - --url   : instance déjà démarrée (pas de mesure de la boucle serveur).
+
+Chaque « commercial » virtuel se connecte (POST /login) puis enchaîne en
+boucle : GET /devis/form, une rafale d'auto-complétion /api/clients (une
+requête par frappe), POST /generate avec un export progiciel synthétique
+(progiciel_gen), puis quelques /simulate-transport (blur du champ distance).
+
+    python -m benchmarks.load_test [--users 1,5,10,20] [--duration 20]
+        [--mode asgi|uvicorn] [--url http://127.0.0.1:8000]
+        [--mix form:1,clients:6,generate:1,transport:3] [--lines 200]
+        [--think 1.0] [--keystroke 0.15] [--slo-p95-ms 500]
+        [--db /tmp/charge.db] [--json resultats.json] [--verbose]
+
+Par palier (--users) et par route : débit, latences p50/p95/p99/max, erreurs
+et retard de la boucle asyncio observé pendant que la route était en cours
+(un handler async qui bloque fait monter ce retard pour toutes les requêtes).
+Avec --slo-p95-ms, le dernier palier qui tient le p95 sur toutes les routes
+donne le nombre de commerciaux qu'une instance peut servir.
+
+En asgi / uvicorn, l'app tourne sur une base et un dossier PDF à part
+(DEVIS_DB_PATH / DEVIS_PDF_DIR, temporaires par défaut) : les devis prennent
+des réfs normales dans cette base, la vraie base et les PDF existants ne
+sont pas touchés. Avec --url, les devis sont enregistrés sur le serveur visé.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+
+from benchmarks.progiciel_gen import ProgicielSpec, progiciel_csv_bytes
+
+BASE_URL = "http://testserver"
+LOGIN = ("ga", "1234")  # compte de démonstration créé par la migration users
+DEFAULT_MIX: Dict[str, int] = {"form": 1, "clients": 6, "generate": 1, "transport": 3}
+CSV_VARIANTS = 64         # exports différents, tirés au sort à chaque /generate
+LAG_INTERVAL_S = 0.005    # période de la sonde de retard de boucle
+REQUEST_TIMEOUT_S = 60.0
+
+ROUTES = {
+    "login": "POST /login",
+    "form": "GET /devis/form",
+    "clients": "GET /api/clients",
+    "generate": "POST /generate",
+    "transport": "POST /simulate-transport",
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000.0, 2)
+
+
+# ================== MESURES ============================================
+
+
+@dataclass
+class RouteStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    lag: List[float] = field(default_factory=list)  # retards de boucle pendant la route
+
+    def to_dict(self, duration_s: float) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        lag = sorted(self.lag)
+        return {
+            "requests": len(lat),
+            "errors": self.errors,
+            "rps": round(len(lat) / duration_s, 2) if duration_s else 0.0,
+            "p50_ms": _ms(percentile(lat, 0.50)),
+            "p95_ms": _ms(percentile(lat, 0.95)),
+            "p99_ms": _ms(percentile(lat, 0.99)),
+            "max_ms": _ms(lat[-1]) if lat else 0.0,
+            "lag_p99_ms": _ms(percentile(lag, 0.99)),
+            "lag_max_ms": _ms(lag[-1]) if lag else 0.0,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+        }
+
+
+class Recorder:
+    """Chronomètre les requêtes et sonde le retard de la boucle asyncio."""
+
+    def __init__(self) -> None:
+        self.routes: Dict[str, RouteStats] = {}
+        self.loop_lag: List[float] = []
+        self._inflight: Counter = Counter()
+        self._window: Set[str] = set()  # routes actives depuis le dernier tick
+
+    async def request(
+        self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs: Any
+    ) -> Optional[httpx.Response]:
+        stats = self.routes.setdefault(route, RouteStats())
+        self._inflight[route] += 1
+        self._window.add(route)
+        t0 = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            stats.errors += 1
+            stats.statuses[e.__class__.__name__] += 1
+            return None
+        finally:
+            stats.latencies.append(time.perf_counter() - t0)
+            self._inflight[route] -= 1
+        stats.statuses[resp.status_code] += 1
+        if resp.status_code >= 400:
+            stats.errors += 1
+        return resp
+
+    async def watch_loop(self, stop: asyncio.Event) -> None:
+        """
+        Dort LAG_INTERVAL_S en boucle ; le dépassement est le temps pendant
+        lequel la boucle était bloquée (code synchrone dans un handler async,
+        parsing, rendu, ...). Il est imputé aux routes actives sur la période.
+        """
+        while not stop.is_set():
+            self._window = {r for r, n in self._inflight.items() if n > 0}
+            t0 = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL_S)
+            lag = max(0.0, time.perf_counter() - t0 - LAG_INTERVAL_S)
+            self.loop_lag.append(lag)
+            for route in self._window:
+                self.routes.setdefault(route, RouteStats()).lag.append(lag)
+
+
+# ================== SCÉNARIO ===========================================
+
+
+@dataclass
+class Scenario:
+    mix: Dict[str, int]
+    payloads: List[bytes]
+    client_names: List[str]
+    think_s: float = 1.0
+    keystroke_s: float = 0.15
+
+
+async def _pause(rnd: random.Random, seconds: float) -> None:
+    if seconds > 0:
+        await asyncio.sleep(seconds * rnd.uniform(0.5, 1.5))
+
+
+async def commercial(
+    n: int,
+    client: httpx.AsyncClient,
+    rec: Recorder,
+    scenario: Scenario,
+    deadline: float,
+    seed: int,
+) -> None:
+    rnd = random.Random(seed * 10_007 + n)
+    mix = scenario.mix
+    await rec.request(
+        client, ROUTES["login"], "POST", "/login",
+        data={"username": LOGIN[0], "password": LOGIN[1]},
+    )
+    devis = 0
+    while time.perf_counter() < deadline:
+        for _ in range(mix.get("form", 0)):
+            await rec.request(client, ROUTES["form"], "GET", "/devis/form")
+            await _pause(rnd, scenario.think_s)
+
+        # une requête par frappe, sur le début du nom d'un client réel
+        name = rnd.choice(scenario.client_names) if scenario.client_names else "SBBM"
+        for k in range(1, mix.get("clients", 0) + 1):
+            await rec.request(client, ROUTES["clients"], "GET", "/api/clients", params={"q": name[:k]})
+            await _pause(rnd, scenario.keystroke_s)
+
+        for _ in range(mix.get("generate", 0)):
+            devis += 1
+            await rec.request(
+                client, ROUTES["generate"], "POST", "/generate",
+                data={
+                    "client": name,
+                    "chantier": f"Chantier {n}-{devis}",
+                    "distance_km": str(rnd.randint(5, 250)),
+                    "mode_transport": "rendu",
+                    "saisie_mode": "progiciel",
+                },
+                files={"fichier_progiciel": ("export.csv", rnd.choice(scenario.payloads), "text/csv")},
+            )
+            await _pause(rnd, scenario.think_s)
+
+        for _ in range(mix.get("transport", 0)):
+            await rec.request(
+                client, ROUTES["transport"], "POST", "/simulate-transport",
+                json={"distance_km": rnd.randint(5, 250), "mode_transport": "rendu"},
+            )
+            await _pause(rnd, scenario.think_s)
+
+
+# ================== CIBLES =============================================
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def target(mode: str, url: Optional[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Paramètres des httpx.AsyncClient selon la cible ; démarre / arrête l'app."""
+    if url:
+        yield {"base_url": url.rstrip("/")}
+        return
+
+    from app.main import app  # après DEVIS_DB_PATH
+
+    if mode == "uvicorn":
+        import uvicorn
+
+        port = _free_port()
+        server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on")
+        )
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            if task.done():
+                task.result()  # erreur de démarrage
+            await asyncio.sleep(0.01)
+        try:
+            yield {"base_url": f"http://127.0.0.1:{port}"}
+        finally:
+            server.should_exit = True
+            await task
+        return
+
+    # ASGITransport ne déroule pas le lifespan : on le fait ici
+    async with app.router.lifespan_context(app):
+        yield {"base_url": BASE_URL, "transport": httpx.ASGITransport(app=app)}
+
+
+async def run_stage(
+    users: int,
+    duration_s: float,
+    client_kwargs: Dict[str, Any],
+    scenario: Scenario,
+    seed: int,
+    measure_loop: bool,
+) -> Dict[str, Any]:
+    rec = Recorder()
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(rec.watch_loop(stop)) if measure_loop else None
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    clients = [
+        httpx.AsyncClient(
+            follow_redirects=False, timeout=REQUEST_TIMEOUT_S, limits=limits, **client_kwargs
+        )
+        for _ in range(users)
+    ]
+    t0 = time.perf_counter()
+    deadline = t0 + duration_s
+    try:
+        await asyncio.gather(
+            *(commercial(i, c, rec, scenario, deadline, seed) for i, c in enumerate(clients))
+        )
+    finally:
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        if watcher is not None:
+            await watcher
+        for c in clients:
+            await c.aclose()
+
+    total = sum(len(s.latencies) for s in rec.routes.values())
+    all_lat = sorted(x for s in rec.routes.values() for x in s.latencies)
+    lag = sorted(rec.loop_lag)
+    return {
+        "users": users,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "errors": sum(s.errors for s in rec.routes.values()),
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p95_ms": _ms(percentile(all_lat, 0.95)),
+        "loop_lag": {
+            "p50_ms": _ms(percentile(lag, 0.50)),
+            "p99_ms": _ms(percentile(lag, 0.99)),
+            "max_ms": _ms(lag[-1]) if lag else 0.0,
+        } if measure_loop else None,
+        "routes": {route: s.to_dict(elapsed) for route, s in sorted(rec.routes.items())},
+    }
+
+
+# ================== RAPPORT ============================================
+
+
+def print_stage(stage: Dict[str, Any]) -> None:
+    lag = stage["loop_lag"]
+    lag_txt = (
+        f", retard boucle p50 {lag['p50_ms']:g} / p99 {lag['p99_ms']:g} / max {lag['max_ms']:g} ms"
+        if lag else ""
+    )
+    print(
+        f"\n=== {stage['users']} commerciaux, {stage['duration_s']:g} s : "
+        f"{stage['requests']} requêtes, {stage['rps']:g} req/s, "
+        f"{stage['errors']} erreurs{lag_txt}"
+    )
+    print(
+        f"{'route':<26}{'n':>7}{'err':>6}{'req/s':>9}{'p50':>9}{'p95':>9}"
+        f"{'p99':>9}{'max':>9}{'lag p99':>10}{'lag max':>10}"
+    )
+    for route, r in stage["routes"].items():
+        print(
+            f"{route:<26}{r['requests']:>7}{r['errors']:>6}{r['rps']:>9.1f}{r['p50_ms']:>9.1f}"
+            f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+            + (f"{r['lag_p99_ms']:>10.1f}{r['lag_max_ms']:>10.1f}" if lag else "")
+        )
+
+
+def capacity(stages: List[Dict[str, Any]], slo_p95_ms: float) -> Optional[int]:
+    """Plus grand palier sans erreur dont toutes les routes tiennent le p95."""
+    best = None
+    for stage in stages:
+        ok = stage["errors"] == 0 and all(
+            r["p95_ms"] <= slo_p95_ms for r in stage["routes"].values()
+        )
+        if not ok:
+            break
+        best = stage["users"]
+    return best
+
+
+def _client_names(limit: int = 500) -> List[str]:
+    from app.services.clients_import import CLIENTS_CSV, ImportReport, iter_client_rows
+
+    try:
+        with open(CLIENTS_CSV, encoding="utf-8-sig", newline="") as f:
+            names = [nom for _, nom in iter_client_rows(f, ImportReport())]
+    except (OSError, ValueError) as e:
+        print("⚠️ Liste clients illisible, auto-complétion sur « SBBM » :", e)
+        return []
+    return names[:limit]
+
+
+def _parse_mix(value: Optional[str]) -> Dict[str, int]:
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (value or "").split(",")):
+        key, _, n = part.partition(":")
+        if key.strip() not in DEFAULT_MIX:
+            raise ValueError(f"étape inconnue : {key} (parmi {', '.join(DEFAULT_MIX)})")
+        mix[key.strip()] = int(n or 1)
+    return mix
+
+
+async def _run(args: argparse.Namespace, scenario: Scenario) -> List[Dict[str, Any]]:
+    stages = []
+    async with target(args.mode, args.url) as client_kwargs:
+        for users in args.users:
+            quiet = open(os.devnull, "w") if not args.verbose else None
+            # les print() de l'app (login, DEBUG parser...) noieraient le rapport
+            with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+                stage = await run_stage(
+                    users, args.duration, client_kwargs, scenario, args.seed,
+                    measure_loop=not args.url,
+                )
+            if quiet:
+                quiet.close()
+            print_stage(stage)
+            stages.append(stage)
+    return stages
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", default="1,5,10", help="paliers, ex. 1,5,10,20")
+    parser.add_argument("--duration", type=float, default=20.0, help="secondes par palier")
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--url", help="instance déjà démarrée (au lieu de asgi / uvicorn)")
+    parser.add_argument("--mix", help="ex. form:1,clients:6,generate:1,transport:3")
+    parser.add_argument("--lines", type=int, default=200, help="poutrelles par export")
+    parser.add_argument("--think", type=float, default=1.0, help="pause entre actions (s)")
+    parser.add_argument("--keystroke", type=float, default=0.15, help="pause entre frappes (s)")
+    parser.add_argument("--slo-p95-ms", type=float)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", type=Path, help="base SQLite de l'app (défaut : temporaire)")
+    parser.add_argument("--json", type=Path)
+    parser.add_argument("--verbose", action="store_true", help="garde les logs de l'app")
+    args = parser.parse_args(argv)
+
+    try:
+        args.users = [int(u) for u in args.users.split(",") if u.strip()]
+        mix = _parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not args.url:
+        work_dir = Path(tempfile.mkdtemp(prefix="devis-charge-"))
+        db = args.db or work_dir / "devis.db"
+        os.environ["DEVIS_DB_PATH"] = str(db)
+        os.environ["DEVIS_PDF_DIR"] = str(work_dir / "pdf")
+        print(f"Base de l'app : {db}")
+
+    scenario = Scenario(
+        mix=mix,
+        payloads=[
+            progiciel_csv_bytes(ProgicielSpec(poutrelles=args.lines, seed=args.seed + i))
+            for i in range(CSV_VARIANTS)
+        ],
+        client_names=_client_names(),
+        think_s=args.think,
+        keystroke_s=args.keystroke,
+    )
+    stages = asyncio.run(_run(args, scenario))
+
+    result: Dict[str, Any] = {
+        "meta": {
+            "mode": "url" if args.url else args.mode,
+            "url": args.url,
+            "mix": mix,
+            "lines": args.lines,
+            "think_s": args.think,
+            "keystroke_s": args.keystroke,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": stages,
+    }
+    if args.slo_p95_ms is not None:
+        cap = capacity(stages, args.slo_p95_ms)
+        result["capacity"] = {"slo_p95_ms": args.slo_p95_ms, "users": cap}
+        print(
+            f"\nCapacité (p95 ≤ {args.slo_p95_ms:g} ms sur toutes les routes, sans erreur) : "
+            + (f"{cap} commerciaux" if cap else "non tenue dès le premier palier")
+        )
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Résultats écrits dans {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
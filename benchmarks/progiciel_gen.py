@@ -0,0 +1,268 @@
+# benchmarks/progiciel_gen.py
+"""
+Générateur d'exports progiciel synthétiques, même mise en page que
+data/« s sol type 1.CSV » :
+  - bloc d'en-tête (DOSSIER, CHANTIER, ...) avec les lignes SURFACE et SURFACE TS ;
+  - tableau REPERE;SOUS TYPE;LONGUEUR/PAS ETRIERS;...;NOMBRE;LONGUEUR;... ;
+  - tableau FAMILLE;DESIGNATION;...;NOMBRE;... ;
+  - tableau récapitulatif CODE;POUTRELLES;... (ignoré par le parser) ;
+  - virgules décimales, nombres cadrés à droite, séparateurs de milliers et
+    espaces insécables (« bruit »), fins de ligne CRLF ;
+  - UTF-8 par défaut, ce que décode le parser : en cp1252, l'espace
+    insécable devient l'octet 0xA0, supprimé au décodage, et le bruit
+    n'atteindrait jamais _to_float.
+
+    python -m benchmarks.progiciel_gen sortie.csv [--poutrelles 100000]
+        [--hourdis 5000] [--seed 1] [--mix-poutrelles 113:3,157:1]
+        [--mix-hourdis H16:4,H20:1] [--noise 0.1] [--skipped 0.02]
+        [--encoding utf-8] [--check]
+
+Même graine = même fichier, octet pour octet. --check relit le fichier avec
+parse_progiciel_csv et vérifie le nombre de lignes et les surfaces.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+from app.services.engine import PRICE_STD_HOURDIS_U, PRICE_STD_POUTRELLE_ML
+
+NBSP = "\u00a0"
+REPERES = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+POUTRELLES_HEADER = (
+    "REPERE;SOUS TYPE;LONGUEUR/PAS ETRIERS;LONGUEUR COUTURES;NOMBRE;LONGUEUR;POIDS;"
+    "PRIX POUTRELLE;PRIX POUTRELLE AVEC ETRIERS;PRIX POUTRELLE AVEC COUTURES;"
+    "PRIX POUTRELLE AVEC ETRIERS + COUTURES;HAUTEUR ETRIERS;"
+)
+HOURDIS_HEADER = "FAMILLE;DESIGNATION;HAUTEUR;EPAISSEUR SOUS FACE;LONGUEUR;LARGEUR;NOMBRE;POIDS;PRIX;CODE;"
+
+# hauteur (cm) indicative, pour les colonnes que le parser ne lit pas
+_HAUTEUR_HOURDIS = {"H8": 8, "H12": 12, "H16": 16, "H20": 20, "H25": 25, "H30": 30}
+
+
+@dataclass
+class ProgicielSpec:
+    """Contenu du fichier à générer."""
+
+    poutrelles: int = 20
+    hourdis: Optional[int] = None  # défaut : poutrelles // 10 (au moins 1)
+    seed: int = 0
+    # type -> poids relatif ; défaut : tous les types de la grille standard, à parts égales
+    mix_poutrelles: Dict[str, float] = field(default_factory=dict)
+    mix_hourdis: Dict[str, float] = field(default_factory=dict)
+    surface_ct: Optional[float] = None  # défaut : tirée au sort
+    surface_ts: Optional[float] = None
+    noise: float = 0.1    # part des nombres écrits avec milliers / espaces insécables
+    skipped: float = 0.0  # part des lignes que le parser doit ignorer (nombre ou longueur à 0)
+    encoding: str = "utf-8"
+
+
+@dataclass
+class GeneratedStats:
+    """Ce que parse_progiciel_csv doit retrouver dans le fichier généré."""
+
+    poutrelles: int = 0
+    hourdis: int = 0
+    skipped: int = 0
+    surface_ct: float = 0.0
+    surface_ts: float = 0.0
+    total_ml: float = 0.0
+    total_hourdis: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+def _fr(x: float, rnd: random.Random, noise: float, width: int = 8) -> str:
+    """Nombre « progiciel » : 2 décimales, virgule, cadré à droite (+ bruit)."""
+    if noise and rnd.random() < noise:
+        s = f"{x:,.2f}".replace(",", NBSP).replace(".", ",")
+        return s.rjust(width, rnd.choice((" ", NBSP)))
+    return f"{x:{width}.2f}".replace(".", ",")
+
+
+def _repere(i: int) -> str:
+    return REPERES[i % 26] + (str(i // 26) if i >= 26 else "")
+
+
+def _weighted(mix: Dict[str, float], defaults: List[str]) -> tuple:
+    mix = mix or {t: 1.0 for t in defaults}
+    return list(mix), list(mix.values())
+
+
+def iter_progiciel_lines(spec: ProgicielSpec, stats: Optional[GeneratedStats] = None) -> Iterator[str]:
+    """Lignes du fichier (sans fin de ligne) ; `stats` est rempli au passage."""
+    stats = stats if stats is not None else GeneratedStats()
+    rnd = random.Random(spec.seed)
+    noise = spec.noise
+    nb_hourdis = spec.hourdis if spec.hourdis is not None else max(1, spec.poutrelles // 10)
+    types_p, poids_p = _weighted(spec.mix_poutrelles, list(PRICE_STD_POUTRELLE_ML))
+    types_h, poids_h = _weighted(spec.mix_hourdis, list(PRICE_STD_HOURDIS_U))
+    surface_ct = spec.surface_ct if spec.surface_ct is not None else round(rnd.uniform(20, 900), 2)
+    surface_ts = spec.surface_ts if spec.surface_ts is not None else round(rnd.uniform(0, 900), 2)
+    stats.surface_ct, stats.surface_ts = surface_ct, surface_ts
+
+    # --- en-tête (colonnes 6-8 : libellé / valeur, comme le progiciel) ---
+    yield "STE DE BATIMENT & BETON MOULE;;D E V I S   P L A N C H E R;;;CHARGE PERM:;;POUTRELLES;"
+    yield "SBBM - LOTISSEMENT AZLI;;PC COMPOSANTS;;;CHARGE EXPLOITAT. :;;ENTREVOUS;"
+    yield ""
+    yield f"NUMERO DE CLIENT;;;;;TYPE POUTRELLE;;{_fr(0, rnd, 0)};"
+    yield f"DOSSIER        :;;P-{rnd.randint(100, 999)};;;SURFACE;;{_fr(surface_ct, rnd, noise)};"
+    yield f"CHANTIER      :;;;;;PRIX TRANSPORT;;{_fr(0, rnd, 0)};"
+    yield "ENTREPRISE         :;;;;;TYPE SURFACE;;Livrée;"
+    yield f"DISTRIBUTEUR:;;;;;CODE REMISE;;{_fr(3, rnd, 0)};"
+    yield f"DATE CREATION;;{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/25;;;VOLUME BETON;;{_fr(rnd.uniform(1, 50), rnd, 0)};"
+    yield f"ARCHITECTE;;;;;SURFACE TS;;{_fr(surface_ts, rnd, noise)};"
+    yield f"INTERLOCUTEUR;;;;;NB POUTRELLES;;{_fr(spec.poutrelles, rnd, noise)};"
+    yield f"PLAN            :;;PH SOUS SOL;;;NB ENTREVOUS;;{_fr(nb_hourdis, rnd, noise)};"
+    yield "ADRESSE CHANTIER;;;;;TRANSPORT CALCULE SUR LA BASE DE:;;TRANSPORT;"
+    yield from [""] * 4
+
+    # --- poutrelles ---
+    yield POUTRELLES_HEADER
+    for i, t in enumerate(rnd.choices(types_p, poids_p, k=spec.poutrelles)):
+        etrier = float(rnd.randint(0, 25))
+        nombre = float(rnd.randint(1, 40))
+        longueur = round(rnd.uniform(1.0, 7.5), 2)
+        if spec.skipped and rnd.random() < spec.skipped:
+            if rnd.random() < 0.5:
+                nombre = 0.0
+            else:
+                longueur = 0.0
+            stats.skipped += 1
+        else:
+            stats.poutrelles += 1
+            stats.total_ml += longueur * nombre
+        yield (
+            f"{_repere(i)};{t};{_fr(etrier, rnd, noise)};{_fr(0, rnd, 0)};"
+            f"{_fr(nombre, rnd, noise)};{_fr(longueur, rnd, noise)};{_fr(18.65, rnd, 0)};"
+            f"{_fr(0, rnd, 0)};{_fr(0, rnd, 0)};{_fr(0, rnd, 0)};{_fr(0, rnd, 0)};"
+            f"{_fr(17, rnd, 0)};"
+        )
+    yield from [""] * 4
+
+    # --- hourdis ---
+    yield HOURDIS_HEADER
+    for t in rnd.choices(types_h, poids_h, k=nb_hourdis):
+        nombre = float(rnd.randint(10, 2500))
+        if spec.skipped and rnd.random() < spec.skipped:
+            nombre = 0.0
+            stats.skipped += 1
+        else:
+            stats.hourdis += 1
+            stats.total_hourdis += nombre
+        hauteur = _HAUTEUR_HOURDIS.get(t, 16)
+        famille = rnd.choice(("BETON", t))
+        yield (
+            f"{famille};{t};{_fr(hauteur, rnd, 0)};{_fr(0, rnd, 0)};{_fr(20, rnd, 0)};"
+            f"{_fr(53, rnd, 0)};{_fr(nombre, rnd, noise)};{_fr(hauteur - 2, rnd, 0)};"
+            f"{_fr(0, rnd, 0)};{_fr(0, rnd, 0)};"
+        )
+    yield from [""] * 4
+
+    # --- récapitulatif (ignoré par le parser) ---
+    yield "CODE;POUTRELLES;ENTREVOUS;ARMATURES;DIVERS;"
+    for code in range(1, 5):
+        yield ";".join(_fr(x, rnd, 0) for x in (code, 0, 0, 0, 0)) + ";"
+
+    stats.total_ml = round(stats.total_ml, 2)
+
+
+def write_progiciel(out: TextIO, spec: ProgicielSpec) -> GeneratedStats:
+    """Écrit le fichier dans `out` (texte, newline="" conseillé) au fil de l'eau."""
+    stats = GeneratedStats()
+    for line in iter_progiciel_lines(spec, stats):
+        out.write(line)
+        out.write("\r\n")
+    return stats
+
+
+def write_progiciel_csv(path: Path, spec: ProgicielSpec) -> GeneratedStats:
+    with open(path, "w", encoding=spec.encoding, errors="replace", newline="") as f:
+        return write_progiciel(f, spec)
+
+
+def progiciel_csv_bytes(spec: ProgicielSpec) -> bytes:
+    buf = io.StringIO(newline="")
+    write_progiciel(buf, spec)
+    return buf.getvalue().encode(spec.encoding, errors="replace")
+
+
+def check(path: Path, stats: GeneratedStats) -> List[str]:
+    """Écarts entre le fichier relu par parse_progiciel_csv et `stats`."""
+    from app.services.parser_progiciel import parse_progiciel_csv
+
+    parsed = parse_progiciel_csv(path)
+    errors = []
+    for key, got in (
+        ("poutrelles", len(parsed["poutrelles"])),
+        ("hourdis", len(parsed["hourdis"])),
+        ("surface_ct", parsed["surface_ct"]),
+        ("surface_ts", parsed["surface_ts"]),
+    ):
+        expected = getattr(stats, key)
+        if abs(got - expected) > 1e-6:
+            errors.append(f"{key} : attendu {expected}, relu {got}")
+    return errors
+
+
+def _parse_mix(value: Optional[str]) -> Dict[str, float]:
+    """"113:3,157:1" -> {"113": 3.0, "157": 1.0} ; un type seul vaut 1."""
+    mix: Dict[str, float] = {}
+    for part in filter(None, (value or "").split(",")):
+        t, _, w = part.partition(":")
+        mix[t.strip().upper()] = float(w) if w else 1.0
+    return mix
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("sortie", type=Path)
+    parser.add_argument("--poutrelles", type=int, default=20)
+    parser.add_argument("--hourdis", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix-poutrelles", help="ex. 113:3,157:1")
+    parser.add_argument("--mix-hourdis", help="ex. H16:4,H20:1")
+    parser.add_argument("--surface-ct", type=float)
+    parser.add_argument("--surface-ts", type=float)
+    parser.add_argument("--noise", type=float, default=0.1)
+    parser.add_argument("--skipped", type=float, default=0.0)
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--check", action="store_true", help="relit le fichier avec le parser")
+    args = parser.parse_args(argv)
+
+    spec = ProgicielSpec(
+        poutrelles=args.poutrelles,
+        hourdis=args.hourdis,
+        seed=args.seed,
+        mix_poutrelles=_parse_mix(args.mix_poutrelles),
+        mix_hourdis=_parse_mix(args.mix_hourdis),
+        surface_ct=args.surface_ct,
+        surface_ts=args.surface_ts,
+        noise=args.noise,
+        skipped=args.skipped,
+        encoding=args.encoding,
+    )
+    stats = write_progiciel_csv(args.sortie, spec)
+    print(
+        f"{args.sortie} : {stats.poutrelles} poutrelles, {stats.hourdis} hourdis, "
+        f"{stats.skipped} lignes à ignorer, SURFACE={stats.surface_ct}, SURFACE TS={stats.surface_ts}"
+    )
+    if args.check:
+        errors = check(args.sortie, stats)
+        for e in errors:
+            print("❌", e)
+        if errors:
+            return 1
+        print("Relecture OK.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
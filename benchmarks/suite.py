@@ -0,0 +1,377 @@
+# benchmarks/suite.py
+"""
+Benchmarks des chemins chauds d'un devis, en petite / moyenne / grande taille :
+  - parse_progiciel_csv   (export synthétique de progiciel_gen, en mémoire) ;
+  - engine.compute_devis ;
+  - engine.simulate_transport ;
+  - calculs.calcul_devis  (ancien calcul par lignes « designation ») ;
+  - devis.html            (rendu Jinja seul) ;
+  - PDF WeasyPrint        (moteur chaud ; sauté si WeasyPrint est absent).
+
+Pour chaque cas : ops/s, p50 / p99 (ms) et pic mémoire Python (tracemalloc,
+mesuré sur un appel à part pour ne pas fausser les temps).
+
+    python -m benchmarks.suite [--sizes small,medium] [--only parse,jinja]
+                               [--json resultats.json] [--budget 1.0]
+                               [--baseline benchmarks/baseline.json]
+                               [--save-baseline] [--tolerance 0.15]
+
+Avec --baseline, chaque cas est comparé à la référence enregistrée : p50 ou
+pic mémoire plus de `tolerance` au-dessus = régression, code retour 1 (à
+lancer avant un déploiement, sur la machine qui a produit la référence).
+--save-baseline écrit les résultats du jour comme nouvelle référence.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app.calculs import ParametresDevis, calcul_devis
+from app.services.engine import (
+    PRICE_STD_HOURDIS_U,
+    PRICE_STD_POUTRELLE_ML,
+    compute_devis,
+    simulate_transport,
+)
+from app.services.parser_progiciel import parse_progiciel_csv
+from app.services.pdf_renderer import PdfRenderer, weasyprint_available
+from benchmarks.progiciel_gen import ProgicielSpec, progiciel_csv_bytes
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+STATIC_DIR = BASE_DIR / "static"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Nombre de lignes poutrelles par taille (hourdis : un dixième). Le rendu
+# HTML / PDF a ses propres tailles : un devis réel dépasse rarement
+# quelques centaines de lignes, 50 000 lignes en PDF ne mesurerait rien d'utile.
+SIZES: Dict[str, int] = {"small": 10, "medium": 500, "huge": 50_000}
+RENDER_SIZES: Dict[str, int] = {"small": 10, "medium": 200, "huge": 2_000}
+
+MIN_ITERATIONS = 5
+MAX_ITERATIONS = 2_000
+DEFAULT_BUDGET_S = 1.0
+DEFAULT_TOLERANCE = 0.15
+
+PARAMS: Dict[str, Any] = {
+    "surface_ct": 94.22,
+    "surface_ts": 110.16,
+    "remise_poutrelle": 5.0,
+    "remise_hourdis": 0.0,
+    "prix_ct": 12.0,
+    "prix_treillis": 180.0,
+    "mode_transport": "rendu",
+    "transport_mode": "auto",
+    "distance_km": 80.0,
+    "transport_poutrelle_manuel": 0.0,
+    "transport_hourdis_manuel": 0.0,
+}
+
+
+# ================== DONNÉES ============================================
+
+
+def _random_lines(n: int, seed: int = 42) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    rnd = random.Random(seed)
+    types_p = list(PRICE_STD_POUTRELLE_ML)
+    types_h = list(PRICE_STD_HOURDIS_U)
+    poutrelles = [
+        {
+            "type": rnd.choice(types_p),
+            "longueur": round(rnd.uniform(1.0, 7.5), 2),
+            "etrier": rnd.randint(0, 25),
+            "nombre": rnd.randint(1, 40),
+        }
+        for _ in range(n)
+    ]
+    hourdis = [
+        {"type": rnd.choice(types_h), "nombre": rnd.randint(50, 2500)}
+        for _ in range(max(1, n // 10))
+    ]
+    return poutrelles, hourdis
+
+
+def _devis_context(n: int) -> Dict[str, Any]:
+    """Contexte de devis.html, comme celui construit par /generate."""
+    poutrelles, hourdis = _random_lines(n)
+    return {
+        "code_client": "C0001",
+        "client": "CLIENT BENCH",
+        "chantier": "Chantier bench",
+        "niveau": "RDC",
+        "affaire": "",
+        "ref_devis": "D00000",
+        "date_devis": "01/01/2026",
+        "mode_livraison": "Livré",
+        "validite": "1 mois",
+        "code_commercial": "GA",
+        "nom_commercial": "",
+        "user_code_commercial": "GA",
+        "user_nom": "Bench",
+        "logo_data_uri": "",  # comme pour le PDF : logo en URL /static/
+        "pdf_available": True,
+        **PARAMS,
+        **compute_devis(poutrelles, hourdis, **PARAMS),
+    }
+
+
+# ================== CAS ================================================
+
+# setup(nb_lignes) -> fonction mesurée (sans argument)
+Case = Callable[[int], Callable[[], Any]]
+
+
+def _case_parse(n: int) -> Callable[[], Any]:
+    data = progiciel_csv_bytes(ProgicielSpec(poutrelles=n, seed=42))
+    return lambda: parse_progiciel_csv(io.BytesIO(data))
+
+
+def _case_compute(n: int) -> Callable[[], Any]:
+    poutrelles, hourdis = _random_lines(n)
+    return lambda: compute_devis(poutrelles, hourdis, **PARAMS)
+
+
+def _case_transport(n: int) -> Callable[[], Any]:
+    poutrelles, hourdis = _random_lines(n)
+    return lambda: simulate_transport(
+        poutrelles,
+        hourdis,
+        PARAMS["distance_km"],
+        PARAMS["mode_transport"],
+        PARAMS["transport_mode"],
+    )
+
+
+def _case_calculs(n: int) -> Callable[[], Any]:
+    poutrelles, hourdis = _random_lines(n)
+    lignes = [
+        {"designation": p["type"], "longueur": p["longueur"], "quantite": p["nombre"]}
+        for p in poutrelles
+    ]
+    lignes += [{"designation": "ETRIER", "quantite": sum(p["etrier"] for p in poutrelles)}]
+    lignes += [{"designation": h["type"], "quantite": h["nombre"]} for h in hourdis]
+    params = ParametresDevis(0.05, 0.0, 1.2, 0.15, 180.0, 12.0)
+    return lambda: calcul_devis(lignes, params)
+
+
+def _jinja_env() -> Environment:
+    # mêmes réglages que app.main, sans importer l'application
+    return Environment(
+        loader=FileSystemLoader(str(TEMPLATES_DIR)),
+        autoescape=select_autoescape(["html", "xml"]),
+    )
+
+
+def _case_jinja(n: int) -> Callable[[], Any]:
+    template = _jinja_env().get_template("devis.html")
+    context = _devis_context(n)
+    return lambda: template.render(context)
+
+
+def _case_pdf(n: int) -> Callable[[], Any]:
+    html = _jinja_env().get_template("devis.html").render(_devis_context(n))
+    renderer = PdfRenderer(str(STATIC_DIR / "style.css"), str(BASE_DIR))
+    renderer.warm_up()
+    return lambda: renderer.render(html)
+
+
+# nom -> (cas, tailles, disponible ?)
+CASES: Dict[str, Tuple[Case, Dict[str, int], Callable[[], bool]]] = {
+    "parse": (_case_parse, SIZES, lambda: True),
+    "compute_devis": (_case_compute, SIZES, lambda: True),
+    "simulate_transport": (_case_transport, SIZES, lambda: True),
+    "calcul_devis": (_case_calculs, SIZES, lambda: True),
+    "jinja": (_case_jinja, RENDER_SIZES, lambda: True),
+    "pdf": (_case_pdf, RENDER_SIZES, weasyprint_available),
+}
+
+
+# ================== MESURE =============================================
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+@contextlib.contextmanager
+def _quiet() -> Any:
+    # parse_progiciel_csv & co. affichent des lignes DEBUG à chaque appel
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(fn: Callable[[], Any], budget_s: float = DEFAULT_BUDGET_S) -> Dict[str, Any]:
+    """Appels répétés de `fn` pendant ~budget_s (au moins MIN_ITERATIONS)."""
+    with _quiet():
+        fn()  # échauffement : imports paresseux, caches, ...
+        gc.collect()
+        timings: List[float] = []
+        deadline = time.perf_counter() + budget_s
+        while len(timings) < MAX_ITERATIONS and (
+            len(timings) < MIN_ITERATIONS or time.perf_counter() < deadline
+        ):
+            t0 = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - t0)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "ops_per_s": round(len(timings) / sum(timings), 2),
+        "p50_ms": round(_percentile(timings, 0.50) * 1000.0, 4),
+        "p99_ms": round(_percentile(timings, 0.99) * 1000.0, 4),
+        "peak_mem_kb": round(peak / 1024.0, 1),
+    }
+
+
+def run_suite(
+    sizes: Optional[List[str]] = None,
+    only: Optional[List[str]] = None,
+    budget_s: float = DEFAULT_BUDGET_S,
+) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, (case, case_sizes, available) in CASES.items():
+        if only and name not in only:
+            continue
+        for size, n in case_sizes.items():
+            if sizes and size not in sizes:
+                continue
+            key = f"{name}/{size}"
+            if not available():
+                results[key] = {"lines": n, "skipped": True}
+                print(f"{key:<28} sauté (indisponible)")
+                continue
+            with _quiet():
+                fn = case(n)
+            res = {"lines": n, **measure(fn, budget_s)}
+            results[key] = res
+            print(
+                f"{key:<28} {res['ops_per_s']:>12.1f} ops/s  p50 {res['p50_ms']:>10.3f} ms  "
+                f"p99 {res['p99_ms']:>10.3f} ms  pic {res['peak_mem_kb']:>10.1f} Ko"
+            )
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def report(results: Dict[str, Dict[str, Any]], budget_s: float) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()} {platform.node()}",
+            "budget_s": budget_s,
+        },
+        "results": results,
+    }
+
+
+# ================== COMPARAISON ========================================
+
+
+def compare(
+    current: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """Cas en régression (p50 ou pic mémoire > référence × (1 + tolerance))."""
+    regressions: List[str] = []
+    print(f"\nComparaison à la référence (tolérance {tolerance:.0%}) :")
+    for key, res in current.items():
+        ref = baseline.get(key)
+        if res.get("skipped") or not ref or ref.get("skipped"):
+            continue
+        if ref.get("lines") != res.get("lines"):
+            print(f"{key:<28} taille différente de la référence, ignoré")
+            continue
+        flags = []
+        for metric in ("p50_ms", "peak_mem_kb"):
+            if ref[metric] and res[metric] > ref[metric] * (1 + tolerance):
+                flags.append(metric)
+        d_time = res["p50_ms"] / ref["p50_ms"] - 1 if ref["p50_ms"] else 0.0
+        d_mem = res["peak_mem_kb"] / ref["peak_mem_kb"] - 1 if ref["peak_mem_kb"] else 0.0
+        print(
+            f"{key:<28} p50 {d_time:+7.1%}  pic {d_mem:+7.1%}"
+            + (f"  ⚠️ RÉGRESSION ({', '.join(flags)})" if flags else "")
+        )
+        if flags:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", help="ex. small,medium (défaut : toutes)")
+    parser.add_argument("--only", help=f"cas parmi {', '.join(CASES)}")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_S, help="secondes par cas")
+    parser.add_argument("--json", type=Path, help="fichier de résultats JSON")
+    parser.add_argument("--baseline", type=Path, help="référence JSON à comparer")
+    parser.add_argument("--save-baseline", action="store_true", help=f"écrit {DEFAULT_BASELINE.name}")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes.split(",") if args.sizes else None
+    only = args.only.split(",") if args.only else None
+    unknown = set(only or ()) - set(CASES)
+    if unknown:
+        parser.error(f"cas inconnus : {', '.join(sorted(unknown))}")
+
+    results = run_suite(sizes, only, args.budget)
+    data = report(results, args.budget)
+
+    if args.json:
+        args.json.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Résultats écrits dans {args.json}")
+    if args.save_baseline:
+        DEFAULT_BASELINE.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Référence écrite dans {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline.get("results", {}), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} cas en régression : {', '.join(regressions)}")
+            return 1
+        print("Aucune régression.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
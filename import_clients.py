@@ -1,14 +1,18 @@
 from __future__ import annotations
 
-import csv
 import sqlite3
+import sys
 from pathlib import Path
 
-# Dossiers / chemins
+from app.services.clients_import import CLIENTS_CSV, ensure_clients_sync, sync_clients_csv
+from app.services.clients_search import ensure_clients_fts
+from app.services.db import DB_PATH, get_connection
+from app.services.startup import ensure_app_meta
+
+# Dossiers / chemins (base : app.services.db.DB_PATH, donc DEVIS_DB_PATH respecté)
 BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = BASE_DIR / "devis.db"
 DATA_DIR = BASE_DIR / "data"
-CSV_PATH = DATA_DIR / "liste_client_sbbm.csv"   # ← on garde ce nom ici
+CSV_PATH = CLIENTS_CSV   # data/liste_client_sbbm.csv
 
 
 def ensure_table_clients(conn: sqlite3.Connection) -> None:
@@ -26,61 +30,31 @@ def ensure_table_clients(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
-def import_clients() -> None:
+def import_clients(csv_path: Path = CSV_PATH, prune: bool = False) -> None:
+    """
+    Synchronise la table clients avec le CSV (voir app/services/clients_import.py) :
+    import complet en une transaction, seuls les ajouts / renommages (/ suppressions
+    si prune) sont écrits ; empreintes du fichier et des lignes mises à jour, comme
+    la synchro faite par l'application.
+    """
     print(f"Base SQLite : {DB_PATH}")
-    print(f"Fichier CSV : {CSV_PATH}")
+    print(f"Fichier CSV : {csv_path}")
 
-    if not CSV_PATH.exists():
+    if not Path(csv_path).exists():
         print("❌ CSV introuvable, vérifie le chemin.")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-    ensure_table_clients(conn)
-    cur = conn.cursor()
-
-    # très important : utf-8-sig pour supprimer le BOM (\ufeff)
-    with CSV_PATH.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f, delimiter=";")
-        headers = reader.fieldnames or []
-        print("En-têtes détectées :", headers)
-
-        total_lues = 0
-        inserees = 0
-        ignorees = 0
-
-        for row in reader:
-            code = (row.get("CODE_CLIENT") or "").strip()
-            nom = (row.get("NOM_CLIENT") or "").strip()
+    with get_connection() as conn:
+        ensure_table_clients(conn)
+        ensure_clients_fts(conn)
+        ensure_clients_sync(conn)
+        ensure_app_meta(conn)
+        report = sync_clients_csv(conn, Path(csv_path), prune=prune, full=True)
 
-            if not code or not nom:
-                ignorees += 1
-                continue
-
-            total_lues += 1
-            try:
-                cur.execute(
-                    """
-                    INSERT OR IGNORE INTO clients (code_client, nom_client)
-                    VALUES (?, ?)
-                    """,
-                    (code, nom),
-                )
-                if cur.rowcount:
-                    inserees += 1
-                else:
-                    ignorees += 1
-            except Exception as e:
-                print("⚠️ Ligne ignorée pour erreur :", e, "→", row)
-                ignorees += 1
-
-    conn.commit()
-    conn.close()
-
-    print(
-        f"Import terminé. {total_lues} lignes lues, {inserees} insérées, "
-        f"{ignorees} ignorées (doublons ou invalides)."
-    )
+    print(f"Import terminé. {report}")
 
 
 if __name__ == "__main__":
-    import_clients()
\ No newline at end of file
+    # python import_clients.py [fichier.csv] [--prune]
+    args = [a for a in sys.argv[1:] if a != "--prune"]
+    import_clients(Path(args[0]) if args else CSV_PATH, prune="--prune" in sys.argv[1:])
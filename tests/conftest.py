@@ -0,0 +1,59 @@
+# tests/conftest.py
+"""
+Les tests tournent sur une base SQLite et un dossier PDF temporaires
+(DEVIS_DB_PATH, DEVIS_PDF_DIR), fixés avant tout import de app.* : la vraie
+devis.db et generated_pdfs/ ne sont jamais touchés.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+TMP_DIR = Path(tempfile.mkdtemp(prefix="devis-tests-"))
+
+sys.path.insert(0, str(ROOT))
+os.environ["DEVIS_DB_PATH"] = str(TMP_DIR / "devis.db")
+os.environ["DEVIS_PDF_DIR"] = str(TMP_DIR / "pdf")
+
+LOGIN = {"username": "ga", "password": "1234"}  # compte créé par la migration users
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """Pool sur une base vide, propre à chaque test (services testés seuls)."""
+    from app.services.db import ConnectionPool
+
+    p = ConnectionPool(tmp_path / "unit.db")
+    yield p
+    p.close_all()
+
+
+@pytest.fixture(scope="session")
+def app_started():
+    """Application démarrée une fois (lifespan : migrations, import clients...)."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app):
+        yield app
+
+
+@pytest.fixture
+def client(app_started):
+    """Client HTTP neuf (cookies vides) sur l'application démarrée."""
+    from fastapi.testclient import TestClient
+
+    return TestClient(app_started)
+
+
+@pytest.fixture
+def logged_client(client):
+    resp = client.post("/login", data=LOGIN, follow_redirects=False)
+    assert resp.status_code == 303
+    return client
@@ -0,0 +1,33 @@
+# tests/test_auth.py
+from __future__ import annotations
+
+import io
+
+import pytest
+
+PROTECTED = [
+    ("POST", "/api/repricing", {"json": {"etrier": 0.95}}),
+    ("GET", "/api/stats", {}),
+    ("GET", "/api/refs/unused", {}),
+    (
+        "POST",
+        "/generate/batch",
+        {
+            "data": {"client": "X", "chantier": "Y"},
+            "files": {"fichier_zip": ("lot.zip", io.BytesIO(b""), "application/zip")},
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize("method,url,kwargs", PROTECTED, ids=[u for _, u, _ in PROTECTED])
+def test_routes_protegees_sans_login(client, method, url, kwargs):
+    assert client.request(method, url, **kwargs).status_code == 401
+
+
+def test_routes_protegees_apres_login(logged_client):
+    assert logged_client.get("/api/stats").status_code == 200
+    assert logged_client.get("/api/refs/unused").status_code == 200
+    resp = logged_client.post("/api/repricing", json={"etrier": 0.95})
+    assert resp.status_code == 200
+    assert '"summary"' in resp.text
@@ -0,0 +1,67 @@
+# tests/test_batch_generation.py
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+
+import pytest
+
+from app.services.batch_generation import (
+    BatchError,
+    BatchTooLarge,
+    open_batch_zip,
+    read_member,
+    spool_upload,
+)
+from benchmarks.progiciel_gen import ProgicielSpec, progiciel_csv_bytes
+
+
+def _zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_spool_upload_limite():
+    data = b"x" * 5000
+    with spool_upload(io.BytesIO(data), max_bytes=5000) as spool:
+        assert spool.read() == data
+    with pytest.raises(BatchTooLarge):
+        spool_upload(io.BytesIO(data), max_bytes=4999)
+
+
+def test_read_member_borne_la_decompression():
+    zf, members = open_batch_zip(io.BytesIO(_zip({"a.csv": b"0" * 10_000})))
+    assert len(read_member(zf, members[0], limit=10_000)) == 10_000
+    with pytest.raises(BatchError):
+        read_member(zf, members[0], limit=9_999)
+
+
+def test_generate_batch_route(logged_client):
+    payload = _zip(
+        {
+            f"niveau{i}.csv": progiciel_csv_bytes(ProgicielSpec(poutrelles=20, seed=i))
+            for i in range(3)
+        }
+    )
+    resp = logged_client.post(
+        "/generate/batch",
+        data={"client": "X", "chantier": "Lot"},
+        files={"fichier_zip": ("lot.zip", io.BytesIO(payload), "application/zip")},
+    )
+    assert resp.status_code == 200, resp.text
+    lines = [json.loads(l) for l in resp.text.splitlines()]
+    assert lines[-1]["summary"]["ok"] == 3
+    assert all(l["status"] == "ok" for l in lines[:-1])
+
+
+def test_generate_batch_zip_illisible(logged_client):
+    resp = logged_client.post(
+        "/generate/batch",
+        data={"client": "X", "chantier": "Lot"},
+        files={"fichier_zip": ("lot.zip", io.BytesIO(b"pas un zip"), "application/zip")},
+    )
+    assert resp.status_code == 400
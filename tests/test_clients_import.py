@@ -0,0 +1,22 @@
+# tests/test_clients_import.py
+from __future__ import annotations
+
+import io
+
+
+def test_admin_import_requires_login(client):
+    resp = client.post("/admin/clients/import")
+    assert resp.status_code == 401
+
+
+def test_admin_import_after_login(logged_client):
+    csv_data = "CODE_CLIENT;NOM_CLIENT\n ZZTEST001 ;Client import admin\n"
+    resp = logged_client.post(
+        "/admin/clients/import",
+        files={"fichier_csv": ("clients.csv", io.BytesIO(csv_data.encode("utf-8")), "text/csv")},
+    )
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["lues"] == 1
+
+    found = logged_client.get("/api/clients", params={"q": "ZZTEST001"}).json()
+    assert [c["nom_client"] for c in found] == ["Client import admin"]
@@ -0,0 +1,53 @@
+# tests/test_clients_search.py
+from __future__ import annotations
+
+import pytest
+
+from app.services import clients_search
+from app.services.clients_search import ensure_clients_fts, search_clients
+
+CLIENTS = [
+    ("34200001O", "Société Zoé Bâtiment"),
+    ("34200002O", "El Boukili Construction"),
+    ("34300001O", "Atlas Promotion"),
+    ("A_B%1", "Client Joker"),
+]
+
+
+def _fill(conn, fts: bool):
+    conn.execute(
+        "CREATE TABLE clients (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " code_client TEXT UNIQUE NOT NULL, nom_client TEXT NOT NULL)"
+    )
+    conn.commit()
+    if fts:
+        ensure_clients_fts(conn)
+    with conn:
+        conn.executemany("INSERT INTO clients (code_client, nom_client) VALUES (?, ?)", CLIENTS)
+
+
+def _codes(conn, term):
+    return sorted(r["code_client"] for r in search_clients(conn, term))
+
+
+@pytest.mark.parametrize("fts", [True, False], ids=["fts", "like"])
+def test_recherche(pool, monkeypatch, fts):
+    monkeypatch.setattr(clients_search, "FTS_AVAILABLE", None)
+    with pool.connection() as conn:
+        _fill(conn, fts)
+        assert clients_search.fts_available(conn) is fts
+        assert _codes(conn, "34200001") == ["34200001O"]
+        # sous-chaîne de code, comme la recherche LIKE d'origine
+        assert _codes(conn, "200001") == ["34200001O"]
+        assert _codes(conn, "00001") == ["34200001O", "34300001O"]
+        assert _codes(conn, "bouk") == ["34200002O"]
+
+
+def test_fts_prefixes_et_accents(pool, monkeypatch):
+    monkeypatch.setattr(clients_search, "FTS_AVAILABLE", None)
+    with pool.connection() as conn:
+        _fill(conn, True)
+        assert _codes(conn, "zoe bat") == ["34200001O"]
+        # jokers LIKE pris littéralement dans la passe sur les codes
+        assert _codes(conn, "B%1") == ["A_B%1"]
+        assert _codes(conn, "9_9") == []
@@ -0,0 +1,163 @@
+# tests/test_clients_sync.py
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+from app.services.clients_import import CLIENTS_CSV, ensure_clients_sync, sync_clients_csv
+from app.services.clients_search import ensure_clients_fts
+from app.services.startup import ensure_app_meta, get_meta
+
+from conftest import ROOT
+
+HEADER = "CODE_CLIENT;NOM_CLIENT\n"
+
+
+def _schema(conn):
+    conn.execute(
+        "CREATE TABLE clients (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " code_client TEXT UNIQUE NOT NULL, nom_client TEXT NOT NULL)"
+    )
+    conn.commit()
+    ensure_clients_fts(conn)
+    ensure_clients_sync(conn)
+    ensure_app_meta(conn)
+
+
+def _write(path, rows):
+    path.write_text(HEADER + "".join(f" {c} ;{n}\n" for c, n in rows), encoding="utf-8")
+    # même taille possible d'une version à l'autre : on force une date différente
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def _clients(conn):
+    return dict(conn.execute("SELECT code_client, nom_client FROM clients").fetchall())
+
+
+def test_delta_renommages_et_suppressions(pool, tmp_path):
+    csv_path = tmp_path / "clients.csv"
+    rows = [(f"34200{i:03d}O", f"Client {i}") for i in range(50)]
+    with pool.connection() as conn:
+        _schema(conn)
+        _write(csv_path, rows)
+        assert sync_clients_csv(conn, csv_path).inserees == 50
+        assert sync_clients_csv(conn, csv_path) is None  # inchangé
+
+        rows[3] = (rows[3][0], "Client 3 renommé")
+        rows[7] = (rows[7][0], "Client 7 renommé")
+        del rows[10]
+        rows.append(("34200999o", "Nouveau client"))  # casse gardée
+        _write(csv_path, rows)
+        report = sync_clients_csv(conn, csv_path, prune=True)
+
+        assert report.mode == "delta"
+        assert (report.inserees, report.renommees, report.supprimees) == (1, 2, 1)
+        assert _clients(conn) == dict(rows)
+
+        # un import complet du même fichier n'a plus rien à faire
+        full = sync_clients_csv(conn, csv_path, prune=True, full=True)
+        assert (full.inserees, full.renommees, full.supprimees) == (0, 0, 0)
+        assert _clients(conn) == dict(rows)
+
+
+def _touch(path):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_delta_avec_champs_entre_guillemets(pool, tmp_path):
+    csv_path = tmp_path / "clients.csv"
+    text = (
+        HEADER
+        + ''.join(f"34200{i:03d}O;Client {i}\n" for i in range(20))
+        + '342107402;" S.W DES TRV PUBLICS   ""S.W TRAP"" SARL    "\n'
+        + '342107403;"SUR DEUX\nLIGNES"\n'
+    )
+    csv_path.write_text(text, encoding="utf-8")
+    with pool.connection() as conn:
+        _schema(conn)
+        assert sync_clients_csv(conn, csv_path).inserees == 22
+        assert conn.execute("SELECT COUNT(*) FROM clients_csv_rows").fetchone()[0] == 22
+        assert _clients(conn)["342107402"] == 'S.W DES TRV PUBLICS "S.W TRAP" SARL'
+        assert _clients(conn)["342107403"] == "SUR DEUX LIGNES"
+
+        csv_path.write_text(text.replace("Client 5\n", "Client 5 bis\n"), encoding="utf-8")
+        _touch(csv_path)
+        report = sync_clients_csv(conn, csv_path)
+        assert report.mode == "delta"
+        assert (report.lues, report.renommees, report.inserees) == (1, 1, 0)
+        assert _clients(conn)["34200005O"] == "Client 5 bis"
+
+
+def test_delta_sur_le_fichier_de_reference(pool, tmp_path):
+    csv_path = tmp_path / "clients.csv"
+    data = CLIENTS_CSV.read_bytes()
+    assert b'""' in data  # champ à guillemets doublés
+    csv_path.write_bytes(data)
+    with pool.connection() as conn:
+        _schema(conn)
+        first = sync_clients_csv(conn, csv_path)
+        (n,) = conn.execute("SELECT COUNT(*) FROM clients_csv_rows").fetchone()
+        assert n > 0 and n == first.lues - first.doublons
+
+        code, nom = conn.execute("SELECT code_client, nom_client FROM clients LIMIT 1").fetchone()
+        csv_path.write_bytes(data.replace(nom.encode("utf-8"), b"RENOMME PAR LE TEST", 1))
+        _touch(csv_path)
+        report = sync_clients_csv(conn, csv_path)
+        assert report.mode == "delta"
+        assert report.renommees == 1
+        assert _clients(conn)[code] == "RENOMME PAR LE TEST"
+
+
+def test_empreintes_par_fichier_source(pool, tmp_path):
+    ref, autre = tmp_path / "ref.csv", tmp_path / "autre.csv"
+    _write(ref, [(f"34200{i:03d}O", f"Client {i}") for i in range(10)])
+    _write(autre, [("34299001O", "Autre fichier")])
+    with pool.connection() as conn:
+        _schema(conn)
+        assert sync_clients_csv(conn, ref) is not None
+        assert sync_clients_csv(conn, autre, full=True) is not None
+        assert sync_clients_csv(conn, ref) is None  # rien relu pour le fichier de référence
+        rows = dict(
+            conn.execute("SELECT source, COUNT(*) FROM clients_csv_rows GROUP BY source").fetchall()
+        )
+        assert rows == {str(ref.resolve()): 10, str(autre.resolve()): 1}
+
+
+def test_code_saisi_et_code_importe_identiques(logged_client):
+    resp = logged_client.post(
+        "/api/clients", json={"code_client": "zzcase01", "nom_client": "Saisi à la main"}
+    )
+    assert resp.status_code in (200, 201), resp.text
+    csv_data = "CODE_CLIENT;NOM_CLIENT\nzzcase01;Saisi à la main\n"
+    resp = logged_client.post(
+        "/admin/clients/import",
+        files={"fichier_csv": ("clients.csv", csv_data.encode("utf-8"), "text/csv")},
+    )
+    assert resp.json()["inserees"] == 0
+    found = logged_client.get("/api/clients", params={"q": "zzcase01"}).json()
+    assert len(found) == 1
+
+
+def test_cli_import_sur_devis_db_path(tmp_path):
+    db = tmp_path / "cli.db"
+    csv_path = tmp_path / "clients.csv"
+    _write(csv_path, [("34200001O", "Client CLI")])
+    env = {**os.environ, "DEVIS_DB_PATH": str(db)}
+    out = subprocess.run(
+        [sys.executable, "import_clients.py", str(csv_path)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    assert str(db) in out
+
+    import sqlite3
+
+    conn = sqlite3.connect(db)
+    try:
+        assert conn.execute("SELECT nom_client FROM clients").fetchall() == [("Client CLI",)]
+        assert conn.execute("SELECT COUNT(*) FROM clients_csv_rows").fetchone()[0] == 1
+        assert get_meta(conn, f"clients_csv_sha256:{csv_path.resolve()}")
+    finally:
+        conn.close()
@@ -0,0 +1,78 @@
+# tests/test_devis_history.py
+from __future__ import annotations
+
+from app.services.devis_history import (
+    HistoryFilters,
+    decode_cursor,
+    encode_cursor,
+    ensure_devis_history,
+    fetch_devis_page,
+)
+
+
+def _schema(pool, dates):
+    with pool.connection() as conn:
+        conn.execute(
+            """
+            CREATE TABLE devis (
+                id INTEGER PRIMARY KEY, ref_devis TEXT UNIQUE NOT NULL, date_devis TEXT,
+                client TEXT, chantier TEXT, code_client TEXT, total_ht REAL, total_ttc REAL,
+                code_commercial TEXT, nom_commercial TEXT
+            )
+            """
+        )
+        conn.executemany(
+            "INSERT INTO devis (ref_devis, date_devis, code_commercial, total_ht) VALUES (?, ?, ?, ?)",
+            [(f"D{i:05d}", d, "GA" if i % 2 else "FH", float(i)) for i, d in enumerate(dates)],
+        )
+        conn.commit()
+        ensure_devis_history(conn)
+
+
+def _all_pages(conn, filters=None, limit=7):
+    seen, cursor, pages = [], "", 0
+    while True:
+        page, cursor = fetch_devis_page(conn, filters, cursor=cursor, limit=limit)
+        seen.extend(page)
+        pages += 1
+        if cursor is None:
+            return seen, pages
+        assert len(page) == limit
+
+
+def test_pagination_sur_dates_egales(pool):
+    # 3 dates seulement pour 100 devis : les pages coupent au milieu d'une date
+    dates = ["17/10/2026", "16/10/2026", "17/10/2026", "01/01/2026"] * 25
+    _schema(pool, dates)
+    with pool.connection() as conn:
+        rows, pages = _all_pages(conn)
+        assert pages == 15
+        assert len(rows) == 100
+        assert len({r["id"] for r in rows}) == 100
+        keys = [(r["date_iso"], r["id"]) for r in rows]
+        assert keys == sorted(keys, reverse=True)
+
+        ga, _ = _all_pages(conn, HistoryFilters(code_commercial="GA"), limit=4)
+        assert [r["id"] for r in ga] == [r["id"] for r in rows if r["code_commercial"] == "GA"]
+
+
+def test_curseur():
+    assert decode_cursor(encode_cursor("2026-10-17", 42)) == ("2026-10-17", 42)
+    assert decode_cursor(encode_cursor("", 3)) == ("", 3)  # date illisible
+    assert decode_cursor("") is None
+    assert decode_cursor("pas-un-curseur") is None
+
+
+def test_lien_premiere_page(logged_client):
+    for _ in range(3):
+        resp = logged_client.post(
+            "/generate", data={"client": "X", "chantier": "Historique", "saisie_mode": "manuel"}
+        )
+        assert resp.status_code == 200, resp.text
+    first = logged_client.get("/devis/historique", params={"limit": 1})
+    assert first.status_code == 200
+    assert "Première page" not in first.text
+    cursor = encode_cursor("9999-12-31", 0)
+    page = logged_client.get("/devis/historique", params={"limit": 1, "cursor": cursor})
+    assert "« Première page" in page.text
+    assert "Plus récents" not in page.text
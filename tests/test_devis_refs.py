@@ -0,0 +1,85 @@
+# tests/test_devis_refs.py
+from __future__ import annotations
+
+import threading
+
+from app.services.devis_refs import allocate_ref, ensure_devis_refs, is_reserved_for
+
+THREADS = 8
+PAR_THREAD = 25
+
+
+def _schema(pool):
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE devis (ref_devis TEXT UNIQUE NOT NULL)")
+        conn.execute("INSERT INTO devis VALUES ('D00041')")  # numérotation existante
+        conn.commit()
+        ensure_devis_refs(conn)
+
+
+def test_allocate_ref_concurrent(pool):
+    _schema(pool)
+    refs, errors = [], []
+    start = threading.Barrier(THREADS)
+
+    def worker(i):
+        start.wait()
+        try:
+            for _ in range(PAR_THREAD):
+                with pool.connection() as conn:
+                    refs.append(allocate_ref(conn, "D", f"user{i}"))
+        except Exception as e:  # pragma: no cover - remonté par l'assert
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(set(refs)) == THREADS * PAR_THREAD
+    assert sorted(refs) == [f"D{n:05d}" for n in range(42, 42 + THREADS * PAR_THREAD)]
+
+
+def test_is_reserved_for(pool):
+    _schema(pool)
+    with pool.connection() as conn:
+        ref = allocate_ref(conn, "D", "ga")
+        assert is_reserved_for(conn, ref, "ga")
+        assert not is_reserved_for(conn, ref, "fh")
+        assert not is_reserved_for(conn, "D00041", "ga")  # déjà enregistrée
+        assert not is_reserved_for(conn, "LIBRE-1", "ga")
+
+
+def test_generate_refuse_ref_non_reservee(logged_client):
+    resp = logged_client.post(
+        "/generate",
+        data={"client": "X", "chantier": "Y", "ref_devis": "D99999", "saisie_mode": "manuel"},
+    )
+    assert resp.status_code == 409
+
+
+def test_generate_attribue_ref_puis_refuse_sa_reutilisation(logged_client):
+    data = {"client": "X", "chantier": "Y", "saisie_mode": "manuel"}
+    resp = logged_client.post("/generate", data=data)
+    assert resp.status_code == 200, resp.text
+
+    from app.main import get_connection
+
+    with get_connection() as conn:
+        ref = conn.execute("SELECT ref_devis FROM devis ORDER BY id DESC LIMIT 1").fetchone()[0]
+    resp = logged_client.post("/generate", data={**data, "ref_devis": ref})
+    assert resp.status_code == 409
+
+
+def test_generate_accepte_sa_reservation(logged_client):
+    from app.main import reserve_ref_devis
+
+    ref = reserve_ref_devis("GA", "", "ga")
+    resp = logged_client.post(
+        "/generate",
+        data={"client": "X", "chantier": "Y", "ref_devis": ref, "saisie_mode": "manuel"},
+    )
+    assert resp.status_code == 200, resp.text
+    assert ref in resp.text
@@ -0,0 +1,32 @@
+# tests/test_engine_batch.py
+from __future__ import annotations
+
+import pytest
+
+from app.services.engine import compute_devis
+from app.services.engine_batch import LONG_SEGMENT, compute_devis_batch
+from benchmarks.bench_engine_batch import big_quote, random_quotes
+
+
+def _sans_lignes(result):
+    return {k: v for k, v in result.items() if k != "lignes"}
+
+
+@pytest.mark.parametrize(
+    "quotes",
+    [
+        random_quotes(300, seed=1),
+        [big_quote(20 * LONG_SEGMENT, seed=3)],
+        random_quotes(50, seed=2) + [big_quote(5 * LONG_SEGMENT, seed=4)] + random_quotes(50, seed=5),
+    ],
+    ids=["petits", "gros", "mixte"],
+)
+def test_batch_identique_a_compute_devis(quotes):
+    ref = [compute_devis(**q) for q in quotes]
+    assert compute_devis_batch(quotes) == ref
+    assert compute_devis_batch(quotes, with_lignes=False) == [_sans_lignes(r) for r in ref]
+
+
+def test_batch_devis_vide():
+    quote = dict(random_quotes(1)[0], poutrelles=[], hourdis=[])
+    assert compute_devis_batch([quote]) == [compute_devis(**quote)]
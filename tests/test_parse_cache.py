@@ -0,0 +1,47 @@
+# tests/test_parse_cache.py
+from __future__ import annotations
+
+import io
+
+from app.services.parse_cache import DISK_CACHE_DIR, ParseCache
+from benchmarks.progiciel_gen import ProgicielSpec, progiciel_csv_bytes
+
+
+def _csv(seed: int = 1) -> bytes:
+    return progiciel_csv_bytes(ProgicielSpec(poutrelles=30, seed=seed))
+
+
+def test_disque_desactive_par_defaut():
+    assert DISK_CACHE_DIR is None
+    assert ParseCache().stats()["disk"] is False
+
+
+def test_hit_memoire_rend_une_copie():
+    cache = ParseCache(disk_dir=None)
+    data = _csv()
+    first = cache.parse(io.BytesIO(data))
+    n = len(first["poutrelles"])
+    first["poutrelles"].add("113", 1.0, 0.0, 1.0)
+    first["hourdis"].add("H16", 1.0)
+    first["aggregate"]["ml_poutrelles"]["113"] = -1.0
+
+    second = cache.parse(io.BytesIO(data))
+    assert cache.stats()["memory_hits"] == 1
+    assert len(second["poutrelles"]) == n
+    assert second["aggregate"]["ml_poutrelles"].get("113") != -1.0
+    assert second["poutrelles"] != first["poutrelles"]
+
+
+def test_disque_borne(tmp_path):
+    one = ParseCache(disk_dir=tmp_path)
+    one.parse(io.BytesIO(_csv(1)))
+    entry_size = sum(p.stat().st_size for p in tmp_path.glob("*.br"))
+
+    cache = ParseCache(disk_dir=tmp_path, disk_max_bytes=int(entry_size * 2.5))
+    for seed in range(2, 6):
+        cache.parse(io.BytesIO(_csv(seed)))
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.br")) <= cache.disk_max_bytes
+    assert cache.stats()["disk_evictions"] >= 2
+    # les fichiers d'une entrée partent ensemble
+    keys = {p.name.split(".", 1)[0] for p in tmp_path.glob("*.br")}
+    assert len(list(tmp_path.glob("*.br"))) == 2 * len(keys)
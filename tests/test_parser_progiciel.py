@@ -0,0 +1,101 @@
+# tests/test_parser_progiciel.py
+from __future__ import annotations
+
+import asyncio
+import io
+import random
+
+import pytest
+
+from app.services.parser_progiciel import _iter_lines, aparse_progiciel_csv, parse_progiciel_csv
+from benchmarks.progiciel_gen import NBSP, ProgicielSpec, progiciel_csv_bytes, write_progiciel
+
+SAMPLES = [
+    "a;b\nc;d\n",
+    "a;b\r\nc;d\r\n",
+    "a;b\rc;d\r",
+    "a;b\r\nc\x0cd;\x85e f\x1cg;h\nfin sans retour",
+    "x\r\r\n\n\ry",
+    "",
+]
+
+
+def _reference(data: bytes) -> list:
+    # découpage de la version d'origine : fichier texte ouvert avec newline=""
+    return list(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", errors="ignore", newline=""))
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_iter_lines_comme_newline_vide(text):
+    data = text.encode("utf-8")
+    rnd = random.Random(0)
+    for _ in range(20):
+        cuts = sorted(rnd.sample(range(len(data) + 1), min(4, len(data) + 1)))
+        chunks = [data[a:b] for a, b in zip([0] + cuts, cuts + [len(data)])]
+        assert list(_iter_lines(chunks)) == _reference(data)
+
+
+def test_separateurs_unicode_gardes_dans_la_ligne():
+    csv = progiciel_csv_bytes(ProgicielSpec(poutrelles=10, seed=3))
+    ref = parse_progiciel_csv(io.BytesIO(csv))
+    # \x0c ou   dans une cellule ne coupe pas la ligne
+    noisy = csv.replace(b";", "\x0c;".encode(), 1).replace(b"\r\n", b"\n")
+    got = parse_progiciel_csv(io.BytesIO(noisy))
+    assert got["poutrelles"] == ref["poutrelles"]
+    assert got["hourdis"] == ref["hourdis"]
+
+
+def test_bruit_espaces_insecables_relu():
+    spec = ProgicielSpec(poutrelles=50, hourdis=50, seed=5, noise=1.0)
+    buf = io.StringIO(newline="")
+    stats = write_progiciel(buf, spec)
+    data = progiciel_csv_bytes(spec)
+    assert NBSP.encode("utf-8") in data  # le bruit arrive jusqu'au parser
+
+    got = parse_progiciel_csv(io.BytesIO(data))
+    assert len(got["poutrelles"]) == stats.poutrelles
+    assert got["surface_ct"] == pytest.approx(stats.surface_ct)
+    assert sum(h.nombre for h in got["hourdis"]) == pytest.approx(stats.total_hourdis)
+
+
+def _comparable(result: dict) -> dict:
+    return {
+        "poutrelles": list(result["poutrelles"]),
+        "hourdis": list(result["hourdis"]),
+        "surface_ct": result["surface_ct"],
+        "surface_ts": result["surface_ts"],
+    }
+
+
+async def _achunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_sync_et_async_identiques_cellule_multiligne():
+    plain = progiciel_csv_bytes(ProgicielSpec(poutrelles=40, seed=8))
+    expected = _comparable(parse_progiciel_csv(io.BytesIO(plain)))
+    # cellules entre guillemets avec fins de ligne (et ;) : le libellé SURFACE
+    # et le repère d'une poutrelle
+    csv = plain.replace(b";SURFACE;;", b';"SURFACE\r\n";;', 1)
+    csv = csv.replace(b"\r\nB;", b'\r\n"B\n;bis";', 1)
+    assert csv.count(b'"') == 4
+    ref = _comparable(parse_progiciel_csv(io.BytesIO(csv)))
+    assert ref == expected
+    rnd = random.Random(1)
+    for size in (1, 7, 64, len(csv)):
+        chunks = [csv[i:i + size] for i in range(0, len(csv), size)]
+        assert _comparable(parse_progiciel_csv(chunks)) == ref
+        got = asyncio.run(aparse_progiciel_csv(_achunks(chunks)))
+        assert _comparable(got) == ref
+    cuts = sorted(rnd.sample(range(len(csv)), 30))
+    chunks = [csv[a:b] for a, b in zip([0] + cuts, cuts + [len(csv)])]
+    assert _comparable(asyncio.run(aparse_progiciel_csv(_achunks(chunks)))) == ref
+
+
+def test_surface_sur_un_enregistrement_multiligne():
+    # SURFACE sur la 1re ligne physique, sa valeur sur la 2e
+    data = b'"x;\nSURFACE;;5,0";SURFACE;;"94,2\n";\n'
+    assert parse_progiciel_csv(io.BytesIO(data))["surface_ct"] == 94.2
+    chunks = [data[:5], data[5:20], data[20:]]
+    assert asyncio.run(aparse_progiciel_csv(_achunks(chunks)))["surface_ct"] == 94.2
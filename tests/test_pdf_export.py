@@ -0,0 +1,38 @@
+# tests/test_pdf_export.py
+from __future__ import annotations
+
+import app.main as main
+
+
+def _devis(logged_client):
+    resp = logged_client.post(
+        "/generate", data={"client": "X", "chantier": "Y", "saisie_mode": "manuel"}
+    )
+    assert resp.status_code == 200, resp.text
+    with main.get_connection() as conn:
+        return conn.execute("SELECT ref_devis FROM devis ORDER BY id DESC LIMIT 1").fetchone()[0]
+
+
+def test_ref_inconnue_404_meme_sans_weasyprint(client, monkeypatch):
+    monkeypatch.setattr(main, "pdf_available", lambda: False)
+    assert client.get("/pdf/INCONNU-1").status_code == 404
+
+
+def test_devis_existant_sans_weasyprint_503(logged_client, monkeypatch):
+    ref = _devis(logged_client)
+    monkeypatch.setattr(main, "pdf_available", lambda: False)
+    assert logged_client.get(f"/pdf/{ref}").status_code == 503
+
+
+def test_echec_du_depot_5xx_et_non_404(logged_client, monkeypatch):
+    ref = _devis(logged_client)
+    main.get_pdf_path(ref).unlink(missing_ok=True)
+
+    def submit(**kwargs):
+        raise RuntimeError("pool arrêté")
+
+    monkeypatch.setattr(main, "pdf_available", lambda: True)
+    monkeypatch.setattr(main.pdf_jobs, "submit", submit)
+    resp = logged_client.get(f"/pdf/{ref}")
+    assert resp.status_code == 500
+    assert "pool arrêté" in resp.json()["detail"]
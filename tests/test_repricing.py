@@ -0,0 +1,53 @@
+# tests/test_repricing.py
+from __future__ import annotations
+
+import sqlite3
+
+from app.services import repricing
+from app.services.compute_pool import compute_pool
+from app.services.engine import standard_grid
+from app.services.repricing import grid_from_dict, stream_report
+
+
+def test_repricing_pool_partage(logged_client):
+    for i in range(3):
+        resp = logged_client.post(
+            "/generate",
+            data={
+                "client": "X",
+                "chantier": f"Repricing {i}",
+                "saisie_mode": "manuel",
+                "manual_pout_type": "113",
+                "manual_pout_longueur": "4.2",
+                "manual_pout_etrier": "6",
+                "manual_pout_nombre": str(2 + i),
+            },
+        )
+        assert resp.status_code == 200, resp.text
+
+    grid = grid_from_dict({"etrier": 0.95}, base=standard_grid())
+    serial = list(stream_report(grid, workers=1))
+    submitted = compute_pool.submitted
+    for _ in range(2):
+        parallel = list(stream_report(grid, chunk_size=1, workers=2))
+        assert parallel[:-1] == serial[:-1]
+        assert parallel[-1]["summary"]["devis"] == serial[-1]["summary"]["devis"] >= 3
+    # deux rapports, un seul pool : les paquets passent par compute_pool
+    assert compute_pool.submitted - submitted == 2 * serial[-1]["summary"]["devis"]
+    assert compute_pool.stats()["started"]
+
+
+def test_stream_report_chemin_avec_caracteres_speciaux(logged_client, tmp_path, monkeypatch):
+    from app.main import get_connection
+
+    db = tmp_path / "copie ?#%20" / "devis.db"
+    db.parent.mkdir()
+    dest = sqlite3.connect(db)
+    with get_connection() as conn:
+        conn.backup(dest)
+        (n,) = conn.execute("SELECT COUNT(*) FROM devis_inputs").fetchone()
+    dest.close()
+
+    monkeypatch.setattr(repricing, "DB_PATH", db)
+    report = list(stream_report(standard_grid(), workers=1))
+    assert report[-1]["summary"]["devis"] == n
@@ -0,0 +1,106 @@
+# tests/test_sales_rollups.py
+from __future__ import annotations
+
+import random
+
+from app.services.sales_rollups import (
+    delete_devis,
+    ensure_sales_rollups,
+    rebuild_rollups,
+    record_devis,
+    retract_devis,
+)
+
+COMMERCIAUX = ("GA", "FH", "JM")
+CLIENTS = ("C001", "C002", "c003")
+
+
+def _schema(pool):
+    with pool.connection() as conn:
+        conn.executescript(
+            """
+            CREATE TABLE devis (
+                id INTEGER PRIMARY KEY, ref_devis TEXT UNIQUE NOT NULL, date_iso TEXT,
+                code_commercial TEXT, code_client TEXT, total_ht REAL, total_ttc REAL
+            );
+            CREATE TABLE devis_details (
+                ref_devis TEXT PRIMARY KEY REFERENCES devis (ref_devis) ON DELETE CASCADE,
+                poids_total REAL, transport_total_choisi REAL
+            );
+            """
+        )
+        ensure_sales_rollups(conn)
+
+
+def _write(conn, rng, ref, replace=False):
+    """Écrit (ou réécrit) un devis comme insert_devis_row, stats comprises."""
+    header = (
+        f"2026-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}",
+        rng.choice(COMMERCIAUX),
+        rng.choice(CLIENTS),
+        round(rng.uniform(100, 50000), 2),
+    )
+    detail = (round(rng.uniform(0, 40000), 1), round(rng.uniform(0, 900), 2))
+    with conn:
+        if replace:
+            retract_devis(conn, ref)
+            conn.execute(
+                """
+                UPDATE devis SET date_iso = ?, code_commercial = ?, code_client = ?,
+                                 total_ht = ?, total_ttc = ? WHERE ref_devis = ?
+                """,
+                (*header, round(header[3] * 1.2, 2), ref),
+            )
+            conn.execute(
+                "UPDATE devis_details SET poids_total = ?, transport_total_choisi = ? WHERE ref_devis = ?",
+                (*detail, ref),
+            )
+        else:
+            conn.execute(
+                """
+                INSERT INTO devis (ref_devis, date_iso, code_commercial, code_client, total_ht, total_ttc)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (ref, *header, round(header[3] * 1.2, 2)),
+            )
+            conn.execute("INSERT INTO devis_details VALUES (?, ?, ?)", (ref, *detail))
+        record_devis(conn, ref)
+
+
+def _rollups(conn):
+    rows = conn.execute("SELECT * FROM stats_ventes ORDER BY mois, code_commercial, code_client")
+    return [tuple(round(v, 6) if isinstance(v, float) else v for v in r) for r in rows]
+
+
+def test_incremental_egal_rebuild_apres_remplacement_et_suppression(pool):
+    _schema(pool)
+    rng = random.Random(7)
+    refs = [f"D{n:05d}" for n in range(60)]
+    with pool.connection() as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        for ref in refs:
+            _write(conn, rng, ref)
+        for ref in rng.sample(refs, 25):
+            _write(conn, rng, ref, replace=True)
+        deleted = rng.sample(refs, 15)
+        for ref in deleted:
+            with conn:
+                assert delete_devis(conn, ref)
+        with conn:
+            assert not delete_devis(conn, deleted[0])  # déjà supprimé : sans effet
+
+        incremental = _rollups(conn)
+        assert sum(r[3] for r in incremental) == len(refs) - len(deleted)
+        assert all(r[3] > 0 for r in incremental)
+
+        assert rebuild_rollups(conn) == len(refs) - len(deleted)
+        assert incremental == _rollups(conn)
+
+
+def test_suppression_du_dernier_devis_vide_la_ligne(pool):
+    _schema(pool)
+    with pool.connection() as conn:
+        _write(conn, random.Random(1), "D00001")
+        with conn:
+            delete_devis(conn, "D00001")
+        assert _rollups(conn) == []
@@ -0,0 +1,63 @@
+# tests/test_startup.py
+from __future__ import annotations
+
+from app.services.startup import MIGRATION_META_PREFIX, run_migrations, schema_version
+
+
+def _table(name):
+    def step(conn):
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (x)")
+
+    step.__name__ = f"ensure_{name}"
+    return step
+
+
+def test_nouvelle_etape_executee_meme_si_version_a_jour(pool, tmp_path):
+    db = tmp_path / "unit.db"
+    a, b = _table("a"), _table("b")
+    with pool.connection() as conn:
+        assert run_migrations(conn, db, [a], version=2)
+        assert schema_version(conn) == 2
+        assert not run_migrations(conn, db, [a], version=2)
+
+        # étape ajoutée sans changer de version : elle tourne quand même
+        assert run_migrations(conn, db, [a, b], version=2)
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'b'").fetchone()
+        keys = {k for (k,) in conn.execute("SELECT key FROM app_meta")}
+        assert {MIGRATION_META_PREFIX + "ensure_a", MIGRATION_META_PREFIX + "ensure_b"} <= keys
+        assert not run_migrations(conn, db, [a, b], version=2)
+
+
+def test_etapes_rejouees_a_chaque_demarrage(pool, tmp_path):
+    # base migrée par l'ancienne version (user_version seul) : étape notée une fois
+    calls = []
+
+    def ensure_x(conn):
+        calls.append(1)
+
+    with pool.connection() as conn:
+        conn.execute("PRAGMA user_version = 2")
+        assert run_migrations(conn, tmp_path / "unit.db", [ensure_x], version=2)
+        assert not run_migrations(conn, tmp_path / "unit.db", [ensure_x], version=2)
+    assert calls == [1, 1]
+
+
+def test_etape_existante_modifiee_atteint_la_base(pool, tmp_path):
+    db = tmp_path / "unit.db"
+
+    def ensure_t(conn):
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS t (x)")
+
+    with pool.connection() as conn:
+        run_migrations(conn, db, [ensure_t])
+
+    def ensure_t(conn):  # noqa: F811 - même étape, index ajouté ensuite
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS t (x)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_t_x ON t (x)")
+
+    with pool.connection() as conn:
+        assert not run_migrations(conn, db, [ensure_t])
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_t_x'").fetchone()
@@ -0,0 +1,21 @@
+# tests/test_working_set.py
+from __future__ import annotations
+
+from app.services.working_set import SqliteWorkingSetStore, WorkingSet
+
+
+def test_table_creee_par_les_migrations(app_started):
+    from app.main import get_connection
+
+    with get_connection() as conn:
+        assert conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'quote_working_sets'"
+        ).fetchone()
+
+
+def test_put_get_delete(app_started):
+    store = SqliteWorkingSetStore()
+    store.put("session-test", WorkingSet(surface_ct=12.5))
+    assert store.get("session-test").surface_ct == 12.5
+    store.delete("session-test")
+    assert store.get("session-test") is None